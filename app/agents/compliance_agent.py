@@ -1,17 +1,30 @@
-from typing import List, Dict, Any, TypedDict, Annotated, Literal
-import operator
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain.retrievers.document_compressors import EmbeddingsFilter
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+import asyncio
+from typing import List, Dict, TypedDict, Literal, Optional, Tuple, AsyncIterator
+import hashlib
+import json
+import logging
+import re
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
 from pydantic import BaseModel, Field
 
-from app.services.vector_store import get_vector_store
+from app.services.llm import get_llm, get_embeddings, llm_route
+from app.services.context import build_context, abuild_context, fit_to_budget
+from app.services.response_cache import ResponseCache
+from app.services.tokens import count_tokens, split_by_tokens
+from app.config.settings import settings
+from app.services.metrics import TRIAGE_DECISIONS, instrument_node, metric_area, record_llm_usage
+from app.services.vector_store import (
+    similarity_search,
+    asimilarity_search,
+    batch_similarity_search,
+    abatch_similarity_search,
+    loaded_index_version
+)
+
+logger = logging.getLogger(__name__)
 
 # Define state types
 class AgentState(TypedDict):
@@ -22,173 +35,580 @@ class AgentState(TypedDict):
     compliance_issues: list
     suggestions: list
     references: list
-    next: Literal["retrieve", "analyze", "summarize", "end"]
+    sections: list
+    context: str
+    context_tokens: dict
+    next: Literal["retrieve", "triage", "analyze", "summarize", "review", "end"]
+
+# Define prompts (built once at import and shared by every request)
+ANALYZE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a healthcare compliance expert that have a lot of knowledge. 
+     Analyze the document for compliance issues related to the specified compliance area.
+     Focus only on identifying potential regulatory violations or issues.
+     Use the provided reference context to inform your analysis."""),
+    ("user", """
+     Compliance Area: {compliance_area}
+     
+     Reference Context:
+     {context}
+     
+     Document to Analyze:
+     {document}
+     
+     Identify all potential compliance issues in the document:
+     """)
+])
+
+SUMMARIZE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a healthcare compliance expert. 
+     Based on the identified compliance issues, provide concrete suggestions for improvement.
+     Also provide specific references to regulations or guidelines that are relevant."""),
+    ("user", """
+     Compliance Area: {compliance_area}
+     
+     Reference Context:
+     {context}
+     
+     Identified Compliance Issues:
+     {issues_text}
+     
+     1. Provide concrete suggestions to address each compliance issue.
+     2. Provide specific references to relevant regulations or guidelines.
+     
+     Format your response as a JSON with two arrays: 'suggestions' and 'references'.
+     """)
+])
+
+REVIEW_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a healthcare compliance expert. 
+     Analyze the document for compliance issues related to the specified compliance area,
+     then provide concrete suggestions to address each issue and specific references to
+     the regulations or guidelines involved.
+     Use the provided reference context to inform your analysis."""),
+    ("user", """
+     Compliance Area: {compliance_area}
+     
+     Reference Context:
+     {context}
+     
+     Document to Analyze:
+     {document}
+     """)
+])
+
+TRIAGE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a healthcare compliance screener.
+     Decide whether the document may contain compliance issues related to the specified compliance area.
+     Respond only with JSON: {{"has_issues": true or false, "confidence": a number from 0 to 1}}"""),
+    ("user", """
+     Compliance Area: {compliance_area}
+     
+     Reference Context:
+     {context}
+     
+     Document to Screen:
+     {document}
+     """)
+])
+
+class ComplianceReport(BaseModel):
+    """Single-pass review response, validated against this schema."""
+    compliance_issues: List[str] = Field(description="Potential regulatory violations or issues in the document")
+    suggestions: List[str] = Field(description="Concrete suggestions to address each compliance issue")
+    references: List[str] = Field(description="Specific regulations or guidelines relevant to the issues")
+
+# Graph modes: analyze then summarize, or one structured-output review call
+AGENT_MODES = ("two_pass", "single_pass")
+
+# Changes whenever a mode's prompts change, so cached responses are not reused across prompt edits
+PROMPT_VERSION = hashlib.sha256(
+    (repr(ANALYZE_PROMPT.messages) + repr(SUMMARIZE_PROMPT.messages)).encode("utf-8")
+).hexdigest()[:12]
+REVIEW_PROMPT_VERSION = hashlib.sha256(
+    (repr(REVIEW_PROMPT.messages) + json.dumps(ComplianceReport.model_json_schema(), sort_keys=True)).encode("utf-8")
+).hexdigest()[:12]
+
+TRIAGE_PROMPT_VERSION = hashlib.sha256(repr(TRIAGE_PROMPT.messages).encode("utf-8")).hexdigest()[:12]
+
+# Nodes whose "next" decides whether the run goes on to the LLM analysis or ends
+ROUTING_NODES = ("retrieve", "triage")
+
+# Longest document looked up by near-duplicate similarity; longer ones only get
+# exact cache hits, since documents sharing a long templated preamble embed alike
+CACHE_EMBED_CHARS = 8000
+
+def _batch_retrieval_errors() -> tuple:
+    # A batch the embeddings endpoint rejects as a whole (too many inputs or tokens)
+    # can still be retrieved per document; outages are not retried once per document
+    from openai import BadRequestError
+    return (BadRequestError, ValueError)
 
 # Define tools and nodes
+def _retrieval_query(state: AgentState, text: str = None) -> str:
+    if text is None:
+        text = state["document"]
+    return f"Healthcare compliance regulations for {state['compliance_area']} related to: {text[:200]}..."
+
+def _split_sections(state: AgentState) -> List[str]:
+    """Split a document that exceeds the analysis budget into token-bounded sections."""
+    if count_tokens(state["document"]) <= settings.ANALYSIS_SECTION_TOKENS:
+        return []
+    return split_by_tokens(
+        state["document"],
+        settings.ANALYSIS_SECTION_TOKENS,
+        settings.ANALYSIS_SECTION_OVERLAP_TOKENS
+    )
+
+def _retrieval_k() -> int:
+    # With a relevance cutoff, fetch more and let the cutoff and token budget decide how many are kept
+    if settings.RETRIEVAL_RELEVANCE_THRESHOLD is not None:
+        return settings.RETRIEVAL_MAX_K
+    return settings.RETRIEVAL_K
+
+def _after_retrieval(retrieved: List[list]) -> str:
+    """Route past the LLM when nothing relevant was found and the settings say to skip."""
+    if settings.RETRIEVAL_NO_CONTEXT_ACTION == "skip" and not any(retrieved):
+        return "end"
+    return "analyze"
+
+def _sectioned_state(state: AgentState, sections: List[str], retrieved: List[list]) -> AgentState:
+    retrieved = [fit_to_budget(docs) for docs in retrieved]
+    
+    # Summarize sees the union of every section's context, in first-seen order
+    seen = set()
+    merged = []
+    for docs in retrieved:
+        for doc in docs:
+            key = (doc.metadata.get("source"), doc.page_content)
+            if key not in seen:
+                seen.add(key)
+                merged.append(doc)
+    
+    return {
+        **state,
+        "sections": [{"text": text, "retrieved_documents": docs} for text, docs in zip(sections, retrieved)],
+        "retrieved_documents": merged,
+        "next": _after_retrieval(retrieved)
+    }
+
 def retrieve(state: AgentState) -> AgentState:
     """Retrieve relevant compliance information."""
-    document = state["document"]
-    compliance_area = state["compliance_area"]
-    
-    # Get the vector store
-    vector_store = get_vector_store()
+    # Long documents get context per section, in one batched search
+    sections = _split_sections(state)
+    if sections:
+        retrieved = batch_similarity_search(
+            [_retrieval_query(state, text) for text in sections], k=_retrieval_k(),
+            compliance_areas=[state["compliance_area"]] * len(sections)
+        )
+        return _sectioned_state(state, sections, retrieved)
     
     # Query vector store
-    retrieved_docs = vector_store.similarity_search(
-        f"Healthcare compliance regulations for {compliance_area} related to: {document[:200]}...",
-        k=3
-    )
+    retrieved_docs = similarity_search(_retrieval_query(state), k=_retrieval_k(), compliance_area=state["compliance_area"])
+    retrieved_docs = fit_to_budget(retrieved_docs)
     
     # Add retrieved documents to state
     return {
         **state,
         "retrieved_documents": retrieved_docs,
-        "next": "analyze"
+        "next": _after_retrieval([retrieved_docs])
     }
 
-def analyze(state: AgentState) -> AgentState:
-    """Analyze document for compliance issues."""
-    document = state["document"]
-    compliance_area = state["compliance_area"]
-    retrieved_docs = state["retrieved_documents"]
-    
-    # Format retrieved documents
-    context = "\n".join([f"Source {i+1}: {doc.page_content}" for i, doc in enumerate(retrieved_docs)])
-    
-    # Create LLM
-    llm = ChatOpenAI(model="gpt-4o", temperature=0)
-    
-    # Create prompt
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", """You are a healthcare compliance expert that have a lot of knowledge. 
-         Analyze the document for compliance issues related to the specified compliance area.
-         Focus only on identifying potential regulatory violations or issues.
-         Use the provided reference context to inform your analysis."""),
-        ("user", """
-         Compliance Area: {compliance_area}
-         
-         Reference Context:
-         {context}
-         
-         Document to Analyze:
-         {document}
-         
-         Identify all potential compliance issues in the document:
-         """)
-    ])
-    
-    # Get compliance issues
-    response = llm.invoke(
-        prompt.format(
-            compliance_area=compliance_area,
-            context=context,
-            document=document
+async def aretrieve(state: AgentState) -> AgentState:
+    """Retrieve relevant compliance information without blocking the event loop."""
+    sections = _split_sections(state)
+    if sections:
+        retrieved = await abatch_similarity_search(
+            [_retrieval_query(state, text) for text in sections], k=_retrieval_k(),
+            compliance_areas=[state["compliance_area"]] * len(sections)
         )
-    )
+        return _sectioned_state(state, sections, retrieved)
+    
+    retrieved_docs = await asimilarity_search(_retrieval_query(state), k=_retrieval_k(), compliance_area=state["compliance_area"])
+    retrieved_docs = fit_to_budget(retrieved_docs)
     
+    return {
+        **state,
+        "retrieved_documents": retrieved_docs,
+        "next": _after_retrieval([retrieved_docs])
+    }
+
+def _analyze_prompt(state: AgentState, context: str, document: str = None) -> str:
+    return ANALYZE_PROMPT.format(
+        compliance_area=state["compliance_area"],
+        context=context,
+        document=state["document"] if document is None else document
+    )
+
+def _section_configs(state: AgentState) -> List[Dict]:
+    # Tags let streaming consumers tell interleaved section tokens apart
+    return [
+        {"tags": [f"section:{i}"], "max_concurrency": settings.ANALYSIS_MAX_CONCURRENCY}
+        for i in range(len(state["sections"]))
+    ]
+
+def _parse_issues(content: str) -> List[str]:
+    return [issue.strip() for issue in content.split('\n') if issue.strip()]
+
+def merge_issues(issue_lists: List[List[str]]) -> List[str]:
+    """Merge per-section issues, dropping repeats that differ only in numbering or formatting."""
+    seen = set()
+    merged = []
+    for issues in issue_lists:
+        for issue in issues:
+            key = re.sub(r"^[\s\-\*\d\.\)]+", "", issue)
+            key = re.sub(r"\s+", " ", key).strip(" *:").lower()
+            if key and key not in seen:
+                seen.add(key)
+                merged.append(issue)
+    return merged
+
+def _triage_context(state: AgentState) -> Optional[Tuple[str, int]]:
+    # Triage already assembled the context for the whole document
+    if state.get("context") and "triage" in state.get("context_tokens", {}):
+        return state["context"], state["context_tokens"]["triage"]
+    return None
+
+def _analyze_result(state: AgentState, contents: List[str], context: str, context_tokens: int) -> AgentState:
     # Parse compliance issues
-    compliance_issues = [issue.strip() for issue in response.content.split('\n') if issue.strip()]
+    compliance_issues = merge_issues([_parse_issues(content) for content in contents])
     
     return {
         **state,
         "compliance_issues": compliance_issues,
+        "context": context,
+        "context_tokens": {**state.get("context_tokens", {}), "analyze": context_tokens},
         "next": "summarize"
     }
 
-def summarize(state: AgentState) -> AgentState:
-    """Generate suggestions and references."""
-    document = state["document"]
-    compliance_area = state["compliance_area"]
-    compliance_issues = state["compliance_issues"]
-    retrieved_docs = state["retrieved_documents"]
+def analyze(state: AgentState) -> AgentState:
+    """Analyze document for compliance issues."""
+    if state.get("sections"):
+        # Map: analyze sections concurrently; reduce: merge their issues
+        contexts = [
+            build_context(section["retrieved_documents"], query=_retrieval_query(state, section["text"]))
+            for section in state["sections"]
+        ]
+        prompts = [
+            _analyze_prompt(state, context, section["text"])
+            for section, (context, _) in zip(state["sections"], contexts)
+        ]
+        responses = get_llm("analyze").batch(prompts, config=_section_configs(state))
+        record_llm_usage("analyze", state["compliance_area"], responses)
+        # Section contexts differ, so summarize builds its own from the merged sources
+        return _analyze_result(
+            state, [response.content for response in responses], "", sum(tokens for _, tokens in contexts)
+        )
     
-    # Format compliance issues
-    issues_text = "\n".join([f"- {issue}" for issue in compliance_issues])
-    
-    # Format retrieved documents
-    context = "\n".join([f"Source {i+1}: {doc.page_content}" for i, doc in enumerate(retrieved_docs)])
-    
-    # Create LLM
-    llm = ChatOpenAI(model="gpt-4o", temperature=0)
-    
-    # Create prompt
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", """You are a healthcare compliance expert. 
-         Based on the identified compliance issues, provide concrete suggestions for improvement.
-         Also provide specific references to regulations or guidelines that are relevant."""),
-        ("user", """
-         Compliance Area: {compliance_area}
-         
-         Reference Context:
-         {context}
-         
-         Identified Compliance Issues:
-         {issues_text}
-         
-         1. Provide concrete suggestions to address each compliance issue.
-         2. Provide specific references to relevant regulations or guidelines.
-         
-         Format your response as a JSON with two arrays: 'suggestions' and 'references'.
-         """)
-    ])
-    
-    # Get suggestions and references
-    response = llm.invoke(
-        prompt.format(
-            compliance_area=compliance_area,
-            context=context,
-            issues_text=issues_text
+    context, tokens = _triage_context(state) or build_context(state["retrieved_documents"], query=_retrieval_query(state))
+    response = get_llm("analyze").invoke(_analyze_prompt(state, context))
+    record_llm_usage("analyze", state["compliance_area"], [response])
+    return _analyze_result(state, [response.content], context, tokens)
+
+async def aanalyze(state: AgentState) -> AgentState:
+    """Analyze document for compliance issues asynchronously."""
+    if state.get("sections"):
+        contexts = await asyncio.gather(*[
+            abuild_context(section["retrieved_documents"], query=_retrieval_query(state, section["text"]))
+            for section in state["sections"]
+        ])
+        prompts = [
+            _analyze_prompt(state, context, section["text"])
+            for section, (context, _) in zip(state["sections"], contexts)
+        ]
+        responses = await get_llm("analyze").abatch(prompts, config=_section_configs(state))
+        record_llm_usage("analyze", state["compliance_area"], responses)
+        return _analyze_result(
+            state, [response.content for response in responses], "", sum(tokens for _, tokens in contexts)
         )
+    
+    context, tokens = (
+        _triage_context(state) or await abuild_context(state["retrieved_documents"], query=_retrieval_query(state))
     )
+    response = await get_llm("analyze").ainvoke(_analyze_prompt(state, context))
+    record_llm_usage("analyze", state["compliance_area"], [response])
+    return _analyze_result(state, [response.content], context, tokens)
+
+def _clean_items(lines: List[str]) -> List[str]:
+    """Strip list markers and drop lines that carry no content."""
+    items = []
+    for line in lines:
+        item = line.strip().strip(",").strip()
+        if item.startswith("- "):
+            item = item[2:]
+        item = item.strip('"').strip()
+        if item.strip(":[]{}*#"):
+            items.append(item)
+    return items
+
+def parse_summary(content: str) -> Tuple[List[str], List[str]]:
+    """Extract suggestions and references from the summarize response.
     
-    # For simplicity, we'll manually parse the response
-    # In production, use a more robust parsing method
+    The prompt asks for JSON, so that is tried first; otherwise the response is
+    split on the section headings.
+    """
+    # JSON, optionally wrapped in a markdown code fence
+    match = re.search(r"\{.*\}", content, re.DOTALL)
+    if match:
+        try:
+            data = json.loads(match.group(0))
+            data = {key.lower(): value for key, value in data.items()}
+            return (
+                [str(item) for item in data.get("suggestions", [])],
+                [str(item) for item in data.get("references", [])]
+            )
+        except (ValueError, AttributeError):
+            pass
     
-    suggestions = []
-    references = []
+    # Free text with "suggestions" / "references" headings
+    sections = re.split(r"(suggestions|references)", content, flags=re.IGNORECASE)
+    parsed = {"suggestions": [], "references": []}
+    for heading, body in zip(sections[1::2], sections[2::2]):
+        parsed[heading.lower()].extend(_clean_items(body.split("\n")))
     
-    content = response.content
-    if "suggestions" in content.lower():
-        suggestions_text = content.split("suggestions")[1].split("references")[0]
-        suggestions = [s.strip().replace("- ", "", 1) for s in suggestions_text.split("\n") if s.strip()]
+    return parsed["suggestions"], parsed["references"]
+
+def _summarize_prompt(state: AgentState, context: str) -> str:
+    # Format compliance issues
+    issues_text = "\n".join([f"- {issue}" for issue in state["compliance_issues"]])
     
-    if "references" in content.lower():
-        references_text = content.split("references")[1]
-        references = [r.strip().replace("- ", "", 1) for r in references_text.split("\n") if r.strip()]
+    return SUMMARIZE_PROMPT.format(
+        compliance_area=state["compliance_area"],
+        context=context,
+        issues_text=issues_text
+    )
+
+def _summarize_result(state: AgentState, content: str, context_tokens: int) -> AgentState:
+    # Parse suggestions and references
+    suggestions, references = parse_summary(content)
     
     return {
         **state,
         "suggestions": suggestions,
         "references": references,
+        "context_tokens": {**state.get("context_tokens", {}), "summarize": context_tokens},
         "next": "end"
     }
 
+def summarize(state: AgentState) -> AgentState:
+    """Generate suggestions and references."""
+    # Reuse the context analyze already assembled when there is one
+    if state.get("context"):
+        context, tokens = state["context"], state["context_tokens"]["analyze"]
+    else:
+        context, tokens = build_context(state["retrieved_documents"], query=_retrieval_query(state))
+    
+    response = get_llm("summarize").invoke(_summarize_prompt(state, context))
+    record_llm_usage("summarize", state["compliance_area"], [response])
+    return _summarize_result(state, response.content, tokens)
+
+async def asummarize(state: AgentState) -> AgentState:
+    """Generate suggestions and references asynchronously."""
+    if state.get("context"):
+        context, tokens = state["context"], state["context_tokens"]["analyze"]
+    else:
+        context, tokens = await abuild_context(state["retrieved_documents"], query=_retrieval_query(state))
+    
+    response = await get_llm("summarize").ainvoke(_summarize_prompt(state, context))
+    record_llm_usage("summarize", state["compliance_area"], [response])
+    return _summarize_result(state, response.content, tokens)
+
+def _review_prompt(state: AgentState, context: str, document: str = None) -> str:
+    return REVIEW_PROMPT.format(
+        compliance_area=state["compliance_area"],
+        context=context,
+        document=state["document"] if document is None else document
+    )
+
+def parse_triage(content: str) -> Tuple[bool, float]:
+    """Extract (has_issues, confidence) from the triage response.
+    
+    A response that cannot be parsed counts as a possible issue with no
+    confidence, so the document is escalated rather than cleared.
+    """
+    match = re.search(r"\{.*\}", content, re.DOTALL)
+    if match:
+        try:
+            data = json.loads(match.group(0))
+            return bool(data["has_issues"]), float(data.get("confidence", 0.0))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            pass
+    return True, 0.0
+
+def _triage_prompt(state: AgentState, context: str) -> str:
+    return TRIAGE_PROMPT.format(
+        compliance_area=state["compliance_area"],
+        context=context,
+        document=state["document"]
+    )
+
+def _triage_result(state: AgentState, content: str, context: str, context_tokens: int) -> AgentState:
+    has_issues, confidence = parse_triage(content)
+    clean = not has_issues and confidence >= settings.LLM_TRIAGE_CONFIDENCE
+    TRIAGE_DECISIONS.labels(
+        compliance_area=metric_area(state["compliance_area"]), decision="clean" if clean else "escalated"
+    ).inc()
+    
+    # The context is passed on so an escalated analysis does not rebuild it
+    return {
+        **state,
+        "context": context,
+        "context_tokens": {**state.get("context_tokens", {}), "triage": context_tokens},
+        "next": "end" if clean else "analyze"
+    }
+
+def triage(state: AgentState) -> AgentState:
+    """Screen the document with the cheap model; clean documents skip the analysis."""
+    # Long documents are always analyzed section by section
+    if state.get("sections"):
+        return {**state, "next": "analyze"}
+    
+    context, tokens = build_context(state["retrieved_documents"], query=_retrieval_query(state))
+    response = get_llm("triage").invoke(_triage_prompt(state, context))
+    record_llm_usage("triage", state["compliance_area"], [response])
+    return _triage_result(state, response.content, context, tokens)
+
+async def atriage(state: AgentState) -> AgentState:
+    """Screen the document with the cheap model without blocking the event loop."""
+    if state.get("sections"):
+        return {**state, "next": "analyze"}
+    
+    context, tokens = await abuild_context(state["retrieved_documents"], query=_retrieval_query(state))
+    response = await get_llm("triage").ainvoke(_triage_prompt(state, context))
+    record_llm_usage("triage", state["compliance_area"], [response])
+    return _triage_result(state, response.content, context, tokens)
+
+def _review_llm():
+    # include_raw keeps the AIMessage, whose usage metadata feeds the token metrics
+    return get_llm("review").with_structured_output(ComplianceReport, include_raw=True)
+
+def _review_result(state: AgentState, outputs: List[Dict], context_tokens: int) -> AgentState:
+    reports = []
+    for output in outputs:
+        if output["parsed"] is None:
+            raise ValueError(f"Review response did not match the report schema: {output['parsing_error']}")
+        reports.append(output["parsed"])
+    
+    # Long documents are reviewed per section; merge the sections' reports
+    return {
+        **state,
+        "compliance_issues": merge_issues([report.compliance_issues for report in reports]),
+        "suggestions": merge_issues([report.suggestions for report in reports]),
+        "references": merge_issues([report.references for report in reports]),
+        "context_tokens": {**state.get("context_tokens", {}), "review": context_tokens},
+        "next": "end"
+    }
+
+def review(state: AgentState) -> AgentState:
+    """Find issues, suggestions and references in one structured-output call."""
+    if state.get("sections"):
+        contexts = [
+            build_context(section["retrieved_documents"], query=_retrieval_query(state, section["text"]))
+            for section in state["sections"]
+        ]
+        prompts = [
+            _review_prompt(state, context, section["text"])
+            for section, (context, _) in zip(state["sections"], contexts)
+        ]
+        outputs = _review_llm().batch(prompts, config=_section_configs(state))
+    else:
+        contexts = [_triage_context(state) or build_context(state["retrieved_documents"], query=_retrieval_query(state))]
+        outputs = [_review_llm().invoke(_review_prompt(state, contexts[0][0]))]
+    
+    record_llm_usage("review", state["compliance_area"], [output["raw"] for output in outputs])
+    return _review_result(state, outputs, sum(tokens for _, tokens in contexts))
+
+async def areview(state: AgentState) -> AgentState:
+    """Find issues, suggestions and references in one structured-output call, asynchronously."""
+    if state.get("sections"):
+        contexts = await asyncio.gather(*[
+            abuild_context(section["retrieved_documents"], query=_retrieval_query(state, section["text"]))
+            for section in state["sections"]
+        ])
+        prompts = [
+            _review_prompt(state, context, section["text"])
+            for section, (context, _) in zip(state["sections"], contexts)
+        ]
+        outputs = await _review_llm().abatch(prompts, config=_section_configs(state))
+    else:
+        contexts = [
+            _triage_context(state) or await abuild_context(state["retrieved_documents"], query=_retrieval_query(state))
+        ]
+        outputs = [await _review_llm().ainvoke(_review_prompt(state, contexts[0][0]))]
+    
+    record_llm_usage("review", state["compliance_area"], [output["raw"] for output in outputs])
+    return _review_result(state, outputs, sum(tokens for _, tokens in contexts))
+
 # Define the agent
 class ComplianceAgent:
-    def __init__(self):
+    """Compiled compliance workflow.
+    
+    Compiling the graph is comparatively expensive, so create one agent per
+    process and reuse it across requests. When a response cache is given,
+    repeated and near-duplicate documents are answered from it.
+    
+    In "two_pass" mode the graph analyzes the document and then summarizes
+    the issues, as two LLM calls. "single_pass" mode replaces both with one
+    review call returning a schema-validated report. With LLM_TRIAGE_MODEL
+    set, a cheap model screens each document first, and documents it clears
+    with enough confidence are reported without issues.
+    
+    With a checkpointer, runs given a thread id save their state after every
+    node and resume from the last completed one if they were interrupted.
+    """
+    def __init__(self, cache: Optional[ResponseCache] = None, mode: Optional[str] = None,
+                 checkpointer: Optional[BaseCheckpointSaver] = None):
+        self.cache = cache
+        self.checkpointer = checkpointer
+        self.mode = mode or settings.AGENT_MODE
+        if self.mode not in AGENT_MODES:
+            raise ValueError(f"Unknown agent mode: {self.mode}")
+        self.prompt_version = REVIEW_PROMPT_VERSION if self.mode == "single_pass" else PROMPT_VERSION
+        
         # Define the workflow graph
         self.workflow = StateGraph(AgentState)
         
-        # Add nodes
-        self.workflow.add_node("retrieve", retrieve)
-        self.workflow.add_node("analyze", analyze)
-        self.workflow.add_node("summarize", summarize)
+        if self.mode == "single_pass":
+            nodes = [("retrieve", retrieve, aretrieve), ("review", review, areview)]
+        else:
+            nodes = [
+                ("retrieve", retrieve, aretrieve),
+                ("analyze", analyze, aanalyze),
+                ("summarize", summarize, asummarize)
+            ]
+        # A cheap model screens documents first, and only escalated ones reach the analysis
+        if settings.LLM_TRIAGE_MODEL:
+            nodes.insert(1, ("triage", triage, atriage))
+            self.prompt_version += f"+{TRIAGE_PROMPT_VERSION}"
+        # Cached responses are keyed by the models that produced them
+        self.model_key = "+".join(dict.fromkeys(llm_route(name)[0] for name, _, _ in nodes if name != "retrieve"))
+        
+        # Add nodes (sync for invoke, async for ainvoke), timed for metrics
+        for name, func, afunc in nodes:
+            self.workflow.add_node(
+                name,
+                RunnableLambda(instrument_node(name, func), afunc=instrument_node(name, afunc), name=name)
+            )
         
-        # Add edges
-        self.workflow.add_edge("retrieve", "analyze")
-        self.workflow.add_edge("analyze", "summarize")
-        self.workflow.add_edge("summarize", END)
+        # Add edges (retrieval and triage end the run early when there is nothing to analyze)
+        names = [name for name, _, _ in nodes]
+        for source, target in zip(names, names[1:]):
+            if source in ROUTING_NODES:
+                self.workflow.add_conditional_edges(source, lambda state: state["next"], {"analyze": target, "end": END})
+            else:
+                self.workflow.add_edge(source, target)
+        self.workflow.add_edge(names[-1], END)
         
-        # Set entry point
-        self.workflow.set_entry_point("retrieve")
+        # Set entry point (batch runs arrive with retrieval already done)
+        self.workflow.set_conditional_entry_point(
+            lambda state: state["next"],
+            {"retrieve": "retrieve", "analyze": names[1], "end": END}
+        )
         
         # Compile the workflow
-        self.agent = self.workflow.compile()
+        self.agent = self.workflow.compile(checkpointer=checkpointer)
     
-    def run(self, document: str, compliance_area: str = "general") -> Dict:
-        """Run the compliance agent on the document."""
-        # Initialize state
-        initial_state = {
+    def _initial_state(self, document: str, compliance_area: str) -> AgentState:
+        return {
             "document": document,
             "compliance_area": compliance_area,
             "messages": [],
@@ -196,16 +616,265 @@ class ComplianceAgent:
             "compliance_issues": [],
             "suggestions": [],
             "references": [],
+            "sections": [],
+            "context": "",
+            "context_tokens": {},
             "next": "retrieve"
         }
-        
-        # Run the agent
-        result = self.agent.invoke(initial_state)
-        
-        # Return the results
+    
+    def _format_result(self, document: str, result: AgentState) -> Dict:
         return {
             "document_text": document,
             "compliance_issues": result["compliance_issues"],
             "suggestions": result["suggestions"],
             "references": result["references"]
-        } 
+        }
+    
+    def _cache_lookup(self, document: str, compliance_area: str) -> Tuple[Optional[str], Optional[str], Optional[Dict]]:
+        # Answers are cached per index version, so a corpus update is not answered from stale entries.
+        # Until an index is loaded its version is unknown, and requests bypass the cache.
+        index_version = loaded_index_version()
+        if index_version is None:
+            return None, None, None
+        namespace = ResponseCache.make_namespace(compliance_area, self.model_key, f"{self.prompt_version}@{index_version}")
+        key = ResponseCache.make_key(document, namespace)
+        return key, namespace, self.cache.get(key)
+    
+    def _cache_put(self, key: Optional[str], namespace: Optional[str], result: Dict, vector: Optional[List[float]] = None) -> None:
+        if key is not None:
+            self.cache.put(key, namespace, result, vector)
+    
+    async def _acache_lookup(self, document: str, compliance_area: str) -> Tuple[str, str, Optional[Dict]]:
+        # The disk tier is a SQLite file; keep its reads off the event loop
+        if self.cache.disk_enabled:
+            return await asyncio.to_thread(self._cache_lookup, document, compliance_area)
+        return self._cache_lookup(document, compliance_area)
+    
+    async def _acache_put(self, key: Optional[str], namespace: Optional[str], result: Dict, vector: Optional[List[float]] = None) -> None:
+        if key is not None and self.cache.disk_enabled:
+            await asyncio.to_thread(self.cache.put, key, namespace, result, vector)
+        else:
+            self._cache_put(key, namespace, result, vector)
+    
+    def _cache_hit(self, document: str, hit: Dict) -> Dict:
+        return {**hit, "document_text": document}
+    
+    def _semantic_lookup(self, document: str) -> bool:
+        return self.cache.semantic_enabled and len(document) <= CACHE_EMBED_CHARS
+    
+    def run(self, document: str, compliance_area: str = "general") -> Dict:
+        """Run the compliance agent on the document."""
+        if self.cache is None:
+            result = self.agent.invoke(self._initial_state(document, compliance_area))
+            return self._format_result(document, result)
+        
+        # Exact hit, then near-duplicate hit
+        key, namespace, hit = self._cache_lookup(document, compliance_area)
+        vector = None
+        if hit is None and namespace is not None and self._semantic_lookup(document):
+            vector = get_embeddings().embed_query(document)
+            hit = self.cache.get_similar(namespace, vector)
+        if hit is not None:
+            return self._cache_hit(document, hit)
+        
+        self.cache.record_miss()
+        result = self._format_result(document, self.agent.invoke(self._initial_state(document, compliance_area)))
+        self._cache_put(key, namespace, result, vector)
+        return result
+    
+    async def _ainvoke(self, document: str, compliance_area: str, thread_id: Optional[str]) -> AgentState:
+        if thread_id is None:
+            return await self.agent.ainvoke(self._initial_state(document, compliance_area))
+        
+        # Continue a checkpointed thread from its last completed node
+        config = {"configurable": {"thread_id": thread_id}}
+        snapshot = await self.agent.aget_state(config)
+        if snapshot.values and not snapshot.next:
+            return snapshot.values
+        return await self.agent.ainvoke(None if snapshot.next else self._initial_state(document, compliance_area), config)
+    
+    async def arun(self, document: str, compliance_area: str = "general", thread_id: Optional[str] = None) -> Dict:
+        """Run the compliance agent on the document without blocking the event loop.
+        
+        A thread id requires a checkpointer; a run interrupted under the same
+        thread id resumes where it stopped.
+        """
+        if self.cache is None:
+            result = await self._ainvoke(document, compliance_area, thread_id)
+            return self._format_result(document, result)
+        
+        # Exact hit, then near-duplicate hit
+        key, namespace, hit = await self._acache_lookup(document, compliance_area)
+        vector = None
+        if hit is None and namespace is not None and self._semantic_lookup(document):
+            vector = await get_embeddings().aembed_query(document)
+            hit = self.cache.get_similar(namespace, vector)
+        if hit is not None:
+            return self._cache_hit(document, hit)
+        
+        self.cache.record_miss()
+        result = self._format_result(document, await self._ainvoke(document, compliance_area, thread_id))
+        await self._acache_put(key, namespace, result, vector)
+        return result
+    
+    async def astream(self, document: str, compliance_area: str = "general") -> AsyncIterator[Tuple[str, Dict]]:
+        """Stream (event, data) pairs as each graph node makes progress.
+        
+        Events are "sources" once retrieval finishes, "issues_token" for each
+        token of the analysis (tagged with its section for long documents),
+        "issues" once analysis finishes, "summary" once
+        suggestions and references are ready, and finally "result". In
+        single-pass mode there are no token events, and "issues" and "summary"
+        arrive together when the review finishes.
+        """
+        key = namespace = None
+        if self.cache is not None:
+            key, namespace, hit = await self._acache_lookup(document, compliance_area)
+            if hit is not None:
+                hit = self._cache_hit(document, hit)
+                yield "issues", {"compliance_issues": hit["compliance_issues"]}
+                yield "summary", {"suggestions": hit["suggestions"], "references": hit["references"]}
+                yield "result", hit
+                return
+            self.cache.record_miss()
+        
+        final_state = None
+        async for mode, chunk in self.agent.astream(
+            self._initial_state(document, compliance_area),
+            stream_mode=["updates", "messages"]
+        ):
+            if mode == "messages":
+                message, metadata = chunk
+                # Only the analysis is free text; the summary is JSON and is sent whole
+                if metadata.get("langgraph_node") == "analyze" and message.content:
+                    event = {"token": message.content}
+                    for tag in metadata.get("tags", []):
+                        if tag.startswith("section:"):
+                            event["section"] = int(tag.split(":", 1)[1])
+                    yield "issues_token", event
+                continue
+            
+            for node, state in chunk.items():
+                final_state = state
+                if node == "retrieve":
+                    yield "sources", {"sources": [
+                        {"source": doc.metadata.get("source"), "content": doc.page_content}
+                        for doc in state["retrieved_documents"]
+                    ]}
+                elif node == "analyze":
+                    yield "issues", {"compliance_issues": state["compliance_issues"]}
+                elif node == "summarize":
+                    yield "summary", {"suggestions": state["suggestions"], "references": state["references"]}
+                elif node == "review":
+                    yield "issues", {"compliance_issues": state["compliance_issues"]}
+                    yield "summary", {"suggestions": state["suggestions"], "references": state["references"]}
+        
+        result = self._format_result(document, final_state)
+        if self.cache is not None:
+            await self._acache_put(key, namespace, result)
+        yield "result", result
+    
+    def _batch_states(self, documents: List[str], compliance_areas: Optional[List[str]]) -> List[AgentState]:
+        if compliance_areas is None:
+            compliance_areas = ["general"] * len(documents)
+        if len(compliance_areas) != len(documents):
+            raise ValueError("compliance_areas must have one entry per document")
+        return [self._initial_state(doc, area) for doc, area in zip(documents, compliance_areas)]
+    
+    def _batch_lookups(self, states: List[AgentState]) -> List[Tuple[str, str, Optional[Dict]]]:
+        # Batches only use exact cache hits; near-duplicate lookups would cost an embedding per document
+        if self.cache is None:
+            return [(None, None, None)] * len(states)
+        lookups = [self._cache_lookup(state["document"], state["compliance_area"]) for state in states]
+        for _, _, hit in lookups:
+            if hit is None:
+                self.cache.record_miss()
+        return lookups
+    
+    def _short_states(self, states: List[AgentState]) -> List[AgentState]:
+        # Long documents keep the retrieve node so they get per-section context
+        return [state for state in states if count_tokens(state["document"]) <= settings.ANALYSIS_SECTION_TOKENS]
+    
+    def _prefill_retrieval(self, states: List[AgentState], retrieved: List[list]) -> None:
+        # Skip the retrieve node for documents whose context was fetched in bulk
+        for state, docs in zip(states, retrieved):
+            state["retrieved_documents"] = fit_to_budget(docs)
+            state["next"] = _after_retrieval([state["retrieved_documents"]])
+    
+    def _batch_results(self, states: List[AgentState], lookups: list, results: list) -> List[Dict]:
+        results = iter(results)
+        items = []
+        for i, (state, (key, namespace, hit)) in enumerate(zip(states, lookups)):
+            document = state["document"]
+            if hit is not None:
+                items.append({"index": i, "result": self._cache_hit(document, hit), "error": None})
+                continue
+            
+            result = next(results)
+            if isinstance(result, Exception):
+                items.append({"index": i, "result": None, "error": str(result)})
+            else:
+                formatted = self._format_result(document, result)
+                if self.cache is not None:
+                    self._cache_put(key, namespace, formatted)
+                items.append({"index": i, "result": formatted, "error": None})
+        return items
+    
+    def run_batch(self, documents: List[str], compliance_areas: Optional[List[str]] = None) -> List[Dict]:
+        """Run the compliance agent on many documents.
+        
+        Retrieval for the whole batch uses one embeddings request and one FAISS
+        search. Results are returned in input order; a failing document is
+        reported in its own entry instead of failing the batch.
+        """
+        states = self._batch_states(documents, compliance_areas)
+        lookups = self._batch_lookups(states)
+        pending = [state for state, (_, _, hit) in zip(states, lookups) if hit is None]
+        short = self._short_states(pending)
+        
+        if short:
+            try:
+                retrieved = batch_similarity_search(
+                    [_retrieval_query(state) for state in short], k=_retrieval_k(),
+                    compliance_areas=[state["compliance_area"] for state in short]
+                )
+                self._prefill_retrieval(short, retrieved)
+            except _batch_retrieval_errors():
+                # Fall back to retrieving per document inside the graph
+                logger.exception("Batch retrieval of %d documents failed, retrieving per document", len(short))
+        
+        results = self.agent.batch(
+            pending,
+            config={"max_concurrency": settings.BATCH_MAX_CONCURRENCY},
+            return_exceptions=True
+        ) if pending else []
+        return self._batch_results(states, lookups, results)
+    
+    async def arun_batch(self, documents: List[str], compliance_areas: Optional[List[str]] = None) -> List[Dict]:
+        """Async variant of run_batch."""
+        states = self._batch_states(documents, compliance_areas)
+        # Disk-tier lookups and writes stay off the event loop
+        disk = self.cache is not None and self.cache.disk_enabled
+        lookups = await asyncio.to_thread(self._batch_lookups, states) if disk else self._batch_lookups(states)
+        pending = [state for state, (_, _, hit) in zip(states, lookups) if hit is None]
+        short = self._short_states(pending)
+        
+        if short:
+            try:
+                retrieved = await abatch_similarity_search(
+                    [_retrieval_query(state) for state in short], k=_retrieval_k(),
+                    compliance_areas=[state["compliance_area"] for state in short]
+                )
+                self._prefill_retrieval(short, retrieved)
+            except _batch_retrieval_errors():
+                # Fall back to retrieving per document inside the graph
+                logger.exception("Batch retrieval of %d documents failed, retrieving per document", len(short))
+        
+        results = await self.agent.abatch(
+            pending,
+            config={"max_concurrency": settings.BATCH_MAX_CONCURRENCY},
+            return_exceptions=True
+        ) if pending else []
+        if disk:
+            return await asyncio.to_thread(self._batch_results, states, lookups, results)
+        return self._batch_results(states, lookups, results)
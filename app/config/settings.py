@@ -11,16 +11,169 @@ class Settings(BaseSettings):
     # API settings
     API_HOST: str = "0.0.0.0"
     API_PORT: int = 8000
+    # Load the vector store and clients in the background at startup; /ready reports when done
+    WARMUP_ENABLED: bool = True
+    
+    # Production serving (gunicorn -c app/gunicorn_conf.py app.main:app)
+    SERVE_WORKERS: Optional[int] = None  # unset = one per CPU core
+    # Concurrent connections per worker; beyond it requests get 503 (unset = unlimited)
+    SERVE_WORKER_CONCURRENCY: Optional[int] = None
+    # Recycle a worker after this many requests (plus up to the jitter), letting in-flight requests finish
+    SERVE_MAX_REQUESTS: int = 10000
+    SERVE_MAX_REQUESTS_JITTER: int = 1000
+    SERVE_GRACEFUL_TIMEOUT: int = 30
+    SERVE_TIMEOUT: int = 120
+    # Load the index in the master process so forked workers share it
+    SERVE_PRELOAD_INDEX: bool = True
     
     # LLM settings
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     LLM_MODEL: str = "gpt-4o"
+    EMBEDDING_MODEL: str = "text-embedding-ada-002"
+    
+    # HTTP connection pool settings for LLM and embedding clients
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_TIMEOUT: float = 60.0
+    
+    # Request budget shared by all LLM calls in a process (unset = unlimited)
+    LLM_REQUESTS_PER_SECOND: Optional[float] = None
+    
+    # Model routing. Models are "name" (OpenAI) or "provider:name" for an entry of LLM_PROVIDERS,
+    # any OpenAI-compatible endpoint: {"local": {"base_url": "http://localhost:8080/v1", "api_key": "x"}}
+    OPENAI_BASE_URL: Optional[str] = os.getenv("OPENAI_BASE_URL") or None
+    LLM_PROVIDERS: Dict[str, Dict[str, str]] = {}
+    # Models per graph node, tried in order on errors: {"summarize": ["gpt-4o-mini", "local:llama3"]}
+    LLM_ROUTES: Dict[str, List[str]] = {}
+    # Tried in order when a node's model fails (nodes without a route use LLM_MODEL)
+    LLM_FALLBACK_MODELS: List[str] = []
+    # Per-attempt timeout, and retries (with backoff, on rate limits and server errors) before failing over
+    LLM_TIMEOUT: float = 60.0
+    LLM_MAX_RETRIES: int = 2
+    # Cheap model screening documents first; only likely or uncertain issues reach the analysis model
+    LLM_TRIAGE_MODEL: Optional[str] = None
+    LLM_TRIAGE_CONFIDENCE: float = 0.8
+    
+    # Compliance graph: "two_pass" (analyze, then summarize) or "single_pass" (one structured-output call)
+    AGENT_MODE: str = "two_pass"
+    
+    # Long-document analysis: documents above the budget are analyzed section by section
+    ANALYSIS_SECTION_TOKENS: int = 6000
+    ANALYSIS_SECTION_OVERLAP_TOKENS: int = 200
+    ANALYSIS_MAX_CONCURRENCY: int = 4
+    
+    # Reference context assembly for the analyze and summarize prompts
+    CONTEXT_MAX_TOKENS: int = 2000
+    CONTEXT_DUPLICATE_THRESHOLD: float = 0.8
+    # Drop passages below this embedding similarity to the query (unset = keep all; costs an embeddings call)
+    CONTEXT_RELEVANCE_THRESHOLD: Optional[float] = None
+    
+    # Response cache settings
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    RESPONSE_CACHE_TTL_SECONDS: float = 86400
+    # Serve near-duplicate documents above this embedding similarity (unset = exact hits only;
+    # costs an embeddings call per miss, and documents over 8000 characters only hit exactly)
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD: Optional[float] = None
+    RESPONSE_CACHE_DISK_PATH: Optional[str] = None
+    
+    # Batch settings
+    BATCH_MAX_SIZE: int = 500
+    BATCH_MAX_CONCURRENCY: int = 8
+    
+    # Background job settings
+    JOBS_ENABLED: bool = True
+    # SQLite file holding job records, results and graph checkpoints
+    JOBS_DB_PATH: str = "app/data/jobs.sqlite"
+    JOBS_WORKERS: int = 2
+    # Re-run jobs a previous process left running when the queue starts; turned off in
+    # forked workers, whose master recovers them once before forking
+    JOBS_RECOVER_RUNNING: bool = True
+    # Submissions are refused once this many jobs are waiting
+    JOBS_QUEUE_MAX_SIZE: int = 1000
+    JOBS_MAX_DOCUMENTS: int = 10000
+    # How often job status streams poll for jobs run by other processes
+    JOBS_POLL_INTERVAL: float = 1.0
     
     # Vector database settings
     VECTOR_DB_PATH: str = "app/data/vector_db"
+    # Store indexes as inverted lists and memory-map them, so processes share one copy of the vectors
+    VECTOR_DB_MMAP: bool = True
+    RETRIEVAL_THREADS: int = 4
+    # How often each process checks for a newly activated index version (unset = never)
+    INDEX_RELOAD_INTERVAL: Optional[float] = 5.0
+    # Query a new index version must answer before it is activated
+    INDEX_SMOKE_QUERY: str = "patient authorization for disclosure of health information"
+    # Token required in the X-Admin-Token header of /admin endpoints (unset = admin API disabled)
+    ADMIN_API_TOKEN: Optional[str] = None
+    # "auto", "flat", "ivf", "hnsw", "ivfpq", or a FAISS index_factory string
+    VECTOR_INDEX_TYPE: str = "auto"
+    # With "auto": exact search up to FLAT_MAX vectors, HNSW (IVF with VECTOR_DB_MMAP) up to HNSW_MAX, IVF-PQ beyond
+    VECTOR_INDEX_FLAT_MAX: int = 20000
+    VECTOR_INDEX_HNSW_MAX: int = 500000
+    # IVF lists; defaults to 4 * sqrt(vector count)
+    VECTOR_INDEX_NLIST: Optional[int] = None
+    VECTOR_INDEX_NPROBE: int = 16
+    VECTOR_INDEX_HNSW_M: int = 32
+    VECTOR_INDEX_EF_CONSTRUCTION: int = 200
+    VECTOR_INDEX_EF_SEARCH: int = 64
+    # Bytes per vector for product quantization, rounded down to a divisor of the dimension
+    VECTOR_INDEX_PQ_M: int = 64
+    
+    # Retrieval settings
+    RETRIEVAL_K: int = 3
+    # Drop chunks below this relevance score (0-1, from the FAISS distance; unset = keep all).
+    # When set, up to RETRIEVAL_MAX_K chunks are retrieved and trimmed to CONTEXT_MAX_TOKENS.
+    RETRIEVAL_RELEVANCE_THRESHOLD: Optional[float] = None
+    RETRIEVAL_MAX_K: int = 8
+    # With no relevant chunk: "analyze" without reference context, or "skip" the LLM and report no issues
+    RETRIEVAL_NO_CONTEXT_ACTION: str = "analyze"
+    # Fuse BM25 keyword matches with dense results by reciprocal rank
+    HYBRID_SEARCH_ENABLED: bool = True
+    # Candidates taken from each of the dense and lexical rankings before fusion
+    HYBRID_CANDIDATES: int = 20
+    HYBRID_RRF_K: int = 60
+    HYBRID_BM25_K1: float = 1.2
+    HYBRID_BM25_B: float = 0.75
+    
+    # Embedding cache shared by processes on the host (path defaults to embeddings.sqlite in VECTOR_DB_PATH)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: Optional[str] = None
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 1000000
+    EMBEDDING_CACHE_MEMORY_ENTRIES: int = 10000
+    # "float16" halves the file size at a small precision cost
+    EMBEDDING_CACHE_DTYPE: str = "float32"
     
     # Compliance document settings
     COMPLIANCE_DOCS_PATH: str = "app/data/compliance_docs"
+    CHUNK_SIZE: int = 1000
+    CHUNK_OVERLAP: int = 200
+    # JSON file in COMPLIANCE_DOCS_PATH mapping file names to compliance areas
+    COMPLIANCE_AREA_MANIFEST: str = "areas.json"
+    # Files not listed in the manifest are tagged by these words in their name; untagged files are "general"
+    COMPLIANCE_AREA_KEYWORDS: Dict[str, List[str]] = {
+        "HIPAA": ["hipaa"],
+        "HITECH": ["hitech"],
+        "FDA": ["fda"],
+        "Stark": ["stark"],
+        "AKS": ["aks", "kickback"],
+        "FCA": ["fca", "false_claims"],
+    }
+    
+    # Metrics settings
+    METRICS_ENABLED: bool = True
+    # Directory where gunicorn workers share metrics (unset = a new temporary directory per run)
+    METRICS_MULTIPROC_DIR: Optional[str] = None
+    # Add a Server-Timing header with the per-request node/embedding/search breakdown
+    METRICS_TIMING_HEADER: bool = False
+    # Compliance areas used as metric labels; anything else is reported as "other"
+    METRICS_COMPLIANCE_AREAS: List[str] = ["general", "HIPAA", "FDA", "Stark", "AKS", "FCA", "HITECH"]
+    # USD per million prompt/completion tokens, matched by model-name prefix
+    LLM_PRICING: Dict[str, List[float]] = {
+        "gpt-4o-mini": [0.15, 0.60],
+        "gpt-4o": [2.50, 10.00],
+    }
     
     # Logging settings
     LOG_LEVEL: str = "INFO"
@@ -0,0 +1,118 @@
+"""Gunicorn configuration for production serving.
+
+    gunicorn -c app/gunicorn_conf.py app.main:app
+
+The app and its vector store are loaded once in the master process and the
+workers are forked from it, so the docstore and BM25 index are shared
+copy-on-write instead of being loaded into each worker's private memory. With
+VECTOR_DB_MMAP the FAISS index is a read-only mapping of the index file, so
+its vectors are shared through the page cache. Workers are recycled after
+SERVE_MAX_REQUESTS requests; a recycled worker finishes its in-flight requests
+and returns its running jobs to the queue, and its replacement is forked from
+the preloaded master, so it is ready at once.
+
+Prometheus metrics of all workers are aggregated through files in
+PROMETHEUS_MULTIPROC_DIR, so /metrics reports the whole server whichever
+worker answers the scrape.
+
+A new index version activated while the server runs is loaded by each worker
+on its own (see check_active_index), and so is the active version in a
+recycled worker if it is no longer the preloaded one. With VECTOR_DB_MMAP the
+workers map the same index file, so its vectors stay shared; the docstore and
+BM25 index of the new version are private to each worker until gunicorn is
+sent HUP: on_reload then loads the active version in the master and the
+replacement workers are forked from it.
+"""
+import gc
+import glob
+import multiprocessing
+import os
+import sys
+import tempfile
+
+from uvicorn.workers import UvicornWorker
+
+from app.config.settings import settings
+
+# Must be set before the app imports prometheus_client, and hold no files of a
+# previous run (their counters would be added to this one's). This file is
+# read again on HUP, when the files belong to the running workers.
+if "prometheus_client" not in sys.modules:
+    _metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or settings.METRICS_MULTIPROC_DIR \
+        or tempfile.mkdtemp(prefix="prometheus-")
+    os.makedirs(_metrics_dir, exist_ok=True)
+    for _path in glob.glob(os.path.join(_metrics_dir, "*.db")):
+        os.remove(_path)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = _metrics_dir
+
+class ComplianceWorker(UvicornWorker):
+    """Uvicorn worker with the per-worker concurrency limit from settings."""
+
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "limit_concurrency": settings.SERVE_WORKER_CONCURRENCY}
+
+bind = f"{settings.API_HOST}:{settings.API_PORT}"
+workers = settings.SERVE_WORKERS or multiprocessing.cpu_count()
+worker_class = ComplianceWorker
+preload_app = True
+max_requests = settings.SERVE_MAX_REQUESTS
+max_requests_jitter = settings.SERVE_MAX_REQUESTS_JITTER
+graceful_timeout = settings.SERVE_GRACEFUL_TIMEOUT
+timeout = settings.SERVE_TIMEOUT
+
+def when_ready(server):
+    """Load shared state in the master, before any worker is forked."""
+    from app.services import vector_store
+    from app.services.jobs import JobStore, create_sqlite_engine
+    from app.services.tokens import count_tokens
+
+    if settings.JOBS_ENABLED:
+        # Jobs left running by the previous server; from here on a running job belongs to a live worker
+        JobStore(create_sqlite_engine(settings.JOBS_DB_PATH)).requeue_unfinished()
+        settings.JOBS_RECOVER_RUNNING = False
+
+    if settings.SERVE_PRELOAD_INDEX:
+        _share_index(vector_store.get_vector_store())
+    count_tokens("")
+
+    # Objects loaded so far are never collected, so garbage collections in the
+    # workers do not write to their pages and un-share them
+    gc.freeze()
+    server.log.info("Preloaded shared state for %s workers", workers)
+
+def on_reload(server):
+    """Preload the active index version in the master before HUP replaces the workers."""
+    from app.services import vector_store
+
+    if not settings.SERVE_PRELOAD_INDEX:
+        return
+    try:
+        if not vector_store.reload_active_index():
+            return
+    except Exception:
+        server.log.exception("Active index version failed to load; workers keep the preloaded one")
+        return
+    _share_index(vector_store.get_vector_store())
+    gc.freeze()
+    server.log.info("Preloaded index version %s for the new workers", vector_store.loaded_index_version())
+
+def _share_index(store):
+    from app.services import vector_store
+
+    vector_store.area_ids(store)
+    vector_store.lexical_index(store)
+    # The master serves no searches; each worker reports the version it serves
+    vector_store.INDEX_VERSION.labels(version=vector_store.loaded_index_version() or "unknown").set(0)
+
+def post_fork(server, worker):
+    """Give each worker its own HTTP clients and search threads."""
+    from app.services import vector_store
+    from app.services.llm import reset_clients
+
+    reset_clients()
+    vector_store.reset_after_fork()
+
+def child_exit(server, worker):
+    """Drop the live gauges of an exited worker; its counters stay in the totals."""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
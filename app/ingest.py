@@ -0,0 +1,35 @@
+"""Command-line entry point for ingesting the compliance corpus into the vector store.
+
+Each run builds an index version, checks it with a smoke query and activates
+it; running servers swap it in within INDEX_RELOAD_INTERVAL seconds.
+
+Usage:
+    python -m app.ingest                    # embed only new or changed chunks
+    python -m app.ingest --full             # re-embed the whole corpus
+    python -m app.ingest --no-activate      # build and validate without serving it
+    python -m app.ingest --activate VERSION # serve a persisted version
+    python -m app.ingest --rollback         # serve the version the active one replaced
+"""
+import argparse
+import json
+
+from app.services.vector_store import activate_index_version, build_index_version, rollback_index
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest compliance documents into the vector store.")
+    parser.add_argument("--full", action="store_true", help="Rebuild the index from scratch instead of updating it.")
+    parser.add_argument("--no-activate", action="store_true", help="Build and validate the index without activating it.")
+    parser.add_argument("--activate", metavar="VERSION", help="Activate a persisted index version instead of building.")
+    parser.add_argument("--rollback", action="store_true", help="Re-activate the previously active index version.")
+    args = parser.parse_args(argv)
+
+    if args.rollback:
+        result = rollback_index()
+    elif args.activate:
+        result = activate_index_version(args.activate)
+    else:
+        result = build_index_version(full_rebuild=args.full, activate=not args.no_activate)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
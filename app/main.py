@@ -1,30 +1,233 @@
 import os
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+import logging
+import secrets
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from starlette.routing import Match
 from pydantic import BaseModel
+from typing import List, Optional
 
 from app.agents.compliance_agent import ComplianceAgent
+from app.config.settings import settings
+from app.services.llm import get_llm, get_embeddings, close_clients
+from app.services.tokens import count_tokens
+from app.services.vector_store import (
+    activate_index_version,
+    build_index_version,
+    get_vector_store,
+    index_build_running,
+    index_status,
+    loaded_index_version,
+    rollback_index
+)
+from app.services.metrics import (
+    REQUESTS_IN_FLIGHT,
+    REQUEST_ERRORS,
+    metrics_registry,
+    start_request_timing,
+    server_timing_header
+)
+from app.services.jobs import JobQueue, JobQueueFull, create_job_queue
+from app.services.response_cache import get_response_cache
 
-app = FastAPI(title="Healthcare Compliance RAG System")
+logger = logging.getLogger(__name__)
+
+def _warm_up() -> None:
+    # Everything the first request would otherwise build: clients, tokenizer and the index
+    get_llm()
+    get_embeddings()
+    count_tokens("")
+    get_vector_store()
+
+async def _run_warmup(app: FastAPI) -> None:
+    start = time.perf_counter()
+    try:
+        await asyncio.to_thread(_warm_up)
+    except Exception as e:
+        logger.exception("Warm-up failed")
+        app.state.warmup = {"status": "failed", "error": str(e)}
+        return
+    app.state.warmup = {"status": "ready", "seconds": round(time.perf_counter() - start, 3)}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the compiled graph once per worker process; loading the index and
+    # clients runs in the background so the server accepts connections at once
+    app.state.agent = ComplianceAgent(cache=get_response_cache())
+    app.state.index_build = {"status": "idle"}
+    warmup = None
+    if settings.WARMUP_ENABLED:
+        app.state.warmup = {"status": "warming_up"}
+        warmup = asyncio.create_task(_run_warmup(app))
+    else:
+        app.state.warmup = {"status": "ready", "seconds": 0.0}
+    app.state.jobs = None
+    if settings.JOBS_ENABLED:
+        app.state.jobs = create_job_queue(cache=get_response_cache())
+        await app.state.jobs.start()
+    yield
+    if warmup is not None:
+        warmup.cancel()
+        await asyncio.gather(warmup, return_exceptions=True)
+    if app.state.jobs is not None:
+        await app.state.jobs.stop()
+    await close_clients()
+
+app = FastAPI(title="Healthcare Compliance RAG System", lifespan=lifespan)
+
+def _route_template(request: Request) -> str:
+    # Label by route template, not raw path, to keep metric cardinality bounded
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+class RequestsInFlightMiddleware:
+    """Count each request as in flight until its response body has been sent.
+    
+    A plain ASGI middleware, since call_next in an HTTP middleware returns as
+    soon as a streaming response starts, long before an SSE stream ends.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+        
+        in_flight = REQUESTS_IN_FLIGHT.labels(endpoint=_route_template(Request(scope)))
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            in_flight.dec()
+
+app.add_middleware(RequestsInFlightMiddleware)
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    if not settings.METRICS_ENABLED or request.url.path == "/metrics":
+        return await call_next(request)
+    
+    endpoint = _route_template(request)
+    timings = start_request_timing() if settings.METRICS_TIMING_HEADER else None
+    
+    try:
+        response = await call_next(request)
+    except Exception:
+        REQUEST_ERRORS.labels(endpoint=endpoint).inc()
+        raise
+    
+    if response.status_code >= 500:
+        REQUEST_ERRORS.labels(endpoint=endpoint).inc()
+    if timings:
+        response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
+
+@app.middleware("http")
+async def index_version_header(request: Request, call_next):
+    response = await call_next(request)
+    version = loaded_index_version()
+    if version:
+        response.headers["X-Index-Version"] = version
+    return response
+
+def get_agent(request: Request) -> ComplianceAgent:
+    return request.app.state.agent
+
+def require_admin(request: Request) -> None:
+    # Closed unless a token is configured: rebuilds spend embedding credits and swaps change live answers
+    token = settings.ADMIN_API_TOKEN
+    if not token:
+        raise HTTPException(status_code=403, detail="Admin API is disabled; set ADMIN_API_TOKEN to enable it")
+    if not secrets.compare_digest(request.headers.get("X-Admin-Token", ""), token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def get_job_queue(request: Request) -> JobQueue:
+    jobs = getattr(request.app.state, "jobs", None)
+    if jobs is None:
+        raise HTTPException(status_code=503, detail="Background jobs are disabled")
+    return jobs
 
 class DocumentRequest(BaseModel):
     document_text: str
     compliance_area: str = "general"  # e.g., "HIPAA", "FDA", "general"
-    
+
 class ComplianceResponse(BaseModel):
     document_text: str
     compliance_issues: list
     suggestions: list
     references: list
 
+class BatchDocumentRequest(BaseModel):
+    documents: List[DocumentRequest]
+
+class BatchItemResult(BaseModel):
+    index: int
+    result: Optional[ComplianceResponse] = None
+    error: Optional[str] = None
+
+class BatchComplianceResponse(BaseModel):
+    results: List[BatchItemResult]
+
+class IndexBuildRequest(BaseModel):
+    full: bool = False  # re-embed the whole corpus instead of only changed chunks
+
+class IndexActivateRequest(BaseModel):
+    version: str
+
+class JobRequest(BaseModel):
+    documents: List[DocumentRequest]
+    priority: int = 0  # higher runs first
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: str  # queued, running, completed or failed
+    priority: int
+    total_documents: int
+    completed_documents: int
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    results: Optional[List[BatchItemResult]] = None
+    error: Optional[str] = None
+
+def _job_response(job: dict) -> dict:
+    return {**{key: value for key, value in job.items() if key not in ("id", "documents")}, "job_id": job["id"]}
+
 @app.get("/")
 async def root():
     return {"status": "Healthcare Compliance RAG System is running"}
 
+@app.get("/ready")
+async def ready(request: Request):
+    """Readiness probe: 200 once warm-up has loaded the index and clients, 503 until then."""
+    warmup = getattr(request.app.state, "warmup", {"status": "warming_up"})
+    if warmup["status"] != "ready":
+        return JSONResponse(warmup, status_code=503)
+    return {**warmup, "index_version": loaded_index_version()}
+
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    cache = get_response_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
 @app.post("/compliance_checks", response_model=ComplianceResponse)
-async def check_compliance(request: DocumentRequest):
+async def check_compliance(request: DocumentRequest, agent: ComplianceAgent = Depends(get_agent)):
     try:
-        agent = ComplianceAgent()
-        result = agent.run(
+        result = await agent.arun(
             document=request.document_text,
             compliance_area=request.compliance_area
         )
@@ -32,6 +235,141 @@ async def check_compliance(request: DocumentRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/compliance_checks/stream")
+async def check_compliance_stream(request: DocumentRequest, agent: ComplianceAgent = Depends(get_agent)):
+    """Stream compliance results as Server-Sent Events while the graph runs."""
+    async def events():
+        try:
+            async for event, data in agent.astream(
+                document=request.document_text,
+                compliance_area=request.compliance_area
+            ):
+                yield _sse(event, data)
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/compliance_checks/batch", response_model=BatchComplianceResponse)
+async def check_compliance_batch(request: BatchDocumentRequest, agent: ComplianceAgent = Depends(get_agent)):
+    if len(request.documents) > settings.BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch size {len(request.documents)} exceeds the limit of {settings.BATCH_MAX_SIZE}"
+        )
+    
+    try:
+        results = await agent.arun_batch(
+            documents=[doc.document_text for doc in request.documents],
+            compliance_areas=[doc.compliance_area for doc in request.documents]
+        )
+        return {"results": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_job(request: JobRequest, jobs: JobQueue = Depends(get_job_queue)):
+    """Queue documents for background checking; poll or stream the returned job for results."""
+    if len(request.documents) > settings.JOBS_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Job size {len(request.documents)} exceeds the limit of {settings.JOBS_MAX_DOCUMENTS}"
+        )
+    
+    try:
+        job = await jobs.submit([doc.model_dump() for doc in request.documents], priority=request.priority)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return _job_response(job)
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, jobs: JobQueue = Depends(get_job_queue)):
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str, jobs: JobQueue = Depends(get_job_queue)):
+    """Stream the job as Server-Sent "status" events until it completes or fails."""
+    if await jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        async for job in jobs.watch(job_id):
+            yield _sse("status", JobResponse(**_job_response(job)).model_dump())
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _run_index_build(app: FastAPI, full: bool) -> None:
+    build = app.state.index_build
+    try:
+        result = await asyncio.to_thread(build_index_version, full)
+    except Exception as e:
+        logger.exception("Index build failed")
+        app.state.index_build = {**build, "status": "failed", "error": str(e), "finished_at": time.time()}
+        return
+    app.state.index_build = {**build, "status": "completed", "result": result, "finished_at": time.time()}
+
+async def _index_build_idle(request: Request) -> None:
+    # This worker's own build may not hold the lock yet; builds in other workers
+    # and processes are seen through the lock file they all share
+    if request.app.state.index_build["status"] == "building" or await asyncio.to_thread(index_build_running):
+        raise HTTPException(status_code=409, detail="An index build is already running")
+
+@app.get("/admin/index", dependencies=[Depends(require_admin)])
+async def get_index(request: Request):
+    """Active, previous and loaded index versions, the persisted versions and this worker's last build."""
+    status = await asyncio.to_thread(index_status)
+    return {**status, "build": request.app.state.index_build}
+
+@app.post("/admin/index/rebuild", status_code=202, dependencies=[Depends(require_admin)])
+async def rebuild_index(request: Request, build: Optional[IndexBuildRequest] = None):
+    """Build, validate and activate an index version for the current corpus in the background.
+    
+    Requests keep being served from the loaded version until the new one has
+    passed validation; other workers swap it in within INDEX_RELOAD_INTERVAL.
+    """
+    await _index_build_idle(request)
+    full = build is not None and build.full
+    request.app.state.index_build = {"status": "building", "full": full, "started_at": time.time()}
+    # Kept on app.state so the task is not garbage collected while it runs
+    request.app.state.index_build_task = asyncio.create_task(_run_index_build(request.app, full))
+    return request.app.state.index_build
+
+@app.post("/admin/index/activate", dependencies=[Depends(require_admin)])
+async def activate_version(request: Request, activate: IndexActivateRequest):
+    """Validate a persisted index version and swap it in."""
+    await _index_build_idle(request)
+    try:
+        await asyncio.to_thread(activate_index_version, activate.version)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return await asyncio.to_thread(index_status)
+
+@app.post("/admin/index/rollback", dependencies=[Depends(require_admin)])
+async def rollback(request: Request):
+    """Swap the previously active index version back in."""
+    await _index_build_idle(request)
+    try:
+        await asyncio.to_thread(rollback_index)
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return await asyncio.to_thread(index_status)
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8000))) 
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8000)))
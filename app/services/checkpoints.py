@@ -0,0 +1,193 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from sqlalchemy import Column, Integer, LargeBinary, MetaData, String, Table, delete, select
+from sqlalchemy.engine import Engine
+
+metadata = MetaData()
+
+checkpoints_table = Table(
+    "graph_checkpoints",
+    metadata,
+    Column("thread_id", String, primary_key=True),
+    Column("checkpoint_ns", String, primary_key=True),
+    Column("checkpoint_id", String, primary_key=True),
+    Column("parent_checkpoint_id", String),
+    Column("type", String),
+    Column("checkpoint", LargeBinary),
+    Column("metadata_type", String),
+    Column("metadata", LargeBinary),
+)
+
+writes_table = Table(
+    "graph_checkpoint_writes",
+    metadata,
+    Column("thread_id", String, primary_key=True),
+    Column("checkpoint_ns", String, primary_key=True),
+    Column("checkpoint_id", String, primary_key=True),
+    Column("task_id", String, primary_key=True),
+    Column("idx", Integer, primary_key=True),
+    Column("channel", String),
+    Column("type", String),
+    Column("value", LargeBinary),
+)
+
+def _thread_config(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> RunnableConfig:
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+class SQLAlchemyCheckpointSaver(BaseCheckpointSaver):
+    """LangGraph checkpointer storing graph state in a SQL database.
+
+    A graph compiled with it saves its state after every node, so a run that
+    is interrupted can be resumed under the same thread id from the last
+    completed node instead of starting over. Async methods run the blocking
+    queries in a thread.
+    """
+
+    def __init__(self, engine: Engine, **kwargs):
+        super().__init__(**kwargs)
+        self.engine = engine
+        metadata.create_all(engine)
+
+    def _tuple(self, conn, row) -> CheckpointTuple:
+        writes = conn.execute(
+            select(writes_table.c.task_id, writes_table.c.channel, writes_table.c.type, writes_table.c.value)
+            .where(
+                writes_table.c.thread_id == row.thread_id,
+                writes_table.c.checkpoint_ns == row.checkpoint_ns,
+                writes_table.c.checkpoint_id == row.checkpoint_id,
+            )
+            .order_by(writes_table.c.task_id, writes_table.c.idx)
+        ).all()
+        return CheckpointTuple(
+            config=_thread_config(row.thread_id, row.checkpoint_ns, row.checkpoint_id),
+            checkpoint=self.serde.loads_typed((row.type, row.checkpoint)),
+            metadata=self.serde.loads_typed((row.metadata_type, row.metadata)),
+            parent_config=(
+                _thread_config(row.thread_id, row.checkpoint_ns, row.parent_checkpoint_id)
+                if row.parent_checkpoint_id else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((type_, value)))
+                for task_id, channel, type_, value in writes
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        configurable = config["configurable"]
+        query = select(checkpoints_table).where(
+            checkpoints_table.c.thread_id == configurable["thread_id"],
+            checkpoints_table.c.checkpoint_ns == configurable.get("checkpoint_ns", ""),
+        )
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id:
+            query = query.where(checkpoints_table.c.checkpoint_id == checkpoint_id)
+        else:
+            # Checkpoint ids sort in creation order
+            query = query.order_by(checkpoints_table.c.checkpoint_id.desc()).limit(1)
+
+        with self.engine.connect() as conn:
+            row = conn.execute(query).first()
+            return self._tuple(conn, row) if row else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query = select(checkpoints_table).order_by(checkpoints_table.c.checkpoint_id.desc())
+        if config:
+            configurable = config["configurable"]
+            query = query.where(checkpoints_table.c.thread_id == configurable["thread_id"])
+            if "checkpoint_ns" in configurable:
+                query = query.where(checkpoints_table.c.checkpoint_ns == configurable["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                query = query.where(checkpoints_table.c.checkpoint_id == get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            query = query.where(checkpoints_table.c.checkpoint_id < get_checkpoint_id(before))
+
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).all()
+            found = 0
+            for row in rows:
+                item = self._tuple(conn, row)
+                if filter and any(item.metadata.get(key) != value for key, value in filter.items()):
+                    continue
+                yield item
+                found += 1
+                if limit is not None and found >= limit:
+                    return
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        type_, serialized = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(metadata)
+
+        with self.engine.begin() as conn:
+            conn.execute(checkpoints_table.insert().prefix_with("OR REPLACE").values(
+                thread_id=thread_id,
+                checkpoint_ns=checkpoint_ns,
+                checkpoint_id=checkpoint["id"],
+                parent_checkpoint_id=configurable.get("checkpoint_id"),
+                type=type_,
+                checkpoint=serialized,
+                metadata_type=metadata_type,
+                metadata=serialized_metadata,
+            ))
+        return _thread_config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        configurable = config["configurable"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, serialized = self.serde.dumps_typed(value)
+            rows.append({
+                "thread_id": configurable["thread_id"],
+                "checkpoint_ns": configurable.get("checkpoint_ns", ""),
+                "checkpoint_id": configurable["checkpoint_id"],
+                "task_id": task_id,
+                # Special channels (errors, interrupts) keep a fixed slot so rewrites replace them
+                "idx": WRITES_IDX_MAP.get(channel, idx),
+                "channel": channel,
+                "type": type_,
+                "value": serialized,
+            })
+        if rows:
+            with self.engine.begin() as conn:
+                conn.execute(writes_table.insert().prefix_with("OR REPLACE"), rows)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(delete(checkpoints_table).where(checkpoints_table.c.thread_id == thread_id))
+            conn.execute(delete(writes_table).where(writes_table.c.thread_id == thread_id))
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
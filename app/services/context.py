@@ -0,0 +1,128 @@
+import re
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.config.settings import settings
+from app.services.llm import get_embeddings
+from app.services.tokens import count_tokens, truncate_to_tokens
+
+# The langchain package is only needed for the optional relevance filter
+if TYPE_CHECKING:
+    from langchain.retrievers.document_compressors import EmbeddingsFilter
+
+# Shortest shared run of characters treated as splitter overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+
+# Passages shorter than this are not worth truncating into the remaining budget
+MIN_PASSAGE_TOKENS = 50
+
+def _merge_pair(first: str, second: str) -> Optional[str]:
+    """Join two chunks if the end of the first is the start of the second."""
+    if second in first:
+        return first
+    # Splitter overlap never exceeds the configured chunk overlap
+    longest = min(len(first), len(second), settings.CHUNK_OVERLAP)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return None
+
+def merge_overlapping(docs: List[Document]) -> List[Document]:
+    """Merge chunks from the same source whose text overlaps, keeping first-seen order."""
+    passages: List[Document] = []
+    for doc in docs:
+        text = doc.page_content.strip()
+        source = doc.metadata.get("source")
+        for i, passage in enumerate(passages):
+            if passage.metadata.get("source") != source:
+                continue
+            merged = _merge_pair(passage.page_content, text) or _merge_pair(text, passage.page_content)
+            if merged is not None:
+                passages[i] = Document(page_content=merged, metadata=passage.metadata)
+                break
+        else:
+            passages.append(Document(page_content=text, metadata=doc.metadata))
+    return passages
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+def drop_near_duplicates(docs: List[Document], threshold: float) -> List[Document]:
+    """Drop passages whose word shingles mostly repeat an earlier passage."""
+    kept: List[Tuple[Document, set]] = []
+    for doc in docs:
+        shingles = _shingles(doc.page_content)
+        duplicate = any(
+            len(shingles & other) / len(shingles | other) >= threshold
+            for _, other in kept
+            if shingles | other
+        )
+        if not duplicate:
+            kept.append((doc, shingles))
+    return [doc for doc, _ in kept]
+
+def _relevance_filter() -> "EmbeddingsFilter":
+    from langchain.retrievers.document_compressors import EmbeddingsFilter
+
+    return EmbeddingsFilter(
+        embeddings=get_embeddings(),
+        similarity_threshold=settings.CONTEXT_RELEVANCE_THRESHOLD
+    )
+
+def _assemble(passages: List[Document], max_tokens: int) -> Tuple[str, int]:
+    """Format passages as numbered sources until the token budget is spent."""
+    parts = []
+    used = 0
+    for passage in passages:
+        part = f"Source {len(parts) + 1}: {passage.page_content}"
+        tokens = count_tokens(part) + (1 if parts else 0)
+        if used + tokens > max_tokens:
+            remaining = max_tokens - used - 1
+            if remaining >= MIN_PASSAGE_TOKENS:
+                part = truncate_to_tokens(part, remaining)
+                parts.append(part)
+                used += count_tokens(part) + 1
+            break
+        parts.append(part)
+        used += tokens
+    return "\n".join(parts), used
+
+def fit_to_budget(docs: List[Document], max_tokens: int = None) -> List[Document]:
+    """Keep chunks in rank order while their combined size fits the context budget.
+
+    The first chunk is always kept; build_context truncates it if needed.
+    """
+    max_tokens = max_tokens or settings.CONTEXT_MAX_TOKENS
+    kept = []
+    used = 0
+    for doc in docs:
+        used += count_tokens(doc.page_content)
+        if kept and used > max_tokens:
+            break
+        kept.append(doc)
+    return kept
+
+def _prepare(docs: List[Document]) -> List[Document]:
+    return drop_near_duplicates(merge_overlapping(docs), settings.CONTEXT_DUPLICATE_THRESHOLD)
+
+def build_context(docs: List[Document], query: str = None, max_tokens: int = None) -> Tuple[str, int]:
+    """Build the reference context shared by the analyze and summarize prompts.
+
+    Overlapping chunks from the same source are merged, near-duplicates are
+    dropped, passages are optionally filtered by embedding relevance to the
+    query, and the result is cut to the token budget. Returns the context and
+    the number of tokens it uses.
+    """
+    passages = _prepare(docs)
+    if query and settings.CONTEXT_RELEVANCE_THRESHOLD is not None and passages:
+        passages = list(_relevance_filter().compress_documents(passages, query))
+    return _assemble(passages, max_tokens or settings.CONTEXT_MAX_TOKENS)
+
+async def abuild_context(docs: List[Document], query: str = None, max_tokens: int = None) -> Tuple[str, int]:
+    """Async variant of build_context."""
+    passages = _prepare(docs)
+    if query and settings.CONTEXT_RELEVANCE_THRESHOLD is not None and passages:
+        passages = list(await _relevance_filter().acompress_documents(passages, query))
+    return _assemble(passages, max_tokens or settings.CONTEXT_MAX_TOKENS)
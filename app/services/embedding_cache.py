@@ -0,0 +1,254 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.config.settings import settings
+from app.services.metrics import EMBEDDING_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Disk hits refresh last_used in batches of this many keys, or after this long
+TOUCH_BATCH_SIZE = 256
+TOUCH_FLUSH_SECONDS = 60.0
+
+class EmbeddingStore:
+    """Cache of embedding vectors keyed by model and text hash.
+
+    Vectors are kept in a bounded in-memory LRU and in a SQLite file shared by
+    every process on the host, stored as float32 or float16 blobs. The file
+    evicts its least recently used vectors beyond max_entries.
+
+    To keep writes off the lookup path, last-used times of disk hits are
+    written in batches, and the file size is checked once per 1% of
+    max_entries written, so it may overshoot the limit by that much per
+    process. If the file cannot be opened, vectors are only cached in memory.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 1_000_000,
+        memory_entries: int = 10000,
+        dtype: str = "float32"
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.dtype = np.dtype(dtype)
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Disk hits whose last_used is not written yet, and writes since the last size check
+        self._touched: Dict[str, float] = {}
+        self._touched_at = time.monotonic()
+        self._writes = 0
+        self._eviction_interval = max(1, max_entries // 100)
+
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            with closing(self._connect()) as conn, conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB, last_used REAL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self.disk_enabled = True
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Embedding cache file %s unavailable, caching in memory only: %s", path, e)
+            self.disk_enabled = False
+
+    def make_key(self, model: str, text: str) -> str:
+        # Blobs are decoded with the store's dtype, so stores of another dtype must not find them
+        digest = hashlib.sha256(f"{model}\0{self.dtype.name}".encode("utf-8") + b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get_memory(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Vectors for the keys held in memory."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+        return found
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Vectors for the keys that are cached, from memory, then disk."""
+        found = self.get_memory(keys)
+        missing = list({key for key in keys if key not in found})
+        if not missing or not self.disk_enabled:
+            return found
+
+        with closing(self._connect()) as conn, conn:
+            rows = []
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(missing), 500):
+                batch = missing[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows.extend(conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall())
+
+        if rows:
+            now = time.time()
+            with self._lock:
+                self._touched.update((key, now) for key, _ in rows)
+                flush = (
+                    len(self._touched) >= TOUCH_BATCH_SIZE
+                    or time.monotonic() - self._touched_at >= TOUCH_FLUSH_SECONDS
+                )
+            if flush:
+                with closing(self._connect()) as conn, conn:
+                    self._flush_touched(conn)
+
+        for key, blob in rows:
+            vector = np.frombuffer(blob, dtype=self.dtype).astype(np.float32)
+            self._remember(key, vector)
+            found[key] = vector
+        return found
+
+    def put_many(self, vectors: Dict[str, np.ndarray]) -> None:
+        """Store vectors in memory and on disk, evicting the least recently used beyond the limit."""
+        for key, vector in vectors.items():
+            self._remember(key, vector)
+        if not self.disk_enabled:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._writes += len(vectors)
+            check_size = self._writes >= self._eviction_interval
+            if check_size:
+                self._writes = 0
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=self.dtype).tobytes(), now) for key, vector in vectors.items()]
+            )
+            if not check_size:
+                return
+            # Pending hits count as recent before choosing what to evict
+            self._flush_touched(conn)
+            excess = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                )
+
+    def _flush_touched(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._touched_at = time.monotonic()
+        if touched:
+            conn.executemany(
+                "UPDATE embeddings SET last_used = MAX(last_used, ?) WHERE key = ?",
+                [(used, key) for key, used in touched.items()]
+            )
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings client that only sends texts missing from an EmbeddingStore.
+
+    Cache misses of one call are de-duplicated and embedded in a single
+    request. Query and document embeddings are cached separately, since
+    some models embed them differently.
+    """
+
+    def __init__(self, embeddings: Embeddings, store: EmbeddingStore, model: Optional[str] = None):
+        self.embeddings = embeddings
+        self.store = store
+        self.model = model or getattr(embeddings, "model", None) or type(embeddings).__name__
+
+    def _keys(self, texts: List[str], kind: str) -> List[str]:
+        return [self.store.make_key(f"{self.model}\0{kind}", text) for text in texts]
+
+    def _missing(self, keys: List[str], texts: List[str], found: Dict[str, np.ndarray]) -> Dict[str, str]:
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        EMBEDDING_CACHE_LOOKUPS.labels(result="hit").inc(len(keys) - len(missing))
+        EMBEDDING_CACHE_LOOKUPS.labels(result="miss").inc(len(missing))
+        return missing
+
+    def _lookup(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        # A busy or broken cache file costs an embeddings call, never the request
+        try:
+            return self.store.get_many(keys)
+        except sqlite3.Error as e:
+            logger.warning("Embedding cache lookup failed, embedding without it: %s", e)
+            return self.store.get_memory(keys)
+
+    def _store(self, missing: Dict[str, str], vectors: List[List[float]], found: Dict[str, np.ndarray]) -> None:
+        new = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, vectors)}
+        found.update(new)
+        try:
+            self.store.put_many(new)
+        except sqlite3.Error as e:
+            logger.warning("Embedding cache write failed: %s", e)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = self._keys(texts, "document")
+        found = self._lookup(keys)
+        missing = self._missing(keys, texts, found)
+        if missing:
+            self._store(missing, self.embeddings.embed_documents(list(missing.values())), found)
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        keys = self._keys([text], "query")
+        found = self._lookup(keys)
+        if self._missing(keys, [text], found):
+            self._store({keys[0]: text}, [self.embeddings.embed_query(text)], found)
+        return found[keys[0]].tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = self._keys(texts, "document")
+        # Memory hits need no thread; disk lookups and writes stay off the event loop
+        found = self.store.get_memory(keys)
+        if len(found) < len(set(keys)):
+            found = await asyncio.to_thread(self._lookup, keys)
+        missing = self._missing(keys, texts, found)
+        if missing:
+            vectors = await self.embeddings.aembed_documents(list(missing.values()))
+            await asyncio.to_thread(self._store, missing, vectors, found)
+        return [found[key].tolist() for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        keys = self._keys([text], "query")
+        found = self.store.get_memory(keys) or await asyncio.to_thread(self._lookup, keys)
+        if self._missing(keys, [text], found):
+            vector = await self.embeddings.aembed_query(text)
+            await asyncio.to_thread(self._store, {keys[0]: text}, [vector], found)
+        return found[keys[0]].tolist()
+
+@lru_cache(maxsize=None)
+def get_embedding_store(path: str) -> EmbeddingStore:
+    """Get the process-wide embedding store for a cache file."""
+    return EmbeddingStore(
+        path,
+        max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+        memory_entries=settings.EMBEDDING_CACHE_MEMORY_ENTRIES,
+        dtype=settings.EMBEDDING_CACHE_DTYPE
+    )
@@ -0,0 +1,294 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, Text, create_engine, event, select, update
+from sqlalchemy.engine import Engine
+
+from app.agents.compliance_agent import ComplianceAgent
+from app.config.settings import settings
+from app.services.checkpoints import SQLAlchemyCheckpointSaver
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+metadata = MetaData()
+
+jobs_table = Table(
+    "jobs",
+    metadata,
+    Column("id", String, primary_key=True),
+    # queued -> running -> completed | failed
+    Column("status", String, nullable=False, index=True),
+    Column("priority", Integer, nullable=False, default=0),
+    # JSON list of {"document_text", "compliance_area"}
+    Column("documents", Text, nullable=False),
+    Column("total_documents", Integer, nullable=False),
+    Column("completed_documents", Integer, nullable=False, default=0),
+    # JSON list of {"index", "result", "error"}, in input order
+    Column("results", Text),
+    Column("error", Text),
+    Column("created_at", Float, nullable=False),
+    Column("started_at", Float),
+    Column("finished_at", Float),
+)
+
+def create_sqlite_engine(path: str) -> Engine:
+    """Engine for a local SQLite file shared by threads and processes."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 5.0})
+
+    @event.listens_for(engine, "connect")
+    def _enable_wal(dbapi_connection, _):
+        # Readers polling job status do not block the workers writing results
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+    return engine
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+class JobStore:
+    """Persistent job records and results in a SQL database."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        metadata.create_all(engine)
+
+    @staticmethod
+    def _to_dict(row) -> Dict:
+        job = dict(row._mapping)
+        job["documents"] = json.loads(job["documents"])
+        job["results"] = json.loads(job["results"]) if job["results"] else None
+        return job
+
+    def create(self, documents: List[Dict], priority: int = 0) -> Dict:
+        job_id = uuid.uuid4().hex
+        with self.engine.begin() as conn:
+            conn.execute(jobs_table.insert().values(
+                id=job_id,
+                status="queued",
+                priority=priority,
+                documents=json.dumps(documents),
+                total_documents=len(documents),
+                completed_documents=0,
+                created_at=time.time(),
+            ))
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self.engine.connect() as conn:
+            row = conn.execute(select(jobs_table).where(jobs_table.c.id == job_id)).first()
+        return self._to_dict(row) if row else None
+
+    def claim(self, job_id: str) -> bool:
+        """Mark a queued job as running; False if another worker already took it."""
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                update(jobs_table)
+                .where(jobs_table.c.id == job_id, jobs_table.c.status == "queued")
+                .values(status="running", started_at=time.time())
+            )
+        return result.rowcount == 1
+
+    def progress(self, job_id: str, completed_documents: int) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(update(jobs_table).where(jobs_table.c.id == job_id).values(completed_documents=completed_documents))
+
+    def finish(self, job_id: str, results: List[Dict]) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(update(jobs_table).where(jobs_table.c.id == job_id).values(
+                status="completed",
+                results=json.dumps(results),
+                completed_documents=len(results),
+                finished_at=time.time(),
+            ))
+
+    def fail(self, job_id: str, error: str) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(update(jobs_table).where(jobs_table.c.id == job_id).values(
+                status="failed", error=error, finished_at=time.time()
+            ))
+
+    def release(self, job_ids: List[str]) -> None:
+        """Return running jobs to the queue, e.g. when their worker shuts down."""
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(jobs_table)
+                .where(jobs_table.c.id.in_(job_ids), jobs_table.c.status == "running")
+                .values(status="queued", started_at=None)
+            )
+
+    def requeue_unfinished(self, recover_running: bool = True) -> List[Dict]:
+        """Return queued jobs, first marking jobs a previous process left running as queued again.
+
+        With several worker processes sharing the store, only recover running
+        jobs before any worker starts, as they may belong to a live worker.
+        """
+        with self.engine.begin() as conn:
+            if recover_running:
+                conn.execute(update(jobs_table).where(jobs_table.c.status == "running").values(status="queued"))
+            rows = conn.execute(
+                select(jobs_table.c.id, jobs_table.c.priority)
+                .where(jobs_table.c.status == "queued")
+                .order_by(jobs_table.c.created_at)
+            ).all()
+        return [dict(row._mapping) for row in rows]
+
+class JobQueue:
+    """Bounded pool of workers processing persisted compliance jobs.
+
+    Jobs run in priority order (higher first, then oldest first). Submissions
+    beyond the queue capacity are refused with JobQueueFull. Each document of
+    a job runs under its own checkpointed graph thread, so a job interrupted by
+    a restart resumes from the last completed node of each document instead of
+    repeating LLM calls. Jobs running when the queue stops are queued again.
+    """
+
+    def __init__(self, agent: ComplianceAgent, store: JobStore, workers: int = 2, max_queued: int = 1000,
+                 recover_running: bool = True):
+        self.agent = agent
+        self.store = store
+        self.workers = workers
+        self.max_queued = max_queued
+        self.recover_running = recover_running
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running: set = set()
+        self._order = itertools.count()
+        # job id -> event set on the job's next status change
+        self._changed: Dict[str, asyncio.Event] = {}
+
+    async def start(self) -> None:
+        """Start the workers, re-enqueueing jobs a previous process did not finish."""
+        self._queue = asyncio.PriorityQueue()
+        for job in await asyncio.to_thread(self.store.requeue_unfinished, self.recover_running):
+            self._enqueue(job["id"], job["priority"])
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stop the workers, returning their running jobs to the queue for the next start()."""
+        running = list(self._running)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if running:
+            await asyncio.to_thread(self.store.release, running)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _enqueue(self, job_id: str, priority: int) -> None:
+        self._queue.put_nowait((-priority, next(self._order), job_id))
+
+    def _notify(self, job_id: str) -> None:
+        changed = self._changed.pop(job_id, None)
+        if changed is not None:
+            changed.set()
+
+    async def submit(self, documents: List[Dict], priority: int = 0) -> Dict:
+        """Persist and enqueue a job, returning its record."""
+        if self.depth >= self.max_queued:
+            raise JobQueueFull(f"Job queue is full ({self.max_queued} jobs waiting)")
+        job = await asyncio.to_thread(self.store.create, documents, priority)
+        self._enqueue(job["id"], priority)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def watch(self, job_id: str) -> AsyncIterator[Dict]:
+        """Yield the job record whenever its status or progress changes, until it finishes."""
+        last = None
+        while True:
+            job = await self.get(job_id)
+            if job is None:
+                return
+            current = (job["status"], job["completed_documents"])
+            if current != last:
+                last = current
+                yield job
+            if job["status"] in TERMINAL_STATUSES:
+                return
+            # Woken by this process's workers, or by polling for jobs run elsewhere
+            changed = self._changed.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(changed.wait(), settings.JOBS_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.exception("Job %s failed", job_id)
+                await asyncio.to_thread(self.store.fail, job_id, str(e))
+                self._notify(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        if not await asyncio.to_thread(self.store.claim, job_id):
+            return
+        self._running.add(job_id)
+        try:
+            await self._run_claimed(job_id)
+        finally:
+            self._running.discard(job_id)
+
+    async def _run_claimed(self, job_id: str) -> None:
+        self._notify(job_id)
+
+        job = await self.get(job_id)
+        documents = job["documents"]
+        semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+        completed = 0
+
+        async def run_document(index: int, document: Dict) -> Dict:
+            nonlocal completed
+            async with semaphore:
+                try:
+                    result = await self.agent.arun(
+                        document=document["document_text"],
+                        compliance_area=document["compliance_area"],
+                        thread_id=f"{job_id}:{index}"
+                    )
+                    item = {"index": index, "result": result, "error": None}
+                except Exception as e:
+                    # A failing document is reported in its own entry instead of failing the job
+                    item = {"index": index, "result": None, "error": str(e)}
+            completed += 1
+            await asyncio.to_thread(self.store.progress, job_id, completed)
+            self._notify(job_id)
+            return item
+
+        results = await asyncio.gather(*(run_document(i, doc) for i, doc in enumerate(documents)))
+        await asyncio.to_thread(self.store.finish, job_id, results)
+        self._notify(job_id)
+
+        # Checkpoints are only needed to resume unfinished jobs
+        if self.agent.checkpointer is not None:
+            for index in range(len(documents)):
+                await self.agent.checkpointer.adelete_thread(f"{job_id}:{index}")
+
+def create_job_queue(cache=None) -> JobQueue:
+    """Build the job queue from settings, with its own checkpointed agent."""
+    engine = create_sqlite_engine(settings.JOBS_DB_PATH)
+    agent = ComplianceAgent(cache=cache, checkpointer=SQLAlchemyCheckpointSaver(engine))
+    return JobQueue(
+        agent,
+        JobStore(engine),
+        workers=settings.JOBS_WORKERS,
+        max_queued=settings.JOBS_QUEUE_MAX_SIZE,
+        recover_running=settings.JOBS_RECOVER_RUNNING
+    )
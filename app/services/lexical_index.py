@@ -0,0 +1,104 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config.settings import settings
+
+# Words, with dotted citations ("164.508") and parenthesised suffixes ("510(k)") kept whole
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*(?:\([a-z0-9]+\))*")
+
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the their this to was were with".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lexical terms.
+
+    Citations with parenthesised parts are also indexed without them, so
+    "164.508(a)(1)" matches a query for "164.508".
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOP_WORDS:
+            continue
+        terms.append(token)
+        base = token.split("(", 1)[0]
+        if base != token:
+            terms.append(base)
+    return terms
+
+class LexicalIndex:
+    """In-memory BM25 inverted index over the chunks of a vector store.
+
+    Postings are numpy arrays keyed by term, and document ids are the FAISS
+    ids of the chunks, so results can be fused with dense search directly.
+    """
+
+    def __init__(self, postings: Dict[str, Tuple[np.ndarray, np.ndarray]], lengths: np.ndarray):
+        self.postings = postings
+        self.lengths = lengths
+        self.avg_length = float(lengths.mean()) if len(lengths) else 0.0
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "LexicalIndex":
+        """Index texts, numbering them in iteration order."""
+        doc_ids: Dict[str, List[int]] = {}
+        freqs: Dict[str, List[int]] = {}
+        lengths = []
+        for i, text in enumerate(texts):
+            terms = tokenize(text)
+            lengths.append(len(terms))
+            for term, count in Counter(terms).items():
+                doc_ids.setdefault(term, []).append(i)
+                freqs.setdefault(term, []).append(count)
+
+        postings = {
+            term: (np.array(ids, dtype=np.int32), np.array(freqs[term], dtype=np.float32))
+            for term, ids in doc_ids.items()
+        }
+        return cls(postings, np.array(lengths, dtype=np.float32))
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def search(self, query: str, k: int, ids: Optional[np.ndarray] = None) -> List[int]:
+        """Ids of the k best BM25 matches for the query, restricted to ids when given."""
+        k1 = settings.HYBRID_BM25_K1
+        b = settings.HYBRID_BM25_B
+        count = len(self)
+        scores = np.zeros(count, dtype=np.float32)
+
+        matched = False
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            doc_ids, tf = posting
+            idf = math.log(1 + (count - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            norm = k1 * (1 - b + b * self.lengths[doc_ids] / self.avg_length)
+            scores[doc_ids] += idf * tf * (k1 + 1) / (tf + norm)
+            matched = True
+
+        if not matched:
+            return []
+        if ids is not None:
+            mask = np.zeros(count, dtype=bool)
+            mask[ids] = True
+            scores[~mask] = 0
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        return candidates[np.argsort(-scores[candidates], kind="stable")].tolist()
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int, rrf_k: int = None) -> List[int]:
+    """Merge ranked id lists by reciprocal rank, keeping the top k."""
+    rrf_k = settings.HYBRID_RRF_K if rrf_k is None else rrf_k
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(fused, key=lambda doc_id: -fused[doc_id])[:k]
@@ -0,0 +1,142 @@
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional, Tuple
+import httpx
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.rate_limiters import InMemoryRateLimiter
+
+from app.config.settings import settings
+
+# langchain_openai (and the OpenAI SDK behind it) is slow to import, so it is
+# only imported when the first client is built
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+# Clients are created once per process and shared, so HTTP keep-alive
+# connections and TLS sessions survive across requests.
+
+# Stand-in clients installed with override_clients() (e.g. offline benchmarks)
+_overrides = {}
+
+def override_clients(llm: BaseChatModel = None, embeddings: Embeddings = None) -> None:
+    """Serve the given clients instead of OpenAI ones; call with no arguments to reset."""
+    _overrides.clear()
+    if llm is not None:
+        _overrides["llm"] = llm
+    if embeddings is not None:
+        _overrides["embeddings"] = embeddings
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+    )
+
+@lru_cache(maxsize=None)
+def get_http_client() -> httpx.Client:
+    """Get the pooled HTTP client used for synchronous OpenAI calls."""
+    return httpx.Client(limits=_http_limits(), timeout=settings.HTTP_TIMEOUT)
+
+@lru_cache(maxsize=None)
+def get_async_http_client() -> httpx.AsyncClient:
+    """Get the pooled HTTP client used for asynchronous OpenAI calls."""
+    return httpx.AsyncClient(limits=_http_limits(), timeout=settings.HTTP_TIMEOUT)
+
+@lru_cache(maxsize=None)
+def get_rate_limiter() -> Optional[InMemoryRateLimiter]:
+    """Get the process-wide LLM request budget, if one is configured."""
+    if not settings.LLM_REQUESTS_PER_SECOND:
+        return None
+    return InMemoryRateLimiter(
+        requests_per_second=settings.LLM_REQUESTS_PER_SECOND,
+        max_bucket_size=max(1, settings.LLM_REQUESTS_PER_SECOND)
+    )
+
+def llm_route(node: str = None) -> List[str]:
+    """Models serving a graph node, in failover order."""
+    route = settings.LLM_ROUTES.get(node) if node else None
+    if route:
+        return list(route)
+    primary = settings.LLM_TRIAGE_MODEL if node == "triage" and settings.LLM_TRIAGE_MODEL else settings.LLM_MODEL
+    return [primary] + list(settings.LLM_FALLBACK_MODELS)
+
+def _split_model(spec: str) -> Tuple[str, str]:
+    # "provider:model" only when the prefix is a configured provider, so model names may contain colons
+    provider, _, model = spec.partition(":")
+    if model and provider in settings.LLM_PROVIDERS:
+        return provider, model
+    return "openai", spec
+
+def get_llm(node: str = None) -> BaseChatModel:
+    """Get the shared chat model client for a graph node.
+    
+    When the node's route lists several models, the client fails over to the
+    next one once a model times out or keeps failing after its retries.
+    """
+    if "llm" in _overrides:
+        return _overrides["llm"]
+    return _get_routed_llm(tuple(llm_route(node)))
+
+@lru_cache(maxsize=None)
+def _get_routed_llm(route: Tuple[str, ...]) -> BaseChatModel:
+    models = [_get_chat_model(*_split_model(spec)) for spec in route]
+    if len(models) == 1:
+        return models[0]
+    return models[0].with_fallbacks(models[1:])
+
+@lru_cache(maxsize=None)
+def _get_chat_model(provider: str, model: str) -> "ChatOpenAI":
+    from langchain_openai import ChatOpenAI
+
+    if provider == "openai":
+        config = {"base_url": settings.OPENAI_BASE_URL, "api_key": settings.OPENAI_API_KEY}
+    else:
+        config = settings.LLM_PROVIDERS[provider]
+    return ChatOpenAI(
+        model=model,
+        temperature=0,
+        rate_limiter=get_rate_limiter(),
+        api_key=config.get("api_key") or None,
+        base_url=config.get("base_url") or None,
+        timeout=settings.LLM_TIMEOUT,
+        max_retries=settings.LLM_MAX_RETRIES,
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client()
+    )
+
+def get_embeddings() -> Embeddings:
+    """Get the shared embeddings client."""
+    if "embeddings" in _overrides:
+        return _overrides["embeddings"]
+    return _get_openai_embeddings()
+
+@lru_cache(maxsize=None)
+def _get_openai_embeddings() -> "OpenAIEmbeddings":
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(
+        model=settings.EMBEDDING_MODEL,
+        api_key=settings.OPENAI_API_KEY or None,
+        base_url=settings.OPENAI_BASE_URL,
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client()
+    )
+
+def reset_clients() -> None:
+    """Drop the cached clients without closing them.
+    
+    Used in processes forked from one that already created clients, so each
+    process opens its own connections.
+    """
+    for factory in (_get_routed_llm, _get_chat_model, _get_openai_embeddings, get_rate_limiter,
+                    get_http_client, get_async_http_client):
+        factory.cache_clear()
+
+async def close_clients() -> None:
+    """Close pooled connections and drop the cached clients."""
+    if get_http_client.cache_info().currsize:
+        get_http_client().close()
+    if get_async_http_client.cache_info().currsize:
+        await get_async_http_client().aclose()
+    reset_clients()
@@ -0,0 +1,191 @@
+import asyncio
+import functools
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+
+from app.config.settings import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+COST_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+NODE_DURATION = Histogram(
+    "compliance_node_duration_seconds",
+    "Time spent in each compliance graph node.",
+    ["node", "compliance_area"],
+    buckets=LATENCY_BUCKETS
+)
+EMBEDDING_DURATION = Histogram(
+    "compliance_embedding_duration_seconds",
+    "Time spent waiting for embeddings.",
+    ["operation"],
+    buckets=LATENCY_BUCKETS
+)
+SEARCH_DURATION = Histogram(
+    "compliance_vector_search_duration_seconds",
+    "Time spent searching the vector index.",
+    ["operation"],
+    buckets=LATENCY_BUCKETS
+)
+VECTOR_STORE_LOAD_DURATION = Histogram(
+    "compliance_vector_store_load_seconds",
+    "Time to load or build the vector store in get_vector_store().",
+    buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Histogram(
+    "compliance_llm_tokens",
+    "Tokens per LLM call.",
+    ["node", "compliance_area", "kind"],
+    buckets=TOKEN_BUCKETS
+)
+LLM_COST = Histogram(
+    "compliance_llm_cost_usd",
+    "Estimated cost per LLM call in USD.",
+    ["node", "compliance_area", "model"],
+    buckets=COST_BUCKETS
+)
+TRIAGE_DECISIONS = Counter(
+    "compliance_triage_decisions_total",
+    "Documents cleared by the triage model or escalated to analysis.",
+    ["compliance_area", "decision"]
+)
+EMBEDDING_CACHE_LOOKUPS = Counter(
+    "compliance_embedding_cache_lookups_total",
+    "Texts looked up in the embedding cache.",
+    ["result"]
+)
+INDEX_VERSION = Gauge(
+    "compliance_index_version_info",
+    "Index versions serving searches (1 while any live worker serves the version).",
+    ["version"],
+    multiprocess_mode="livemax"
+)
+INDEX_SWAPS = Counter(
+    "compliance_index_swaps_total",
+    "Index versions swapped in, or rejected by validation.",
+    ["result"]
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "compliance_requests_in_flight",
+    "Requests currently being processed.",
+    ["endpoint"],
+    multiprocess_mode="livesum"
+)
+RESPONSE_CACHE_LOOKUPS = Counter(
+    "compliance_response_cache_lookups",
+    "Response cache lookups by result.",
+    ["result"]
+)
+RESPONSE_CACHE_EVICTIONS = Counter(
+    "compliance_response_cache_evictions",
+    "Entries evicted from the response cache."
+)
+RESPONSE_CACHE_ENTRIES = Gauge(
+    "compliance_response_cache_entries",
+    "Entries in the in-memory response caches of live workers.",
+    multiprocess_mode="livesum"
+)
+SEARCH_QUEUE_DEPTH = Gauge(
+    "compliance_search_queue_depth",
+    "FAISS search tasks waiting for a pool thread.",
+    multiprocess_mode="livesum"
+)
+REQUEST_ERRORS = Counter(
+    "compliance_request_errors_total",
+    "Requests that failed.",
+    ["endpoint"]
+)
+
+# Per-request timing breakdown, populated only while a request is being timed
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+def metric_area(compliance_area: str) -> str:
+    """Map a compliance area to a bounded label value."""
+    for area in settings.METRICS_COMPLIANCE_AREAS:
+        if area.lower() == (compliance_area or "").lower():
+            return area
+    return "other"
+
+def start_request_timing() -> Dict[str, float]:
+    """Start collecting a timing breakdown for the current request."""
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+def record_timing(name: str, seconds: float) -> None:
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+@contextmanager
+def timed(histogram: Histogram, timing_name: str = None, **labels) -> Iterator[None]:
+    """Observe the duration of a block, and add it to the request breakdown."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        (histogram.labels(**labels) if labels else histogram).observe(elapsed)
+        if timing_name:
+            record_timing(timing_name, elapsed)
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+def instrument_node(name: str, func: Callable) -> Callable:
+    """Wrap a sync or async graph node so its duration is recorded."""
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_node(state):
+            with timed(NODE_DURATION, name, node=name, compliance_area=metric_area(state.get("compliance_area"))):
+                return await func(state)
+        return async_node
+
+    @functools.wraps(func)
+    def node(state):
+        with timed(NODE_DURATION, name, node=name, compliance_area=metric_area(state.get("compliance_area"))):
+            return func(state)
+    return node
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimate the USD cost of a call from the configured per-million-token prices."""
+    for name, (prompt_price, completion_price) in sorted(settings.LLM_PRICING.items(), key=lambda item: -len(item[0])):
+        if model.startswith(name):
+            return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+    return 0.0
+
+def record_llm_usage(node: str, compliance_area: str, responses: List) -> None:
+    """Record token counts and estimated cost from LLM responses."""
+    area = metric_area(compliance_area)
+    for response in responses:
+        usage = getattr(response, "usage_metadata", None)
+        if not isinstance(usage, dict):
+            continue
+        prompt_tokens = usage.get("input_tokens", 0)
+        completion_tokens = usage.get("output_tokens", 0)
+        model = (getattr(response, "response_metadata", None) or {}).get("model_name") or settings.LLM_MODEL
+
+        LLM_TOKENS.labels(node=node, compliance_area=area, kind="prompt").observe(prompt_tokens)
+        LLM_TOKENS.labels(node=node, compliance_area=area, kind="completion").observe(completion_tokens)
+        LLM_COST.labels(node=node, compliance_area=area, model=model).observe(
+            estimate_cost(model, prompt_tokens, completion_tokens)
+        )
+
+def metrics_registry() -> CollectorRegistry:
+    """The registry to expose on /metrics.
+    
+    Under gunicorn (PROMETHEUS_MULTIPROC_DIR set, see app/gunicorn_conf.py)
+    every worker writes its metrics to files in that directory, and they are
+    aggregated here so a scrape reports the whole server, whichever worker
+    answers it.
+    """
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
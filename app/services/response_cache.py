@@ -0,0 +1,197 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config.settings import settings
+from app.services.metrics import RESPONSE_CACHE_ENTRIES, RESPONSE_CACHE_EVICTIONS, RESPONSE_CACHE_LOOKUPS
+
+def normalize_text(text: str) -> str:
+    """Normalize a document so trivially different copies share a cache key."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+class ResponseCache:
+    """Cache of compliance results in front of the agent.
+
+    Exact hits are keyed by a hash of the normalized document, the compliance
+    area, the model and the prompt version. Near-duplicate hits compare the
+    document embedding with cached entries from the same namespace (area,
+    model and prompt version) and are returned above the similarity threshold.
+
+    The in-memory tier is a bounded LRU with a TTL. The optional on-disk tier
+    is a SQLite file that serves exact hits across restarts and processes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 86400,
+        similarity_threshold: Optional[float] = None,
+        disk_path: Optional[str] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.disk_path = disk_path
+
+        # key -> (expires_at, namespace, value, unit vector or None)
+        self._entries: "OrderedDict[str, Tuple[float, str, Dict, Optional[np.ndarray]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits_exact": 0, "hits_semantic": 0, "hits_disk": 0, "misses": 0, "evictions": 0}
+
+        if disk_path:
+            Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS response_cache ("
+                    "key TEXT PRIMARY KEY, namespace TEXT, value TEXT, expires_at REAL)"
+                )
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.similarity_threshold is not None
+
+    @staticmethod
+    def make_namespace(compliance_area: str, model: str, prompt_version: str) -> str:
+        return hashlib.sha256(f"{compliance_area.lower()}\0{model}\0{prompt_version}".encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def make_key(document: str, namespace: str) -> str:
+        digest = hashlib.sha256(namespace.encode("utf-8") + b"\0")
+        digest.update(normalize_text(document).encode("utf-8"))
+        return digest.hexdigest()
+
+    @property
+    def disk_enabled(self) -> bool:
+        return bool(self.disk_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.disk_path, timeout=5.0)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Look up an exact hit in memory, then on disk."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits_exact"] += 1
+                    RESPONSE_CACHE_LOOKUPS.labels(result="hits_exact").inc()
+                    return entry[2]
+                del self._entries[key]
+
+        if self.disk_path:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    "SELECT namespace, value, expires_at FROM response_cache WHERE key = ?", (key,)
+                ).fetchone()
+            if row is not None and row[2] > now:
+                value = json.loads(row[1])
+                self._store(key, row[0], value, None, row[2])
+                with self._lock:
+                    self._stats["hits_disk"] += 1
+                RESPONSE_CACHE_LOOKUPS.labels(result="hits_disk").inc()
+                return value
+
+        return None
+
+    def get_similar(self, namespace: str, vector: List[float]) -> Optional[Dict]:
+        """Look up the closest cached document in the namespace above the threshold."""
+        if not self.semantic_enabled or vector is None:
+            return None
+
+        query = _unit(vector)
+        now = time.time()
+        with self._lock:
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry[1] == namespace and entry[3] is not None and entry[0] > now
+            ]
+            if not candidates:
+                return None
+
+            scores = np.stack([entry[3] for _, entry in candidates]) @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                return None
+
+            key, entry = candidates[best]
+            self._entries.move_to_end(key)
+            self._stats["hits_semantic"] += 1
+            RESPONSE_CACHE_LOOKUPS.labels(result="hits_semantic").inc()
+            return entry[2]
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self._stats["misses"] += 1
+        RESPONSE_CACHE_LOOKUPS.labels(result="misses").inc()
+
+    def put(self, key: str, namespace: str, value: Dict, vector: Optional[List[float]] = None) -> None:
+        """Store a result in memory and, if configured, on disk."""
+        expires_at = time.time() + self.ttl_seconds
+        self._store(key, namespace, value, None if vector is None else _unit(vector), expires_at)
+
+        if self.disk_path:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, namespace, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, namespace, json.dumps(value), expires_at)
+                )
+                conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+
+    def _store(self, key: str, namespace: str, value: Dict, vector: Optional[np.ndarray], expires_at: float) -> None:
+        with self._lock:
+            if vector is None and key in self._entries:
+                vector = self._entries[key][3]
+            self._entries[key] = (expires_at, namespace, value, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+                RESPONSE_CACHE_EVICTIONS.inc()
+            RESPONSE_CACHE_ENTRIES.set(len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            RESPONSE_CACHE_ENTRIES.set(0)
+        if self.disk_path:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("DELETE FROM response_cache")
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        hits = stats["hits_exact"] + stats["hits_semantic"] + stats["hits_disk"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        return stats
+
+def _unit(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+@lru_cache(maxsize=None)
+def get_response_cache() -> Optional[ResponseCache]:
+    """Get the process-wide response cache, or None when caching is disabled."""
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return None
+    return ResponseCache(
+        max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+        similarity_threshold=settings.RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+        disk_path=settings.RESPONSE_CACHE_DISK_PATH
+    )
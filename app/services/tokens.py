@@ -0,0 +1,59 @@
+import logging
+from functools import lru_cache
+from typing import List, Optional
+
+import tiktoken
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio used when no tiktoken encoding is available
+APPROX_CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = None) -> Optional[tiktoken.Encoding]:
+    """Get the tiktoken encoding for a model.
+
+    tiktoken downloads its BPE files on first use; in an air-gapped
+    environment that fails and token counts fall back to an approximation.
+    """
+    model = model or settings.LLM_MODEL
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        name = "o200k_base"
+    except Exception as e:
+        logger.warning("tiktoken encoding for %s unavailable, approximating token counts: %s", model, e)
+        return None
+
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning("tiktoken encoding %s unavailable, approximating token counts: %s", name, e)
+        return None
+
+def count_tokens(text: str, model: str = None) -> int:
+    """Count the tokens a model would see for the text."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return (len(text) + APPROX_CHARS_PER_TOKEN - 1) // APPROX_CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+def split_by_tokens(text: str, max_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    """Split text into sections of at most max_tokens, preferring paragraph and sentence breaks."""
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=max_tokens,
+        chunk_overlap=overlap_tokens,
+        length_function=count_tokens
+    )
+    return splitter.split_text(text)
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = None) -> str:
+    """Cut text down to at most max_tokens."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * APPROX_CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
@@ -1,18 +1,89 @@
 import os
-from typing import List, Dict
+import asyncio
+import fcntl
+import hashlib
+import logging
+import pickle
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
 import json
 from pathlib import Path
-from langchain_openai import OpenAIEmbeddings
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.config.settings import settings
+from app.services.embedding_cache import CachedEmbeddings, get_embedding_store
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from app.services.llm import get_embeddings
+from app.services.metrics import (
+    timed,
+    EMBEDDING_DURATION,
+    SEARCH_DURATION,
+    INDEX_SWAPS,
+    INDEX_VERSION,
+    SEARCH_QUEUE_DEPTH,
+    VECTOR_STORE_LOAD_DURATION
+)
+
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk layout or chunk metadata changes so old indexes are rebuilt
+INDEX_FORMAT_VERSION = 4
+
+INDEX_NAME = "index"
+MANIFEST_FILE = "manifest.json"
+# Raw chunk vectors, kept so the index can be retrained without re-embedding
+VECTORS_FILE = "vectors.npy"
+# BM25 inverted index over the same chunks, in FAISS id order
+LEXICAL_FILE = "lexical.pkl"
+LOCK_FILE = ".build.lock"
+# Pointer to the index version serving searches, and the one it replaced
+ACTIVE_FILE = "active.json"
+EMBEDDING_CACHE_FILE = "embeddings.sqlite"
+
+# Area for chunks not tied to one regulation; searching it covers the whole index
+GENERAL_AREA = "general"
 
 # Singleton vector store
 _vector_store = None
+_vector_store_lock = threading.Lock()
+
+# Background reload of an index version activated by another process
+_active_checked_at = 0.0
+_rejected_version = None
+_reload_lock = threading.Lock()
+_reload_thread = None
+
+# Points per centroid FAISS needs to train IVF lists and PQ codebooks
+MIN_POINTS_PER_CENTROID = 39
+PQ_CENTROIDS = 256
+
+# Fixed-size pool for CPU-bound FAISS work off the event loop
+_search_executor = None
+_search_executor_lock = threading.Lock()
+
+def get_cached_embeddings() -> Embeddings:
+    """Get the embeddings client, behind the persistent embedding cache when enabled."""
+    embeddings = get_embeddings()
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return embeddings
+    path = settings.EMBEDDING_CACHE_PATH or str(Path(settings.VECTOR_DB_PATH) / EMBEDDING_CACHE_FILE)
+    return CachedEmbeddings(embeddings, get_embedding_store(path))
 
 def load_documents() -> List[Document]:
     """Load compliance documents from the data directory."""
-    data_dir = Path("app/data/compliance_docs")
+    data_dir = Path(settings.COMPLIANCE_DOCS_PATH)
     documents = []
     
     # Create the data directory if it doesn't exist
@@ -79,37 +150,819 @@ def load_documents() -> List[Document]:
             with open(data_dir / filename, "w") as f:
                 f.write(content)
     
-    # Load all documents in the data directory
-    for file_path in data_dir.glob("*.txt"):
+    # Load all documents in the data directory (sorted so the corpus key is stable)
+    manifest = load_area_manifest(data_dir)
+    for file_path in sorted(data_dir.glob("*.txt")):
         with open(file_path, "r") as f:
             content = f.read()
-            documents.append(Document(page_content=content, metadata={"source": file_path.name}))
+            documents.append(Document(
+                page_content=content,
+                metadata={"source": file_path.name, "areas": manifest.get(file_path.name) or areas_for_file(file_path.name)}
+            ))
     
     return documents
 
-def create_vector_store() -> FAISS:
-    """Create a vector store from compliance documents."""
+def load_area_manifest(data_dir: Path) -> Dict[str, List[str]]:
+    """Read the file-name-to-areas manifest of the corpus, if there is one."""
+    path = data_dir / settings.COMPLIANCE_AREA_MANIFEST
+    if not path.exists():
+        return {}
+    with open(path, "r") as f:
+        return {name: [areas] if isinstance(areas, str) else list(areas) for name, areas in json.load(f).items()}
+
+def areas_for_file(filename: str) -> List[str]:
+    """Tag a document with the compliance areas named in its file name."""
+    stem = Path(filename).stem.lower()
+    areas = [
+        area for area, keywords in settings.COMPLIANCE_AREA_KEYWORDS.items()
+        if any(re.search(rf"(^|[^a-z0-9]){re.escape(keyword)}([^a-z0-9]|$)", stem) for keyword in keywords)
+    ]
+    return areas or [GENERAL_AREA]
+
+def split_documents(documents: List[Document]) -> List[Document]:
+    """Split compliance documents into chunks for embedding."""
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=settings.CHUNK_SIZE,
+        chunk_overlap=settings.CHUNK_OVERLAP
+    )
+    return text_splitter.split_documents(documents)
+
+def chunk_id(chunk: Document) -> str:
+    """Fingerprint a chunk by its source and content."""
+    digest = hashlib.sha256()
+    digest.update(chunk.metadata["source"].encode("utf-8") + b"\0")
+    digest.update(chunk.page_content.encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+def fingerprint_chunks(chunks: List[Document]) -> Dict[str, Document]:
+    """Map chunk fingerprints to chunks, dropping exact duplicates."""
+    fingerprinted = {}
+    for chunk in chunks:
+        fingerprinted.setdefault(chunk_id(chunk), chunk)
+    return fingerprinted
+
+def compute_corpus_key(documents: List[Document]) -> str:
+    """Hash the corpus together with every parameter that shapes the index."""
+    digest = hashlib.sha256()
+    params = {
+        "format": INDEX_FORMAT_VERSION,
+        "chunk_size": settings.CHUNK_SIZE,
+        "chunk_overlap": settings.CHUNK_OVERLAP,
+        "embedding_model": settings.EMBEDDING_MODEL,
+        "index_type": settings.VECTOR_INDEX_TYPE,
+        "mmap": settings.VECTOR_DB_MMAP,
+        "index_nlist": settings.VECTOR_INDEX_NLIST,
+        "index_hnsw_m": settings.VECTOR_INDEX_HNSW_M,
+        "index_pq_m": settings.VECTOR_INDEX_PQ_M,
+    }
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    
+    for doc in sorted(documents, key=lambda d: d.metadata["source"]):
+        digest.update(doc.metadata["source"].encode("utf-8") + b"\0")
+        digest.update(json.dumps(doc.metadata.get("areas")).encode("utf-8") + b"\0")
+        digest.update(doc.page_content.encode("utf-8") + b"\0")
+    
+    return digest.hexdigest()[:16]
+
+def index_factory_string(count: int, dim: int, index_type: str = None) -> str:
+    """Choose the FAISS index layout for a corpus of the given size.
+    
+    Small corpora use exact search. Larger ones use HNSW, then IVF with
+    product quantization, whose memory per vector stays fixed as the corpus
+    grows. Layouts that need more training points than the corpus has fall
+    back to the next simpler one.
+    
+    FAISS can only memory-map inverted lists, so with VECTOR_DB_MMAP exact
+    search is stored as a single inverted list scanned in full, and IVF takes
+    the place of HNSW, whose graph and vectors are always read into private
+    memory.
+    """
+    factory = index_type or settings.VECTOR_INDEX_TYPE
+    index_type = factory.lower()
+    if index_type == "auto":
+        if count <= settings.VECTOR_INDEX_FLAT_MAX:
+            index_type = "flat"
+        elif count <= settings.VECTOR_INDEX_HNSW_MAX:
+            index_type = "ivf" if settings.VECTOR_DB_MMAP else "hnsw"
+        else:
+            index_type = "ivfpq"
+    
+    nlist = settings.VECTOR_INDEX_NLIST or int(4 * np.sqrt(count))
+    nlist = max(1, min(nlist, count // MIN_POINTS_PER_CENTROID))
+    
+    exact = "IVF1,Flat" if settings.VECTOR_DB_MMAP else "Flat"
+    if index_type == "flat":
+        return exact
+    if index_type == "hnsw":
+        return f"HNSW{settings.VECTOR_INDEX_HNSW_M},Flat"
+    if index_type == "ivf":
+        return f"IVF{nlist},Flat" if count >= MIN_POINTS_PER_CENTROID else exact
+    if index_type == "ivfpq":
+        if count < PQ_CENTROIDS:
+            return index_factory_string(count, dim, "ivf")
+        pq_m = max(m for m in range(1, min(settings.VECTOR_INDEX_PQ_M, dim) + 1) if dim % m == 0)
+        return f"IVF{nlist},PQ{pq_m}x8"
+    # Anything else is taken as an index_factory string
+    return factory
+
+def configure_search(index: faiss.Index) -> faiss.Index:
+    """Apply the query-time recall/latency knobs to an index."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(settings.VECTOR_INDEX_NPROBE, ivf.nlist)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = settings.VECTOR_INDEX_EF_SEARCH
+    return index
+
+def build_index(vectors: np.ndarray, index_type: str = None) -> faiss.Index:
+    """Train and fill a FAISS index for the given vectors."""
+    count, dim = vectors.shape
+    index = faiss.index_factory(dim, index_factory_string(count, dim, index_type), faiss.METRIC_L2)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efConstruction = settings.VECTOR_INDEX_EF_CONSTRUCTION
+    if isinstance(index, faiss.IndexIVFFlat) and index.nlist == 1:
+        # One list holds every vector and IVFFlat never uses its centroid, so skip clustering
+        index.quantizer.add(np.zeros((1, dim), dtype=np.float32))
+        index.is_trained = True
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return configure_search(index)
+
+def build_vector_store(chunks: Dict[str, Document], vectors: np.ndarray) -> FAISS:
+    """Index chunk vectors and text, keyed by chunk fingerprint in chunk order."""
+    vector_store = FAISS(
+        get_cached_embeddings(),
+        build_index(vectors),
+        InMemoryDocstore(dict(chunks)),
+        dict(enumerate(chunks))
+    )
+    vector_store.lexical_index = LexicalIndex.build(chunk.page_content for chunk in chunks.values())
+    return vector_store
+
+def embed_chunks(chunks: Dict[str, Document], known: Dict[str, np.ndarray] = None) -> np.ndarray:
+    """Vectors for the chunks in order, embedding only those not already known."""
+    known = known or {}
+    missing = [cid for cid in chunks if cid not in known]
+    if missing:
+        embedded = get_cached_embeddings().embed_documents([chunks[cid].page_content for cid in missing])
+        known = {**known, **dict(zip(missing, np.array(embedded, dtype=np.float32)))}
+    return np.array([known[cid] for cid in chunks], dtype=np.float32)
+
+def create_vector_store(documents: List[Document] = None) -> Tuple[FAISS, np.ndarray]:
+    """Create a vector store from compliance documents.
+    
+    Returns the store and the raw chunk vectors it was built from.
+    """
     # Load documents
-    documents = load_documents()
+    if documents is None:
+        documents = load_documents()
     
-    # Split documents
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200
+    # Split documents, keyed by chunk fingerprint so the store can be updated incrementally
+    chunks = fingerprint_chunks(split_documents(documents))
+    
+    # Embed and index
+    vectors = embed_chunks(chunks)
+    return build_vector_store(chunks, vectors), vectors
+
+def load_vectors(index_dir: Path) -> Dict[str, np.ndarray]:
+    """Map chunk fingerprints to the raw vectors stored with a persisted index."""
+    vectors = np.load(Path(index_dir) / VECTORS_FILE, mmap_mode="r")
+    with open(Path(index_dir) / f"{INDEX_NAME}.pkl", "rb") as f:
+        _, index_to_docstore_id = pickle.load(f)
+    return {cid: vectors[i] for i, cid in index_to_docstore_id.items()}
+
+def update_vector_store(base_dir: Path, documents: List[Document]) -> Tuple[FAISS, np.ndarray, Dict[str, int]]:
+    """Build a vector store for the corpus on top of a persisted one.
+    
+    Only chunks whose fingerprint is not already indexed are embedded; the
+    stored vectors of unchanged chunks are reused and the index is retrained,
+    so approximate indexes stay balanced as chunks come and go. Chunk metadata
+    is taken from the current corpus, so re-tagged files need no re-embedding.
+    """
+    chunks = fingerprint_chunks(split_documents(documents))
+    known = load_vectors(base_dir)
+    
+    added = [cid for cid in chunks if cid not in known]
+    removed = [cid for cid in known if cid not in chunks]
+    
+    vectors = embed_chunks(chunks, known)
+    return build_vector_store(chunks, vectors), vectors, {
+        "added": len(added),
+        "removed": len(removed),
+        "unchanged": len(chunks) - len(added),
+    }
+
+def save_vector_store(vector_store: FAISS, vectors: np.ndarray, corpus_key: str) -> Path:
+    """Persist a vector store and its raw vectors under its corpus key.
+    
+    The index is written to a temporary directory and renamed into place, so
+    readers never observe a partially written version.
+    """
+    db_path = Path(settings.VECTOR_DB_PATH)
+    db_path.mkdir(parents=True, exist_ok=True)
+    index_dir = db_path / corpus_key
+    
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{corpus_key}-", dir=db_path))
+    try:
+        vector_store.save_local(str(tmp_dir), index_name=INDEX_NAME)
+        np.save(tmp_dir / VECTORS_FILE, vectors)
+        with open(tmp_dir / LEXICAL_FILE, "wb") as f:
+            pickle.dump(lexical_index(vector_store), f)
+        manifest = {
+            "corpus_key": corpus_key,
+            "format": INDEX_FORMAT_VERSION,
+            "embedding_model": settings.EMBEDDING_MODEL,
+            "chunk_size": settings.CHUNK_SIZE,
+            "chunk_overlap": settings.CHUNK_OVERLAP,
+            "index_type": index_factory_string(*vectors.shape),
+            "num_chunks": vector_store.index.ntotal,
+            "created_at": time.time(),
+        }
+        with open(tmp_dir / MANIFEST_FILE, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(tmp_dir, index_dir)
+    except OSError:
+        # Another process already published this version
+        if not (index_dir / MANIFEST_FILE).exists():
+            raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    
+    return index_dir
+
+def load_vector_store(index_dir: Path, mmap: bool = None) -> FAISS:
+    """Load a persisted vector store.
+    
+    With mmap enabled the index is opened read-only and its inverted lists,
+    which hold the vectors of IVF layouts, are memory-mapped from the index
+    file, so worker processes share them through the OS page cache instead of
+    each holding a private copy. Flat and HNSW indexes are always read into
+    memory; see index_factory_string.
+    """
+    if mmap is None:
+        mmap = settings.VECTOR_DB_MMAP
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    
+    index = faiss.read_index(str(Path(index_dir) / f"{INDEX_NAME}.faiss"), flags)
+    with open(Path(index_dir) / f"{INDEX_NAME}.pkl", "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    
+    vector_store = FAISS(get_cached_embeddings(), configure_search(index), docstore, index_to_docstore_id)
+    vector_store.index_version = Path(index_dir).name
+    vector_store.index_created_at = (read_manifest(index_dir) or {}).get("created_at")
+    lexical_path = Path(index_dir) / LEXICAL_FILE
+    if lexical_path.exists():
+        with open(lexical_path, "rb") as f:
+            vector_store.lexical_index = pickle.load(f)
+    return vector_store
+
+def read_manifest(index_dir: Path) -> Optional[Dict]:
+    """Read the manifest of a persisted index, if it has one."""
+    try:
+        with open(Path(index_dir) / MANIFEST_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def is_compatible(manifest: Optional[Dict]) -> bool:
+    """Whether a persisted index can be served and updated with the current settings."""
+    return bool(
+        manifest
+        and manifest.get("format") == INDEX_FORMAT_VERSION
+        and manifest.get("embedding_model") == settings.EMBEDDING_MODEL
     )
-    splits = text_splitter.split_documents(documents)
+
+def find_latest_index() -> Optional[Path]:
+    """Find the most recent persisted index that can be updated incrementally."""
+    db_path = Path(settings.VECTOR_DB_PATH)
+    if not db_path.exists():
+        return None
+    
+    candidates = []
+    for index_dir in db_path.iterdir():
+        manifest = read_manifest(index_dir)
+        if is_compatible(manifest):
+            candidates.append((manifest.get("created_at", 0), index_dir))
+    
+    return max(candidates)[1] if candidates else None
+
+def ingest_documents(full_rebuild: bool = False) -> Tuple[Path, Dict]:
+    """Publish an index for the current corpus, re-embedding only what changed.
+    
+    Returns the index directory and ingestion stats.
+    """
+    documents = load_documents()
+    corpus_key = compute_corpus_key(documents)
+    
+    db_path = Path(settings.VECTOR_DB_PATH)
+    db_path.mkdir(parents=True, exist_ok=True)
+    index_dir = db_path / corpus_key
+    
+    # Serialize builds across worker processes so only one pays the embedding cost
+    with open(db_path / LOCK_FILE, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if (index_dir / MANIFEST_FILE).exists() and not full_rebuild:
+                return index_dir, {"corpus_key": corpus_key, "status": "up_to_date"}
+            
+            base_dir = None if full_rebuild else find_latest_index()
+            if base_dir is None:
+                vector_store, vectors = create_vector_store(documents)
+                stats = {"added": vector_store.index.ntotal, "removed": 0, "unchanged": 0}
+            else:
+                vector_store, vectors, stats = update_vector_store(base_dir, documents)
+            
+            if full_rebuild:
+                shutil.rmtree(index_dir, ignore_errors=True)
+            save_vector_store(vector_store, vectors, corpus_key)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    
+    return index_dir, {
+        "corpus_key": corpus_key,
+        "status": "rebuilt" if base_dir is None else "updated",
+        "base": base_dir.name if base_dir else None,
+        **stats,
+    }
+
+def read_active_index() -> Optional[Dict]:
+    """Read the active index pointer: the version serving searches and the one it replaced."""
+    try:
+        with open(Path(settings.VECTOR_DB_PATH) / ACTIVE_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def activate_index(index_dir: Path) -> Dict:
+    """Point the active index at a persisted version, keeping the replaced one for rollback.
+    
+    The pointer file is replaced atomically. Every serving process checks it
+    every INDEX_RELOAD_INTERVAL seconds and swaps the version in.
+    """
+    manifest = read_manifest(index_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No index version at {index_dir}")
     
-    # Create vector store
-    embeddings = OpenAIEmbeddings()
-    vector_store = FAISS.from_documents(splits, embeddings)
+    db_path = Path(settings.VECTOR_DB_PATH)
+    version = Path(index_dir).name
+    with open(db_path / LOCK_FILE, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            current = read_active_index() or {}
+            active = {
+                "version": version,
+                "created_at": manifest.get("created_at"),
+                # Re-activating the same version (e.g. after a full rebuild) keeps the rollback target
+                "previous": current.get("previous") if current.get("version") == version else current.get("version"),
+                "activated_at": time.time(),
+            }
+            fd, tmp_path = tempfile.mkstemp(prefix=".active-", dir=db_path)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(active, f, indent=2)
+                os.replace(tmp_path, db_path / ACTIVE_FILE)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
     
+    return active
+
+def list_index_versions() -> List[Dict]:
+    """Manifests of the persisted index versions, newest first."""
+    db_path = Path(settings.VECTOR_DB_PATH)
+    if not db_path.exists():
+        return []
+    
+    versions = []
+    for index_dir in db_path.iterdir():
+        manifest = read_manifest(index_dir)
+        # Directories starting with "." are builds not yet renamed into place
+        if manifest and not index_dir.name.startswith("."):
+            versions.append({"version": index_dir.name, "compatible": is_compatible(manifest), **manifest})
+    return sorted(versions, key=lambda v: -v.get("created_at", 0))
+
+def validate_vector_store(vector_store: FAISS) -> None:
+    """Check that a loaded index version can serve searches before it is swapped in.
+    
+    Raises ValueError if the index is empty, out of step with its docstore or
+    the embedding model, or finds nothing for INDEX_SMOKE_QUERY.
+    """
+    index = vector_store.index
+    if index.ntotal == 0:
+        raise ValueError("Index has no vectors")
+    if index.ntotal != len(vector_store.index_to_docstore_id):
+        raise ValueError(
+            f"Index has {index.ntotal} vectors but {len(vector_store.index_to_docstore_id)} docstore entries"
+        )
+    
+    query = settings.INDEX_SMOKE_QUERY
+    embedding = vector_store.embeddings.embed_query(query)
+    if len(embedding) != index.d:
+        raise ValueError(f"Index dimension {index.d} does not match the embedding dimension {len(embedding)}")
+    if not search_by_vectors(vector_store, [embedding], 1, queries=[query])[0]:
+        raise ValueError(f"Smoke query {query!r} returned no results")
+
+def _load_validated(index_dir: Path) -> FAISS:
+    try:
+        vector_store = load_vector_store(index_dir)
+        validate_vector_store(vector_store)
+    except Exception:
+        INDEX_SWAPS.labels(result="rejected").inc()
+        raise
     return vector_store
 
-def get_vector_store() -> FAISS:
-    """Get the vector store singleton."""
+def _publish(vector_store: FAISS) -> None:
     global _vector_store
     
+    previous = loaded_index_version()
+    _vector_store = vector_store
+    # Drop cached area maps of replaced versions so they can be freed, and
+    # build the new one before requests need it
+    area_ids.cache_clear()
+    area_ids(vector_store)
+    # Zeroed rather than removed, so the multiprocess files of gunicorn workers drop it too
+    version = loaded_index_version() or "unknown"
+    if previous is not None and previous != version:
+        INDEX_VERSION.labels(version=previous).set(0)
+    INDEX_VERSION.labels(version=version).set(1)
+
+def swap_vector_store(vector_store: FAISS) -> None:
+    """Serve new searches from another vector store.
+    
+    Searches already running keep the store they fetched, so in-flight
+    requests finish on the previous version, which is freed once they are done.
+    """
+    with _vector_store_lock:
+        _publish(vector_store)
+    INDEX_SWAPS.labels(result="swapped").inc()
+
+def build_index_version(full_rebuild: bool = False, activate: bool = True) -> Dict:
+    """Build an index version for the current corpus, validate it and swap it in.
+    
+    The loaded version keeps serving searches while the new one is built and
+    validated. Returns the ingestion stats with the version's name.
+    """
+    index_dir, stats = ingest_documents(full_rebuild)
+    vector_store = _load_validated(index_dir)
+    if activate:
+        activate_index(index_dir)
+        swap_vector_store(vector_store)
+    return {"version": index_dir.name, "index_dir": str(index_dir), "activated": activate, **stats}
+
+def activate_index_version(version: str) -> Dict:
+    """Validate a persisted index version, make it the active one and swap it in.
+    
+    Raises FileNotFoundError for an unknown version and ValueError for one that
+    cannot be served.
+    """
+    index_dir = Path(settings.VECTOR_DB_PATH) / version
+    manifest = None if Path(version).name != version or version.startswith(".") else read_manifest(index_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"Unknown index version: {version}")
+    if not is_compatible(manifest):
+        raise ValueError(f"Index version {version} was built with another format or embedding model")
+    
+    vector_store = _load_validated(index_dir)
+    active = activate_index(index_dir)
+    swap_vector_store(vector_store)
+    return active
+
+def rollback_index() -> Dict:
+    """Re-activate the index version the active one replaced."""
+    active = read_active_index()
+    if not active or not active.get("previous"):
+        raise ValueError("No previous index version to roll back to")
+    return activate_index_version(active["previous"])
+
+def loaded_index_version() -> Optional[str]:
+    """The index version serving searches in this process, if one is loaded."""
+    return getattr(_vector_store, "index_version", None)
+
+def index_build_running() -> bool:
+    """Whether any process is building or activating an index version, by probing the build lock."""
+    lock_path = Path(settings.VECTOR_DB_PATH) / LOCK_FILE
+    if not lock_path.exists():
+        return False
+    with open(lock_path, "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    return False
+
+def index_status() -> Dict:
+    """The active and loaded index versions, and the persisted versions available to activate."""
+    return {
+        "active": read_active_index(),
+        "loaded": loaded_index_version(),
+        "build_running": index_build_running(),
+        "versions": list_index_versions(),
+    }
+
+def _active_index_dir() -> Optional[Path]:
+    active = read_active_index()
+    if not active or not active.get("version"):
+        return None
+    index_dir = Path(settings.VECTOR_DB_PATH) / active["version"]
+    return index_dir if is_compatible(read_manifest(index_dir)) else None
+
+def load_or_create_vector_store() -> FAISS:
+    """Load the active index version, building and activating one for the current corpus if there is none.
+    
+    Once a version is active, corpus changes are published with
+    build_index_version() (python -m app.ingest or the admin API).
+    """
+    index_dir = _active_index_dir()
+    if index_dir is None:
+        index_dir, _ = ingest_documents()
+        activate_index(index_dir)
+    return load_vector_store(index_dir)
+
+def reload_active_index() -> bool:
+    """Load, validate and swap in the active index version if it is not the loaded one.
+    
+    Returns whether a version was swapped in. Raises like activate_index_version
+    if the active version cannot be served, leaving the loaded one in place.
+    """
+    index_dir = _active_index_dir()
+    if _vector_store is None or index_dir is None:
+        return False
+    loaded = (loaded_index_version(), getattr(_vector_store, "index_created_at", None))
+    if loaded == (index_dir.name, (read_manifest(index_dir) or {}).get("created_at")):
+        return False
+    swap_vector_store(_load_validated(index_dir))
+    return True
+
+def _reload_active_index(active: Dict) -> None:
+    global _rejected_version
+    
+    try:
+        index_dir = _active_index_dir()
+        if index_dir is not None and index_dir.name == active.get("version"):
+            swap_vector_store(_load_validated(index_dir))
+            logger.info("Swapped in index version %s", index_dir.name)
+    except Exception:
+        # Keep serving the loaded version; the same activation is not retried
+        _rejected_version = (active.get("version"), active.get("created_at"))
+        logger.exception("Index version %s failed to load", active.get("version"))
+    finally:
+        _reload_lock.release()
+
+def check_active_index() -> None:
+    """Start loading the active index version in the background if it is not the loaded one.
+    
+    Called on every vector store access, the pointer file is read at most
+    every INDEX_RELOAD_INTERVAL seconds. Searches keep using the loaded version
+    until the new one has been loaded and validated. The new version is loaded
+    into this process only: with VECTOR_DB_MMAP its vectors are mapped from
+    the shared index file, but its docstore and BM25 index are private.
+    """
+    global _active_checked_at, _reload_thread
+    
+    if settings.INDEX_RELOAD_INTERVAL is None or _vector_store is None:
+        return
+    now = time.monotonic()
+    if now - _active_checked_at < settings.INDEX_RELOAD_INTERVAL:
+        return
+    _active_checked_at = now
+    
+    active = read_active_index()
+    if not active:
+        return
+    key = (active.get("version"), active.get("created_at"))
+    loaded = (getattr(_vector_store, "index_version", None), getattr(_vector_store, "index_created_at", None))
+    if key == loaded or key == _rejected_version:
+        return
+    if _reload_lock.acquire(blocking=False):
+        _reload_thread = threading.Thread(
+            target=_reload_active_index, args=(active,), name="index-reload", daemon=True
+        )
+        _reload_thread.start()
+
+def get_vector_store() -> FAISS:
+    """Get the vector store singleton."""
     if _vector_store is None:
-        _vector_store = create_vector_store()
+        with _vector_store_lock:
+            if _vector_store is None:
+                with timed(VECTOR_STORE_LOAD_DURATION, "vector_store_load"):
+                    _publish(load_or_create_vector_store())
+    else:
+        check_active_index()
+    
+    return _vector_store
+
+class _SearchExecutor(ThreadPoolExecutor):
+    """Thread pool reporting the tasks waiting for a thread in SEARCH_QUEUE_DEPTH."""
+    
+    def submit(self, fn, /, *args, **kwargs):
+        def run():
+            SEARCH_QUEUE_DEPTH.dec()
+            return fn(*args, **kwargs)
+        
+        SEARCH_QUEUE_DEPTH.inc()
+        try:
+            return super().submit(run)
+        except BaseException:
+            SEARCH_QUEUE_DEPTH.dec()
+            raise
+
+def get_search_executor() -> ThreadPoolExecutor:
+    """Get the thread pool used for index loading and FAISS search."""
+    global _search_executor
+    
+    if _search_executor is None:
+        with _search_executor_lock:
+            if _search_executor is None:
+                _search_executor = _SearchExecutor(
+                    max_workers=settings.RETRIEVAL_THREADS,
+                    thread_name_prefix="faiss-search"
+                )
+    
+    return _search_executor
+
+async def aget_vector_store() -> FAISS:
+    """Get the vector store singleton, loading it off the event loop if needed."""
+    if _vector_store is not None:
+        check_active_index()
+        return _vector_store
+    
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_search_executor(), get_vector_store)
+
+def reset_after_fork() -> None:
+    """Prepare a vector store loaded before a fork for use in the child process.
+    
+    The index and docstore stay shared with the parent; the embeddings client
+    and the search threads (which do not survive a fork) become the child's own.
+    """
+    global _search_executor
+    
+    _search_executor = None
+    if _vector_store is not None:
+        _vector_store.embedding_function = get_cached_embeddings()
+        # Multiprocess metric values start over in each worker
+        INDEX_VERSION.labels(version=loaded_index_version() or "unknown").set(1)
+
+@lru_cache(maxsize=8)
+def area_ids(vector_store: FAISS) -> Dict[str, np.ndarray]:
+    """Map each compliance area to the FAISS ids searched for it.
+    
+    An area's ids cover its own chunks plus the general ones. Computed once per
+    loaded index.
+    """
+    tagged: Dict[str, List[int]] = {}
+    for i, doc_id in vector_store.index_to_docstore_id.items():
+        for area in vector_store.docstore.search(doc_id).metadata.get("areas") or [GENERAL_AREA]:
+            tagged.setdefault(area.lower(), []).append(i)
+    
+    general = tagged.get(GENERAL_AREA, [])
+    return {
+        area: np.array(sorted(set(ids) | set(general)), dtype=np.int64)
+        for area, ids in tagged.items()
+        if area != GENERAL_AREA
+    }
+
+def area_selector(vector_store: FAISS, compliance_area: Optional[str]) -> Optional[np.ndarray]:
+    """FAISS ids to restrict a search to, or None to search the whole index."""
+    if not compliance_area:
+        return None
+    # General requests, and areas with no tagged chunks, fall back to the global index
+    return area_ids(vector_store).get(compliance_area.lower())
+
+def lexical_index(vector_store: FAISS) -> LexicalIndex:
+    """The BM25 index of a vector store, built from its docstore if none was persisted."""
+    index = getattr(vector_store, "lexical_index", None)
+    if index is None:
+        index = LexicalIndex.build(
+            vector_store.docstore.search(vector_store.index_to_docstore_id[i]).page_content
+            for i in range(len(vector_store.index_to_docstore_id))
+        )
+        vector_store.lexical_index = index
+    return index
+
+def search_parameters(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """Search parameters restricting a search to selected ids, keeping the index's tuning."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+def search_by_vectors(vector_store: FAISS, embeddings: List[List[float]], k: int = 3,
+                      compliance_areas: List[Optional[str]] = None,
+                      queries: List[str] = None,
+                      relevance_threshold: Optional[float] = None) -> List[List[Document]]:
+    """Search the index for a whole batch of query embeddings.
+    
+    Queries are grouped by compliance area, and each group is searched in one
+    FAISS call pre-filtered to that area's ids. When the query texts are given
+    and hybrid search is enabled, the dense candidates are fused with BM25
+    matches by reciprocal rank, so exact citations and terms are not missed.
+    
+    With a relevance threshold, dense candidates scoring below it (on the
+    scale of LangChain's similarity_search_with_relevance_scores) are dropped,
+    and a query with no relevant dense candidate gets no results, so BM25
+    matches on common words do not count as relevant on their own.
+    """
+    hybrid = queries is not None and settings.HYBRID_SEARCH_ENABLED
+    candidates = max(k, settings.HYBRID_CANDIDATES) if hybrid else k
+    
+    relevance = vector_store._select_relevance_score_fn() if relevance_threshold is not None else None
+    
+    vectors = np.array(embeddings, dtype=np.float32)
+    if vector_store._normalize_L2:
+        faiss.normalize_L2(vectors)
+    
+    groups: Dict[Optional[str], List[int]] = {}
+    for row, area in enumerate(compliance_areas or [None] * len(vectors)):
+        groups.setdefault(area, []).append(row)
+    
+    results: List[List[Document]] = [[] for _ in range(len(vectors))]
+    for area, rows in groups.items():
+        ids = area_selector(vector_store, area)
+        if ids is None:
+            distances, indices = vector_store.index.search(vectors[rows], candidates)
+        else:
+            params = search_parameters(vector_store.index, faiss.IDSelectorBatch(ids))
+            distances, indices = vector_store.index.search(vectors[rows], candidates, params=params)
+        for row, scores, found in zip(rows, distances, indices):
+            found = [
+                int(i) for i, score in zip(found, scores)
+                if i != -1 and (relevance is None or relevance(float(score)) >= relevance_threshold)
+            ]
+            if hybrid and (relevance is None or found):
+                lexical = lexical_index(vector_store).search(queries[row], candidates, ids)
+                found = reciprocal_rank_fusion([found, lexical], k)
+            results[row] = [vector_store.docstore.search(vector_store.index_to_docstore_id[i]) for i in found[:k]]
+    
+    return results
+
+def similarity_search(query: str, k: int = 3, compliance_area: str = None) -> List[Document]:
+    """Embed the query and search the vector store, restricted to a compliance area when given."""
+    vector_store = get_vector_store()
+    with timed(EMBEDDING_DURATION, "embed", operation="query"):
+        embedding = vector_store.embeddings.embed_query(query)
+    with timed(SEARCH_DURATION, "search", operation="query"):
+        return search_by_vectors(
+            vector_store, [embedding], k, [compliance_area], [query], settings.RETRIEVAL_RELEVANCE_THRESHOLD
+        )[0]
+
+async def asimilarity_search(query: str, k: int = 3, compliance_area: str = None) -> List[Document]:
+    """Search the vector store without blocking the event loop.
+    
+    The query embedding is awaited over HTTP, then the FAISS search runs on
+    the fixed-size search pool.
+    """
+    vector_store = await aget_vector_store()
+    with timed(EMBEDDING_DURATION, "embed", operation="query"):
+        embedding = await vector_store.embeddings.aembed_query(query)
+    
+    loop = asyncio.get_running_loop()
+    with timed(SEARCH_DURATION, "search", operation="query"):
+        results = await loop.run_in_executor(
+            get_search_executor(),
+            search_by_vectors,
+            vector_store,
+            [embedding],
+            k,
+            [compliance_area],
+            [query],
+            settings.RETRIEVAL_RELEVANCE_THRESHOLD
+        )
+    return results[0]
+
+def batch_similarity_search(queries: List[str], k: int = 3,
+                            compliance_areas: List[Optional[str]] = None) -> List[List[Document]]:
+    """Search for several queries with one embeddings request and one FAISS search per area."""
+    vector_store = get_vector_store()
+    with timed(EMBEDDING_DURATION, "embed", operation="batch"):
+        embeddings = vector_store.embeddings.embed_documents(queries)
+    with timed(SEARCH_DURATION, "search", operation="batch"):
+        return search_by_vectors(
+            vector_store, embeddings, k, compliance_areas, queries, settings.RETRIEVAL_RELEVANCE_THRESHOLD
+        )
+
+async def abatch_similarity_search(queries: List[str], k: int = 3,
+                                   compliance_areas: List[Optional[str]] = None) -> List[List[Document]]:
+    """Async variant of batch_similarity_search."""
+    vector_store = await aget_vector_store()
+    with timed(EMBEDDING_DURATION, "embed", operation="batch"):
+        embeddings = await vector_store.embeddings.aembed_documents(queries)
     
-    return _vector_store 
\ No newline at end of file
+    loop = asyncio.get_running_loop()
+    with timed(SEARCH_DURATION, "search", operation="batch"):
+        return await loop.run_in_executor(
+            get_search_executor(),
+            search_by_vectors,
+            vector_store,
+            embeddings,
+            k,
+            compliance_areas,
+            queries,
+            settings.RETRIEVAL_RELEVANCE_THRESHOLD
+        )
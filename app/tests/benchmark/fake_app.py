@@ -0,0 +1,18 @@
+"""The API with the offline stand-ins installed, for benchmarks that serve it from separate processes.
+
+    gunicorn -c app/gunicorn_conf.py app.tests.benchmark.fake_app:app
+
+Latency specs (see fakes.py) are read from BENCHMARK_LLM_LATENCY and
+BENCHMARK_EMBED_LATENCY.
+"""
+import os
+
+from app.services import llm
+from app.tests.benchmark.fakes import FakeChatModel, FakeEmbeddings
+
+llm.override_clients(
+    llm=FakeChatModel(latency=os.getenv("BENCHMARK_LLM_LATENCY", "0")),
+    embeddings=FakeEmbeddings(latency=os.getenv("BENCHMARK_EMBED_LATENCY", "0")),
+)
+
+from app.main import app  # noqa: E402
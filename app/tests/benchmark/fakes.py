@@ -0,0 +1,208 @@
+"""Deterministic offline stand-ins for ChatOpenAI and OpenAIEmbeddings.
+
+Responses depend only on the prompt, and latency is drawn from a configurable
+distribution, so benchmarks measure our code rather than the network.
+
+Latency specs:
+    "0"                    no delay
+    "fixed:0.5"            always 0.5s
+    "uniform:0.2,0.8"      uniform between 0.2s and 0.8s
+    "normal:0.5,0.1"       normal with mean 0.5s and std 0.1s (clipped at 0)
+    "lognormal:-0.7,0.4"   lognormal with mu -0.7 and sigma 0.4 (long tail)
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Turn a latency spec into a sampler taking a random generator."""
+    if spec in ("", "0", "none"):
+        return lambda rng: 0.0
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",")] if args else []
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+class _LatencySampler:
+    """Thread-safe seeded sampler shared by sync and async calls."""
+
+    def __init__(self, spec: str, seed: int):
+        self._sample = parse_latency(spec)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self) -> float:
+        with self._lock:
+            return self._sample(self._rng)
+
+def _prompt_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(str(message.content) for message in messages)
+
+FAKE_SUGGESTIONS = ["Obtain written patient authorization before disclosure", "Complete all required record fields"]
+FAKE_REFERENCES = ["45 CFR 164.508", "CMS Conditions of Participation 482.24"]
+
+def fake_issues(prompt: str) -> List[str]:
+    seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+    issues = [
+        "Disclosure of PHI without documented patient authorization",
+        "Incomplete medical record documentation",
+        "Missing notice of privacy practices acknowledgement",
+        "No business associate agreement referenced for vendor access",
+    ]
+    return issues[:1 + seed % len(issues)]
+
+def fake_triage(prompt: str) -> Dict:
+    # About a quarter of documents are flagged, like a mostly clean workload
+    seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+    return {"has_issues": seed % 4 == 0, "confidence": 0.9}
+
+def fake_completion(prompt: str) -> str:
+    """Deterministic answer shaped like the real model's output for each prompt."""
+    if "Document to Screen" in prompt:
+        return json.dumps(fake_triage(prompt))
+    if "Identified Compliance Issues" in prompt:
+        return json.dumps({"suggestions": FAKE_SUGGESTIONS, "references": FAKE_REFERENCES})
+    return "\n".join(f"{i + 1}. {issue}" for i, issue in enumerate(fake_issues(prompt)))
+
+def fake_tool_call(prompt: str, tools: List[Dict]) -> Dict:
+    """Deterministic call of the first bound tool, filling the report fields it declares."""
+    function = tools[0]["function"]
+    fields = {
+        "compliance_issues": fake_issues(prompt),
+        "suggestions": FAKE_SUGGESTIONS,
+        "references": FAKE_REFERENCES,
+    }
+    properties = function.get("parameters", {}).get("properties", {})
+    return {"name": function["name"], "args": {key: fields.get(key, []) for key in properties}, "id": "call_0"}
+
+class FakeChatModel(BaseChatModel):
+    """Chat model returning deterministic compliance-shaped answers after a simulated delay."""
+
+    latency: str = "0"
+    token_latency: float = 0.0
+    seed: int = 0
+    sampler: Any = None
+
+    def model_post_init(self, __context: Any) -> None:
+        self.sampler = _LatencySampler(self.latency, self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-compliance-chat"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        """Bind tools so with_structured_output() works; calls then answer with a tool call."""
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _message(self, prompt: str, tools: Optional[List[Dict]]) -> AIMessage:
+        if tools:
+            tool_call = fake_tool_call(prompt, tools)
+            content, extra = "", {"tool_calls": [tool_call]}
+            output_length = len(json.dumps(tool_call["args"]))
+        else:
+            content, extra = fake_completion(prompt), {}
+            output_length = len(content)
+        return AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": len(prompt) // 4,
+                "output_tokens": output_length // 4,
+                "total_tokens": (len(prompt) + output_length) // 4,
+            },
+            **extra,
+        )
+
+    def _tool_call_chunk(self, prompt: str, tools: List[Dict]) -> ChatGenerationChunk:
+        tool_call = fake_tool_call(prompt, tools)
+        return ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[{
+            "name": tool_call["name"], "args": json.dumps(tool_call["args"]), "id": tool_call["id"], "index": 0,
+        }]))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.sampler())
+        return ChatResult(generations=[ChatGeneration(message=self._message(_prompt_text(messages), kwargs.get("tools")))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.sampler())
+        return ChatResult(generations=[ChatGeneration(message=self._message(_prompt_text(messages), kwargs.get("tools")))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.sampler())
+        if kwargs.get("tools"):
+            yield self._tool_call_chunk(_prompt_text(messages), kwargs["tools"])
+            return
+        for token in re.findall(r"\S+|\s+", fake_completion(_prompt_text(messages))):
+            time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.sampler())
+        if kwargs.get("tools"):
+            yield self._tool_call_chunk(_prompt_text(messages), kwargs["tools"])
+            return
+        for token in re.findall(r"\S+|\s+", fake_completion(_prompt_text(messages))):
+            await asyncio.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic hashed bag-of-words embeddings with one simulated delay per request.
+
+    Texts sharing words get similar vectors, so retrieval and near-duplicate
+    lookups behave plausibly.
+    """
+
+    def __init__(self, size: int = 256, latency: str = "0", seed: int = 0):
+        self.size = size
+        self.sampler = _LatencySampler(latency, seed)
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            bucket = int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16) % self.size
+            vector[bucket] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.sampler())
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.sampler())
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
@@ -0,0 +1,125 @@
+"""Recall vs latency benchmark for the FAISS index types.
+
+Builds each index layout supported by the vector store over the same synthetic
+clustered vectors and measures recall@k against exact search, query latency,
+build time and memory per vector. Running it at several corpus sizes shows
+whether latency and memory stay flat as the corpus grows.
+
+Usage:
+    python -m app.tests.benchmark.index_benchmark
+    python -m app.tests.benchmark.index_benchmark --sizes 10000,100000,1000000 --dim 1536 \\
+        --types flat,ivf,hnsw,ivfpq --nprobe 4,16,64 --ef-search 32,64,128 --output index.json
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, List
+from unittest.mock import patch
+
+import faiss
+import numpy as np
+
+from app.config.settings import settings
+from app.services import vector_store
+from app.tests.benchmark.performance_benchmark import summarize_latencies
+
+def make_vectors(count: int, dim: int, queries: int, seed: int):
+    """Clustered vectors, and queries drawn near them, loosely shaped like text embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, count // 100), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), count)] + rng.normal(scale=0.4, size=(count, dim))
+    picked = vectors[rng.integers(0, count, queries)]
+    noise = rng.normal(scale=0.1, size=(queries, dim))
+    return vectors.astype(np.float32), (picked + noise).astype(np.float32)
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)]))
+
+def measure(index: faiss.Index, queries: np.ndarray, truth: np.ndarray, k: int) -> Dict:
+    """Search one query at a time, as the API does, and score against exact results."""
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        _, indices = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        found.append(indices[0])
+    return {
+        "recall": round(recall_at_k(np.array(found), truth), 4),
+        "latency_ms": summarize_latencies(latencies),
+    }
+
+def tuning_sweep(index: faiss.Index, nprobes: List[int], ef_searches: List[int]):
+    """Yield (parameter, value) after applying each query-time setting to the index."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        for nprobe in nprobes:
+            ivf.nprobe = min(nprobe, ivf.nlist)
+            yield "nprobe", ivf.nprobe
+    elif isinstance(index, faiss.IndexHNSW):
+        for ef_search in ef_searches:
+            index.hnsw.efSearch = ef_search
+            yield "efSearch", ef_search
+    else:
+        yield None, None
+
+def benchmark_size(count: int, args) -> List[Dict]:
+    vectors, queries = make_vectors(count, args.dim, args.queries, args.seed)
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+
+    results = []
+    for index_type in args.types:
+        start = time.perf_counter()
+        index = vector_store.build_index(vectors, index_type)
+        build_seconds = time.perf_counter() - start
+        bytes_per_vector = len(faiss.serialize_index(index)) / count
+
+        for parameter, value in tuning_sweep(index, args.nprobe, args.ef_search):
+            result = {
+                "vectors": count,
+                "index_type": index_type,
+                "factory": vector_store.index_factory_string(count, args.dim, index_type),
+                "build_seconds": round(build_seconds, 3),
+                "bytes_per_vector": round(bytes_per_vector, 1),
+                **measure(index, queries, truth, args.k),
+            }
+            if parameter:
+                result[parameter] = value
+            results.append(result)
+    return results
+
+def run_index_benchmark(argv=None) -> Dict:
+    """Run the index benchmark and return its report."""
+    parser = argparse.ArgumentParser(description="Recall vs latency benchmark for the FAISS index types.")
+    parser.add_argument("--sizes", default="5000,50000", type=lambda v: [int(c) for c in v.split(",")])
+    parser.add_argument("--dim", default=256, type=int)
+    parser.add_argument("--types", default="flat,ivf,hnsw,ivfpq", type=lambda v: v.split(","))
+    parser.add_argument("--nprobe", default="4,16,64", type=lambda v: [int(c) for c in v.split(",")])
+    parser.add_argument("--ef-search", default="32,64,128", type=lambda v: [int(c) for c in v.split(",")])
+    parser.add_argument("--queries", default=200, type=int)
+    parser.add_argument("--k", default=10, type=int)
+    parser.add_argument("--seed", default=7, type=int)
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    args = parser.parse_args(argv)
+
+    # Single-threaded search so latencies reflect one API request
+    faiss.omp_set_num_threads(1)
+    with patch.object(settings, "VECTOR_INDEX_NLIST", None):
+        results = [result for count in args.sizes for result in benchmark_size(count, args)]
+
+    report = {
+        "config": {"sizes": args.sizes, "dim": args.dim, "queries": args.queries, "k": args.k, "seed": args.seed},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    print(output)
+    return report
+
+if __name__ == "__main__":
+    run_index_benchmark()
@@ -1,46 +1,319 @@
+"""Offline load benchmark for the compliance API.
+
+Drives the FastAPI app in-process against deterministic stand-ins for the LLM
+and embeddings (see fakes.py), so no network or API key is needed. Reports
+latency percentiles, throughput, per-node timing and peak RSS as JSON, and can
+compare the run against a stored baseline. Runs on different hosts are compared
+relative to a short CPU calibration recorded in each report.
+
+Usage:
+    python -m app.tests.benchmark.performance_benchmark
+    python -m app.tests.benchmark.performance_benchmark --concurrency 1,8,32 --requests 200 \\
+        --mix short:0.7,medium:0.2,long:0.1 --llm-latency lognormal:-0.7,0.4 \\
+        --output bench.json --baseline app/tests/benchmark/baseline.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import resource
+import sys
+import tempfile
 import time
-from app.agents.compliance_agent import ComplianceAgent
-
-def run_performance_benchmark():
-    """Run performance benchmarks on the compliance agent."""
-    # Test documents
-    documents = [
-        "Patient data was shared with the research team without explicit consent.",
-        "Medical records were updated but some fields were left blank."
-    ]
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+from unittest.mock import patch
+
+import httpx
+
+from app.config.settings import settings
+from app.services import llm as llm_service
+from app.services import vector_store
+from app.tests.benchmark.fakes import FakeChatModel, FakeEmbeddings
+
+# Approximate word counts per document size class
+DOCUMENT_SIZES = {"short": 60, "medium": 800, "long": 9000}
+
+SENTENCES = [
+    "Patient data was shared with the research team without explicit consent.",
+    "Some fields in the discharge summary were left blank.",
+    "The consent form was signed by the patient's relative.",
+    "Records were faxed to an outside billing vendor.",
+    "The trial protocol was amended before IRB review.",
+    "Lab results were emailed to the patient's employer.",
+    "A physician referred patients to a lab owned by a family member.",
+    "The device was marketed before 510(k) clearance.",
+]
+
+def make_document(size: str, rng: random.Random) -> str:
+    """Generate a deterministic document of the given size class."""
+    words = 0
+    sentences = []
+    while words < DOCUMENT_SIZES[size]:
+        sentence = rng.choice(SENTENCES)
+        sentences.append(sentence)
+        words += len(sentence.split())
+        if len(sentences) % 6 == 0:
+            sentences.append("\n\n")
+    return " ".join(sentences)
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition(":")
+        if name not in DOCUMENT_SIZES:
+            raise ValueError(f"Unknown document size: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def summarize_latencies(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(percentile(values, 50) * 1000, 2),
+        "p95": round(percentile(values, 95) * 1000, 2),
+        "p99": round(percentile(values, 99) * 1000, 2),
+        "mean": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "max": round(max(values) * 1000, 2) if values else 0.0,
+    }
+
+class NodeTimer:
+    """Wraps the graph node functions so each call's duration is recorded."""
+
+    NODES = ("retrieve", "triage", "analyze", "summarize", "review")
+
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self._patches = []
+
+    def _wrap_sync(self, name, func):
+        def timed(state):
+            start = time.perf_counter()
+            try:
+                return func(state)
+            finally:
+                self.timings[name].append(time.perf_counter() - start)
+        return timed
+
+    def _wrap_async(self, name, func):
+        async def timed(state):
+            start = time.perf_counter()
+            try:
+                return await func(state)
+            finally:
+                self.timings[name].append(time.perf_counter() - start)
+        return timed
+
+    def __enter__(self):
+        from app.agents import compliance_agent
+        for name in self.NODES:
+            for attr, wrap in ((name, self._wrap_sync), (f"a{name}", self._wrap_async)):
+                original = getattr(compliance_agent, attr)
+                patcher = patch.object(compliance_agent, attr, wrap(name, original))
+                patcher.start()
+                self._patches.append(patcher)
+        return self
+
+    def __exit__(self, *exc):
+        for patcher in reversed(self._patches):
+            patcher.stop()
+
+    def reset(self):
+        self.timings.clear()
+
+def calibrate(rounds: int = 3) -> float:
+    """Time a fixed CPU-bound workload on this host, in milliseconds (best of rounds)."""
+    rng = random.Random(0)
+    values = [rng.random() for _ in range(200000)]
+    text = (" ".join(SENTENCES) * 2000).encode("utf-8")
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        sorted(values)
+        hashlib.sha256(text).hexdigest()
+        json.loads(json.dumps(values[:50000]))
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 2)
+
+async def _drive(client: httpx.AsyncClient, endpoint: str, documents: List[str], concurrency: int) -> Dict:
+    latencies = []
+    errors = 0
+    queue = list(enumerate(documents))
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            _, document = queue.pop()
+            start = time.perf_counter()
+            response = await client.post(endpoint, json={"document_text": document, "compliance_area": "HIPAA"})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(documents),
+        "errors": errors,
+        "duration_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(documents) / elapsed, 2),
+        "latency_ms": summarize_latencies(latencies),
+    }
+
+async def _run(args) -> Dict:
+    from app.main import app
+
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    sizes = list(mix)
+    weights = [mix[name] for name in sizes]
+
+    timer = NodeTimer()
+    runs = []
+    with timer:
+        # Build the agent inside the timer so the graph picks up the wrapped nodes
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+                # Warm up: builds the index and first-call paths outside the measurement
+                await client.post(args.endpoint, json={"document_text": SENTENCES[0], "compliance_area": "HIPAA"})
+
+                for concurrency in args.concurrency:
+                    timer.reset()
+                    documents = [make_document(rng.choices(sizes, weights)[0], rng) for _ in range(args.requests)]
+                    run = await _drive(client, args.endpoint, documents, concurrency)
+                    run["concurrency"] = concurrency
+                    run["nodes_ms"] = {name: summarize_latencies(values) for name, values in timer.timings.items()}
+                    runs.append(run)
+
+    return {
+        "config": {
+            "endpoint": args.endpoint,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "mix": mix,
+            "llm_latency": args.llm_latency,
+            "token_latency": args.token_latency,
+            "embed_latency": args.embed_latency,
+            "response_cache": args.cache,
+            "agent_mode": args.mode,
+            "triage": args.triage,
+            "seed": args.seed,
+        },
+        "runs": runs,
+        "calibration_ms": calibrate(),
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def compare_to_baseline(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """List the regressions of a report against a baseline, by concurrency level.
     
-    # Initialize agent
-    agent = ComplianceAgent()
+    Raises ValueError if the baseline was run with another configuration, since
+    its numbers would not be comparable.
     
-    # Run benchmarks
-    results = []
-    for doc in documents:
-        start_time = time.time()
-        result = agent.run(document=doc, compliance_area="HIPAA")
-        duration = time.time() - start_time
-        
-        # Check result validity
-        assert "compliance_issues" in result
-        assert "suggestions" in result
-        assert "references" in result
-        
-        results.append({
-            "document_length": len(doc),
-            "issues_found": len(result["compliance_issues"]),
-            "suggestions": len(result["suggestions"]),
-            "references": len(result["references"]),
-            "duration_seconds": duration
-        })
+    Limits are scaled by how much slower this host ran the calibration than the
+    baseline's host. The stand-ins' simulated latency does not scale with the
+    host, so faster hosts are held to the baseline's numbers rather than
+    tighter ones.
+    """
+    config, baseline_config = report["config"], baseline.get("config", {})
+    mismatched = sorted(key for key in config.keys() | baseline_config.keys() if config.get(key) != baseline_config.get(key))
+    if mismatched:
+        raise ValueError(
+            "Baseline was run with a different configuration ("
+            + ", ".join(f"{key}: {baseline_config.get(key)!r} != {config.get(key)!r}" for key in mismatched)
+            + "); regenerate it with --output"
+        )
     
-    print("Benchmark Results:")
-    for i, res in enumerate(results):
-        print(f"Document {i+1}:")
-        print(f"  Duration: {res['duration_seconds']:.2f} seconds")
-        print(f"  Issues found: {res['issues_found']}")
-        print(f"  Suggestions: {res['suggestions']}")
-        print(f"  References: {res['references']}")
+    if not baseline.get("calibration_ms"):
+        raise ValueError("Baseline has no host calibration; regenerate it with --output")
+    scale = max(1.0, report["calibration_ms"] / baseline["calibration_ms"])
     
-    return results
+    regressions = []
+    baseline_runs = {run["concurrency"]: run for run in baseline.get("runs", [])}
+    for run in report["runs"]:
+        base = baseline_runs.get(run["concurrency"])
+        if base is None:
+            continue
+        for pct in ("p50", "p95", "p99"):
+            limit = base["latency_ms"][pct] * scale * (1 + tolerance)
+            if run["latency_ms"][pct] > limit:
+                regressions.append(
+                    f"concurrency {run['concurrency']}: {pct} {run['latency_ms'][pct]}ms > {limit:.2f}ms"
+                )
+        floor = base["throughput_rps"] / scale * (1 - tolerance)
+        if run["throughput_rps"] < floor:
+            regressions.append(
+                f"concurrency {run['concurrency']}: throughput {run['throughput_rps']} rps < {floor:.2f} rps"
+            )
+        if run["errors"] > base["errors"]:
+            regressions.append(f"concurrency {run['concurrency']}: {run['errors']} errors")
+    return regressions
+
+def run_performance_benchmark(argv=None) -> Dict:
+    """Run the offline load benchmark and return its report."""
+    parser = argparse.ArgumentParser(description="Offline load benchmark for the compliance API.")
+    parser.add_argument("--endpoint", default="/compliance_checks")
+    parser.add_argument("--concurrency", default="1,8,32", type=lambda v: [int(c) for c in v.split(",")])
+    parser.add_argument("--requests", default=100, type=int, help="Requests per concurrency level.")
+    parser.add_argument("--mix", default="short:0.7,medium:0.25,long:0.05", help="Document size mix.")
+    parser.add_argument("--llm-latency", default="lognormal:-1.6,0.3", help="Latency spec per LLM call.")
+    parser.add_argument("--token-latency", default=0.0, type=float, help="Delay per streamed token.")
+    parser.add_argument("--embed-latency", default="fixed:0.02", help="Latency spec per embeddings request.")
+    parser.add_argument("--cache", action="store_true", help="Keep the response cache enabled.")
+    parser.add_argument("--mode", default="two_pass", choices=["two_pass", "single_pass"], help="Compliance graph mode.")
+    parser.add_argument("--triage", action="store_true", help="Screen documents with a triage model first.")
+    parser.add_argument("--seed", default=7, type=int)
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    parser.add_argument("--baseline", help="Compare against this JSON report.")
+    parser.add_argument("--tolerance", default=0.15, type=float, help="Allowed relative regression.")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            patch.object(settings, "VECTOR_DB_PATH", str(Path(tmp) / "vector_db")), \
+            patch.object(settings, "COMPLIANCE_DOCS_PATH", str(Path(tmp) / "compliance_docs")), \
+            patch.object(settings, "JOBS_DB_PATH", str(Path(tmp) / "jobs.sqlite")), \
+            patch.object(settings, "RESPONSE_CACHE_ENABLED", args.cache), \
+            patch.object(settings, "AGENT_MODE", args.mode), \
+            patch.object(settings, "LLM_TRIAGE_MODEL", "fake-triage" if args.triage else None), \
+            patch.object(vector_store, "_vector_store", None):
+        llm_service.override_clients(
+            llm=FakeChatModel(latency=args.llm_latency, token_latency=args.token_latency, seed=args.seed),
+            embeddings=FakeEmbeddings(latency=args.embed_latency, seed=args.seed),
+        )
+        try:
+            report = asyncio.run(_run(args))
+        finally:
+            llm_service.override_clients()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    print(output)
+
+    if args.baseline:
+        try:
+            regressions = compare_to_baseline(report, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        except ValueError as e:
+            parser.error(str(e))
+        for regression in regressions:
+            print(f"REGRESSION: {regression}", file=sys.stderr)
+        report["regressions"] = regressions
+
+    return report
 
 if __name__ == "__main__":
-    run_performance_benchmark() 
\ No newline at end of file
+    report = run_performance_benchmark()
+    sys.exit(1 if report.get("regressions") else 0)
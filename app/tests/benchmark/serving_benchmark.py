@@ -0,0 +1,191 @@
+"""Throughput and memory of the multi-process serving profile by worker count.
+
+Builds an index over a synthetic corpus, then serves the API with
+app/gunicorn_conf.py and the offline stand-ins (fake_app.py) at each worker
+count, drives it over HTTP and reports throughput, latency percentiles and
+the memory of the whole process tree. Throughput should grow with the worker
+count up to the number of cores, while proportional set size (PSS, which
+splits shared pages between the processes using them) should grow far slower
+than the per-process RSS sum, because the index is loaded once in the master.
+Memory figures come from /proc and need Linux.
+
+Usage:
+    python -m app.tests.benchmark.serving_benchmark
+    python -m app.tests.benchmark.serving_benchmark --workers 1,2,4,8 --concurrency 64 --requests 1000 \\
+        --chunks 20000 --llm-latency fixed:0 --output serving.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+from unittest.mock import patch
+
+import httpx
+
+from app.config.settings import settings
+from app.services import llm as llm_service
+from app.services import vector_store
+from app.tests.benchmark.fakes import FakeEmbeddings
+from app.tests.benchmark.performance_benchmark import SENTENCES, _drive, make_document, parse_mix
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+
+def build_corpus(docs_path: Path, db_path: Path, chunks: int, seed: int) -> None:
+    """Write a synthetic corpus and publish its index with the stand-in embeddings."""
+    rng = random.Random(seed)
+    docs_path.mkdir(parents=True)
+    areas = ["hipaa", "fda", "stark", "general"]
+    # Roughly one chunk per file keeps the chunk count predictable
+    for i in range(chunks):
+        text = " ".join(rng.choice(SENTENCES) for _ in range(8))
+        (docs_path / f"{areas[i % len(areas)]}_{i}.txt").write_text(text)
+
+    with patch.object(settings, "COMPLIANCE_DOCS_PATH", str(docs_path)), \
+            patch.object(settings, "VECTOR_DB_PATH", str(db_path)):
+        llm_service.override_clients(embeddings=FakeEmbeddings())
+        try:
+            vector_store.ingest_documents()
+        finally:
+            llm_service.override_clients()
+
+def process_tree(pid: int) -> List[int]:
+    children = Path(f"/proc/{pid}/task/{pid}/children").read_text().split()
+    return [pid] + [int(child) for child in children]
+
+def memory_mb(pids: List[int]) -> Dict[str, float]:
+    """Summed RSS and PSS of the processes, from /proc/<pid>/smaps_rollup."""
+    totals = {"rss": 0, "pss": 0}
+    for pid in pids:
+        try:
+            lines = Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()
+        except OSError:
+            continue
+        for line in lines:
+            key, _, value = line.partition(":")
+            if key.lower() in totals:
+                totals[key.lower()] += int(value.split()[0])
+    return {f"{key}_mb": round(kb / 1024, 1) for key, kb in totals.items()}
+
+def wait_until_ready(base_url: str, proc: subprocess.Popen, workers: int, timeout: float = 120) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with status {proc.returncode}")
+        try:
+            ready = httpx.get(f"{base_url}/ready", timeout=1).status_code == 200
+        except httpx.HTTPError:
+            ready = False
+        if ready and len(process_tree(proc.pid)) > workers:
+            return
+        time.sleep(0.2)
+    raise TimeoutError("Server did not become ready")
+
+async def _load(base_url: str, endpoint: str, documents: List[str], concurrency: int) -> Dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        # Warm up every worker's first-call paths outside the measurement
+        await _drive(client, endpoint, documents[:concurrency], concurrency)
+        return await _drive(client, endpoint, documents, concurrency)
+
+def run_workers(workers: int, documents: List[str], env: Dict[str, str], args) -> Dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = {**env, "SERVE_WORKERS": str(workers)}
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "app/gunicorn_conf.py", "app.tests.benchmark.fake_app:app"],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_ready(base_url, proc, workers)
+        ready_seconds = time.perf_counter() - start
+        run = asyncio.run(_load(base_url, args.endpoint, documents, args.concurrency))
+        return {
+            "workers": workers,
+            "ready_seconds": round(ready_seconds, 2),
+            **run,
+            "memory": memory_mb(process_tree(proc.pid)),
+        }
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+def run_serving_benchmark(argv=None) -> Dict:
+    """Run the serving benchmark and return its report."""
+    cores = os.cpu_count() or 1
+    default_workers = ",".join(str(n) for n in sorted({1, 2, 4, cores}) if n <= cores)
+
+    parser = argparse.ArgumentParser(description="Throughput and memory of the serving profile by worker count.")
+    parser.add_argument("--workers", default=default_workers, type=lambda v: [int(c) for c in v.split(",")])
+    parser.add_argument("--endpoint", default="/compliance_checks")
+    parser.add_argument("--concurrency", default=32, type=int, help="Concurrent client connections.")
+    parser.add_argument("--requests", default=400, type=int, help="Requests per worker count.")
+    parser.add_argument("--mix", default="short:0.8,medium:0.2", help="Document size mix.")
+    parser.add_argument("--chunks", default=5000, type=int, help="Approximate corpus size in chunks.")
+    parser.add_argument("--llm-latency", default="fixed:0", help="Latency spec per LLM call.")
+    parser.add_argument("--embed-latency", default="fixed:0", help="Latency spec per embeddings request.")
+    parser.add_argument("--port", default=8765, type=int)
+    parser.add_argument("--seed", default=7, type=int)
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    sizes = list(mix)
+    documents = [make_document(rng.choices(sizes, [mix[s] for s in sizes])[0], rng) for _ in range(args.requests)]
+
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path, db_path = Path(tmp) / "compliance_docs", Path(tmp) / "vector_db"
+        build_corpus(docs_path, db_path, args.chunks, args.seed)
+        env = {
+            **os.environ,
+            "PYTHONPATH": str(REPO_ROOT),
+            "COMPLIANCE_DOCS_PATH": str(docs_path),
+            "VECTOR_DB_PATH": str(db_path),
+            "API_HOST": "127.0.0.1",
+            "API_PORT": str(args.port),
+            "RESPONSE_CACHE_ENABLED": "false",
+            "JOBS_ENABLED": "false",
+            "BENCHMARK_LLM_LATENCY": args.llm_latency,
+            "BENCHMARK_EMBED_LATENCY": args.embed_latency,
+        }
+        for workers in args.workers:
+            runs.append(run_workers(workers, documents, env, args))
+
+    base = runs[0]["throughput_rps"] / runs[0]["workers"] if runs else 0.0
+    for run in runs:
+        run["scaling_efficiency"] = round(run["throughput_rps"] / (base * run["workers"]), 2) if base else 0.0
+
+    report = {
+        "config": {
+            "cores": cores,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "mix": mix,
+            "chunks": args.chunks,
+            "llm_latency": args.llm_latency,
+            "embed_latency": args.embed_latency,
+            "vector_db_mmap": settings.VECTOR_DB_MMAP,
+            "seed": args.seed,
+        },
+        "runs": runs,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    print(output)
+    return report
+
+if __name__ == "__main__":
+    run_serving_benchmark()
@@ -0,0 +1,92 @@
+"""Import-time profile of the API process.
+
+Imports a module in a fresh interpreter under ``python -X importtime`` and
+reports the total import time, the slowest modules by cumulative and self
+time, and the third-party packages that dominate it. Use it to check that
+heavy dependencies stay out of the import path of the server.
+
+Usage:
+    python -m app.tests.benchmark.startup_profile
+    python -m app.tests.benchmark.startup_profile --module app.main --top 25 --output startup.json
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# "import time:       self [us] |  cumulative | imported package", nested imports indented by two spaces
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+def parse_importtime(output: str) -> List[Dict]:
+    """Parse -X importtime output into records with times in milliseconds."""
+    records = []
+    for line in output.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            records.append({
+                "module": module,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+                "depth": len(indent) // 2,
+            })
+    return records
+
+def profile_import(module: str) -> Dict:
+    """Import a module in a fresh interpreter and return its wall time and import records."""
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=False
+    )
+    wall_seconds = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    return {"wall_seconds": wall_seconds, "records": parse_importtime(completed.stderr)}
+
+def summarize_profile(records: List[Dict], top: int) -> Dict:
+    packages: Dict[str, float] = {}
+    for record in records:
+        root = record["module"].split(".", 1)[0]
+        packages[root] = packages.get(root, 0.0) + record["self_ms"]
+
+    def rounded(items: List[Dict]) -> List[Dict]:
+        return [
+            {"module": r["module"], "self_ms": round(r["self_ms"], 1), "cumulative_ms": round(r["cumulative_ms"], 1)}
+            for r in items
+        ]
+
+    return {
+        "total_import_ms": round(sum(r["cumulative_ms"] for r in records if r["depth"] == 0), 1),
+        "modules": len(records),
+        "slowest_cumulative": rounded(sorted(records, key=lambda r: -r["cumulative_ms"])[:top]),
+        "slowest_self": rounded(sorted(records, key=lambda r: -r["self_ms"])[:top]),
+        "packages_ms": {name: round(ms, 1) for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:top]},
+    }
+
+def run_startup_profile(argv=None) -> Dict:
+    """Run the import-time profile and return its report."""
+    parser = argparse.ArgumentParser(description="Import-time profile of the API process.")
+    parser.add_argument("--module", default="app.main", help="Module to import.")
+    parser.add_argument("--top", default=20, type=int, help="Modules and packages to list.")
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    args = parser.parse_args(argv)
+
+    profile = profile_import(args.module)
+    report = {
+        "module": args.module,
+        "wall_seconds": round(profile["wall_seconds"], 3),
+        **summarize_profile(profile["records"], args.top),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    print(output)
+    return report
+
+if __name__ == "__main__":
+    run_startup_profile()
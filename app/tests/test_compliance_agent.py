@@ -1,5 +1,6 @@
+import asyncio
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 import os
 import sys
 
@@ -8,14 +9,18 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../.
 
 from app.agents.compliance_agent import ComplianceAgent, AgentState
 from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from app.tests.benchmark.fakes import FakeChatModel, FAKE_REFERENCES, FAKE_SUGGESTIONS
+from app.config.settings import settings
 
 class TestComplianceAgent(unittest.TestCase):
-    @patch("app.services.vector_store.get_vector_store")
-    @patch("langchain_openai.ChatOpenAI")
-    def test_compliance_agent_flow(self, mock_chat_openai, mock_get_vector_store):
-        # Mock vector store
-        mock_vector_store = MagicMock()
-        mock_vector_store.similarity_search.return_value = [
+    @patch("app.agents.compliance_agent.similarity_search")
+    @patch("app.agents.compliance_agent.get_llm")
+    def test_compliance_agent_flow(self, mock_get_llm, mock_similarity_search):
+        # Mock vector store search
+        mock_similarity_search.return_value = [
             Document(
                 page_content="HIPAA requires patient authorization for disclosure of PHI.",
                 metadata={"source": "hipaa.txt"}
@@ -25,7 +30,6 @@ class TestComplianceAgent(unittest.TestCase):
                 metadata={"source": "general_healthcare_compliance.txt"}
             )
         ]
-        mock_get_vector_store.return_value = mock_vector_store
         
         # Mock LLM responses
         mock_llm = MagicMock()
@@ -42,7 +46,7 @@ class TestComplianceAgent(unittest.TestCase):
         - Healthcare Documentation Standards AHIMA 2.1"""
         
         mock_llm.invoke.side_effect = [mock_response1, mock_response2]
-        mock_chat_openai.return_value = mock_llm
+        mock_get_llm.return_value = mock_llm
         
         # Create and run agent
         agent = ComplianceAgent()
@@ -57,5 +61,250 @@ class TestComplianceAgent(unittest.TestCase):
         self.assertIn("Obtain written patient authorization", result["suggestions"][0])
         self.assertIn("HIPAA Privacy Rule", result["references"][0])
 
+    @patch("app.agents.compliance_agent.asimilarity_search", new_callable=AsyncMock)
+    @patch("app.agents.compliance_agent.get_llm")
+    def test_compliance_agent_async_flow(self, mock_get_llm, mock_asimilarity_search):
+        mock_asimilarity_search.return_value = [
+            Document(
+                page_content="HIPAA requires patient authorization for disclosure of PHI.",
+                metadata={"source": "hipaa.txt"}
+            )
+        ]
+        
+        mock_llm = MagicMock()
+        mock_llm.ainvoke = AsyncMock(side_effect=[
+            MagicMock(content="Missing patient authorization for PHI disclosure"),
+            MagicMock(content='{"suggestions": ["Obtain written authorization"], "references": ["45 CFR 164.508"]}')
+        ])
+        mock_get_llm.return_value = mock_llm
+        
+        agent = ComplianceAgent()
+        result = asyncio.run(agent.arun(
+            document="Patient data was shared with the research team.",
+            compliance_area="HIPAA"
+        ))
+        
+        # The async path never touches the blocking client methods
+        mock_llm.invoke.assert_not_called()
+        self.assertEqual(mock_asimilarity_search.await_count, 1)
+        self.assertEqual(result["compliance_issues"], ["Missing patient authorization for PHI disclosure"])
+        self.assertEqual(result["suggestions"], ["Obtain written authorization"])
+        self.assertEqual(result["references"], ["45 CFR 164.508"])
+
+    @patch("app.agents.compliance_agent.abatch_similarity_search", new_callable=AsyncMock)
+    @patch("app.agents.compliance_agent.asimilarity_search", new_callable=AsyncMock)
+    @patch("app.agents.compliance_agent.get_llm")
+    def test_compliance_agent_batch_isolates_failures(self, mock_get_llm, mock_asimilarity_search, mock_abatch_search):
+        source = Document(page_content="HIPAA requires patient authorization.", metadata={"source": "hipaa.txt"})
+        mock_abatch_search.side_effect = lambda queries, k, compliance_areas: [[source] for _ in queries]
+        
+        async def fake_ainvoke(prompt):
+            if "corrupted" in prompt:
+                raise RuntimeError("model unavailable")
+            if "Identified Compliance Issues" in prompt:
+                return MagicMock(content='{"suggestions": ["Get consent"], "references": ["45 CFR 164.508"]}')
+            return MagicMock(content="Missing authorization")
+        
+        mock_llm = MagicMock()
+        mock_llm.ainvoke = AsyncMock(side_effect=fake_ainvoke)
+        mock_get_llm.return_value = mock_llm
+        
+        agent = ComplianceAgent()
+        documents = ["Shared PHI with a vendor.", "corrupted upload", "Sent records to research."]
+        results = asyncio.run(agent.arun_batch(documents, ["HIPAA"] * 3))
+        
+        # Retrieval happened once for the whole batch
+        self.assertEqual(mock_abatch_search.await_count, 1)
+        self.assertEqual(mock_abatch_search.call_args.kwargs["compliance_areas"], ["HIPAA"] * 3)
+        mock_asimilarity_search.assert_not_called()
+        
+        self.assertEqual([item["index"] for item in results], [0, 1, 2])
+        self.assertEqual(results[0]["result"]["document_text"], documents[0])
+        self.assertEqual(results[0]["result"]["references"], ["45 CFR 164.508"])
+        self.assertIsNone(results[1]["result"])
+        self.assertIn("model unavailable", results[1]["error"])
+        self.assertEqual(results[2]["result"]["compliance_issues"], ["Missing authorization"])
+
+    @patch("app.agents.compliance_agent.abatch_similarity_search", new_callable=AsyncMock)
+    @patch("app.agents.compliance_agent.asimilarity_search", new_callable=AsyncMock)
+    @patch("app.agents.compliance_agent.get_llm")
+    def test_rejected_batch_retrieval_is_logged_and_retried_per_document(self, mock_get_llm, mock_asimilarity_search, mock_abatch_search):
+        mock_abatch_search.side_effect = ValueError("batch too large")
+        mock_asimilarity_search.return_value = []
+        mock_llm = MagicMock()
+        mock_llm.ainvoke = AsyncMock(return_value=MagicMock(content='{"suggestions": [], "references": []}'))
+        mock_get_llm.return_value = mock_llm
+        
+        with self.assertLogs("app.agents.compliance_agent", level="ERROR") as logs:
+            results = asyncio.run(ComplianceAgent().arun_batch(["Shared PHI.", "Sent records."], ["HIPAA"] * 2))
+        
+        self.assertIn("Batch retrieval of 2 documents failed", logs.output[0])
+        self.assertEqual(mock_asimilarity_search.await_count, 2)
+        self.assertTrue(all(item["error"] is None for item in results))
+    
+    @patch("app.agents.compliance_agent.abatch_similarity_search", new_callable=AsyncMock)
+    def test_batch_retrieval_outage_is_not_retried_per_document(self, mock_abatch_search):
+        mock_abatch_search.side_effect = ConnectionError("embeddings endpoint down")
+        with patch("app.agents.compliance_agent.asimilarity_search", new_callable=AsyncMock) as mock_asimilarity_search:
+            with self.assertRaises(ConnectionError):
+                asyncio.run(ComplianceAgent().arun_batch(["Shared PHI.", "Sent records."], ["HIPAA"] * 2))
+        mock_asimilarity_search.assert_not_called()
+    
+    @patch("app.agents.compliance_agent.asimilarity_search", new_callable=AsyncMock)
+    @patch("app.agents.compliance_agent.get_llm")
+    def test_compliance_agent_streams_node_progress(self, mock_get_llm, mock_asimilarity_search):
+        mock_asimilarity_search.return_value = [
+            Document(page_content="HIPAA requires patient authorization.", metadata={"source": "hipaa.txt"})
+        ]
+        mock_get_llm.return_value = GenericFakeChatModel(messages=iter([
+            AIMessage(content="Missing patient authorization"),
+            AIMessage(content='{"suggestions": ["Obtain consent"], "references": ["45 CFR 164.508"]}')
+        ]))
+        
+        async def collect():
+            agent = ComplianceAgent()
+            return [event async for event in agent.astream("Patient data was shared.", "HIPAA")]
+        
+        events = asyncio.run(collect())
+        names = [name for name, _ in events]
+        
+        # Sources arrive first, issue tokens stream before the parsed issues, the summary follows
+        self.assertEqual(names[0], "sources")
+        self.assertEqual(events[0][1]["sources"][0]["source"], "hipaa.txt")
+        self.assertLess(names.index("issues_token"), names.index("issues"))
+        self.assertEqual(names[-2:], ["summary", "result"])
+        tokens = "".join(data["token"] for name, data in events if name == "issues_token")
+        self.assertEqual(tokens, "Missing patient authorization")
+        self.assertEqual(events[-1][1]["references"], ["45 CFR 164.508"])
+
+    @patch("app.agents.compliance_agent.settings.ANALYSIS_SECTION_TOKENS", 40)
+    @patch("app.agents.compliance_agent.settings.ANALYSIS_SECTION_OVERLAP_TOKENS", 0)
+    @patch("app.agents.compliance_agent.batch_similarity_search")
+    @patch("app.agents.compliance_agent.get_llm")
+    def test_long_documents_are_analyzed_by_section(self, mock_get_llm, mock_batch_search):
+        hipaa = Document(page_content="HIPAA requires patient authorization.", metadata={"source": "hipaa.txt"})
+        fda = Document(page_content="Trials require IRB approval.", metadata={"source": "fda.txt"})
+        mock_batch_search.side_effect = lambda queries, k, compliance_areas: [[hipaa] if i % 2 == 0 else [hipaa, fda] for i in range(len(queries))]
+        
+        mock_llm = MagicMock()
+        mock_llm.batch.side_effect = lambda prompts, config: [
+            MagicMock(content=f"1. Missing patient authorization\n2. Issue in section {i}")
+            for i in range(len(prompts))
+        ]
+        mock_llm.invoke.return_value = MagicMock(content='{"suggestions": [], "references": []}')
+        mock_get_llm.return_value = mock_llm
+        
+        paragraphs = [f"Paragraph {i}: " + "patient data was disclosed without authorization. " * 8 for i in range(4)]
+        result = ComplianceAgent().run(document="\n\n".join(paragraphs), compliance_area="HIPAA")
+        
+        # One batched retrieval and one concurrent analysis call per section
+        section_count = len(mock_batch_search.call_args[0][0])
+        self.assertGreater(section_count, 1)
+        self.assertEqual(len(mock_llm.batch.call_args[0][0]), section_count)
+        mock_llm.invoke.assert_called_once()
+        
+        # Shared issues are reported once; per-section issues are kept
+        self.assertEqual(result["compliance_issues"][0], "1. Missing patient authorization")
+        self.assertEqual(len(result["compliance_issues"]), section_count + 1)
+        
+        # Summarize sees the merged, de-duplicated context
+        summarize_prompt = mock_llm.invoke.call_args[0][0]
+        self.assertEqual(summarize_prompt.count("HIPAA requires patient authorization."), 1)
+        self.assertIn("Trials require IRB approval.", summarize_prompt)
+
+    @patch("app.agents.compliance_agent.similarity_search")
+    @patch("app.agents.compliance_agent.get_llm")
+    def test_single_pass_mode_makes_one_structured_call(self, mock_get_llm, mock_similarity_search):
+        mock_similarity_search.return_value = [
+            Document(page_content="HIPAA requires patient authorization.", metadata={"source": "hipaa.txt"})
+        ]
+        llm = FakeChatModel()
+        mock_get_llm.return_value = llm
+        
+        agent = ComplianceAgent(mode="single_pass")
+        with patch.object(FakeChatModel, "_generate", wraps=llm._generate) as generate:
+            result = agent.run(document="Patient data was shared with the research team.", compliance_area="HIPAA")
+        
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(set(agent.agent.get_graph().nodes) - {"__start__", "__end__"}, {"retrieve", "review"})
+        self.assertTrue(result["compliance_issues"])
+        self.assertEqual(result["suggestions"], FAKE_SUGGESTIONS)
+        self.assertEqual(result["references"], FAKE_REFERENCES)
+
+    @patch("app.agents.compliance_agent.asimilarity_search", new_callable=AsyncMock)
+    @patch("app.agents.compliance_agent.get_llm")
+    def test_single_pass_mode_streams_issues_and_summary(self, mock_get_llm, mock_asimilarity_search):
+        mock_asimilarity_search.return_value = [
+            Document(page_content="HIPAA requires patient authorization.", metadata={"source": "hipaa.txt"})
+        ]
+        mock_get_llm.return_value = FakeChatModel()
+        
+        async def collect():
+            agent = ComplianceAgent(mode="single_pass")
+            return [event async for event in agent.astream("Patient data was shared.", "HIPAA")]
+        
+        events = asyncio.run(collect())
+        self.assertEqual([name for name, _ in events], ["sources", "issues", "summary", "result"])
+        self.assertEqual(events[-1][1]["references"], FAKE_REFERENCES)
+
+    @patch("app.agents.compliance_agent.similarity_search")
+    @patch("app.agents.compliance_agent.get_llm")
+    def test_irrelevant_corpus_skips_analysis(self, mock_get_llm, mock_similarity_search):
+        mock_similarity_search.return_value = []
+        
+        with patch.object(settings, "RETRIEVAL_NO_CONTEXT_ACTION", "skip"):
+            result = ComplianceAgent().run(document="Quarterly cafeteria menu.", compliance_area="HIPAA")
+        
+        mock_get_llm.return_value.invoke.assert_not_called()
+        self.assertEqual(result["compliance_issues"], [])
+        self.assertEqual(result["suggestions"], [])
+
+    @patch("app.agents.compliance_agent.similarity_search")
+    @patch("app.agents.compliance_agent.get_llm")
+    def test_retrieved_chunks_are_trimmed_to_the_context_budget(self, mock_get_llm, mock_similarity_search):
+        mock_similarity_search.return_value = [
+            Document(page_content=f"HIPAA rule {i}. " * 40, metadata={"source": f"hipaa_{i}.txt"}) for i in range(8)
+        ]
+        mock_get_llm.return_value = FakeChatModel()
+        
+        with patch.object(settings, "RETRIEVAL_RELEVANCE_THRESHOLD", 0.5), patch.object(settings, "CONTEXT_MAX_TOKENS", 300):
+            agent = ComplianceAgent()
+            state = agent.agent.invoke(agent._initial_state("Patient data was shared.", "HIPAA"))
+        
+        self.assertEqual(mock_similarity_search.call_args.kwargs["k"], settings.RETRIEVAL_MAX_K)
+        self.assertTrue(0 < len(state["retrieved_documents"]) < 8)
+
+    @patch("app.agents.compliance_agent.similarity_search")
+    @patch("app.agents.compliance_agent.get_llm")
+    def test_triage_clears_clean_documents_and_escalates_the_rest(self, mock_get_llm, mock_similarity_search):
+        mock_similarity_search.return_value = [
+            Document(page_content="HIPAA requires patient authorization.", metadata={"source": "hipaa.txt"})
+        ]
+        mock_llm = MagicMock()
+        mock_llm.invoke.side_effect = [
+            MagicMock(content='{"has_issues": false, "confidence": 0.95}'),
+            MagicMock(content='{"has_issues": false, "confidence": 0.4}'),
+            MagicMock(content="Missing patient authorization"),
+            MagicMock(content='{"suggestions": ["Obtain authorization"], "references": ["45 CFR 164.508"]}'),
+        ]
+        mock_get_llm.return_value = mock_llm
+        
+        with patch.object(settings, "LLM_TRIAGE_MODEL", "gpt-4o-mini"):
+            agent = ComplianceAgent()
+            clean = agent.run(document="Staff completed annual privacy training.", compliance_area="HIPAA")
+            self.assertEqual(mock_llm.invoke.call_count, 1)
+            self.assertEqual(clean["compliance_issues"], [])
+            
+            # Low confidence escalates to the analysis model
+            flagged = agent.run(document="Patient data was shared.", compliance_area="HIPAA")
+        
+        self.assertEqual(mock_llm.invoke.call_count, 4)
+        self.assertEqual([call.args[0] for call in mock_get_llm.call_args_list], ["triage", "triage", "analyze", "summarize"])
+        self.assertEqual(flagged["compliance_issues"], ["Missing patient authorization"])
+
+    def test_unknown_mode_is_rejected(self):
+        with self.assertRaises(ValueError):
+            ComplianceAgent(mode="three_pass")
+
 if __name__ == "__main__":
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from langchain_core.documents import Document
+
+from app.services.context import build_context
+from app.services.tokens import count_tokens
+
+class TestBuildContext(unittest.TestCase):
+    def test_overlapping_chunks_from_one_source_are_merged(self):
+        overlap = "Business associate agreements must be established with vendors."
+        docs = [
+            Document(page_content=f"{overlap} Organizations must implement safeguards.", metadata={"source": "hipaa.txt"}),
+            Document(page_content=f"Patients may access their health information. {overlap}", metadata={"source": "hipaa.txt"}),
+            Document(page_content=f"{overlap} Unrelated source.", metadata={"source": "general.txt"}),
+        ]
+
+        context, _ = build_context(docs)
+
+        self.assertEqual(context.count(overlap), 2)
+        self.assertIn(
+            f"Source 1: Patients may access their health information. {overlap} Organizations must implement safeguards.",
+            context
+        )
+        self.assertIn("Source 2:", context)
+        self.assertNotIn("Source 3:", context)
+
+    def test_near_duplicates_are_dropped(self):
+        text = "Institutional Review Board approval and informed consent are required for clinical trials"
+        docs = [
+            Document(page_content=text, metadata={"source": "fda.txt"}),
+            Document(page_content=text + " today", metadata={"source": "fda_copy.txt"}),
+        ]
+
+        context, _ = build_context(docs)
+
+        self.assertIn("Source 1:", context)
+        self.assertNotIn("Source 2:", context)
+
+    def test_context_fits_the_token_budget(self):
+        docs = [
+            Document(page_content=f"Regulation {i}: " + f"requirement {i} applies. " * 40, metadata={"source": f"{i}.txt"})
+            for i in range(5)
+        ]
+
+        context, tokens = build_context(docs, max_tokens=300)
+
+        self.assertLessEqual(tokens, 300)
+        self.assertLessEqual(count_tokens(context), 300)
+        self.assertIn("Source 1: Regulation 0", context)
+
+    @patch("app.services.context.settings.CONTEXT_RELEVANCE_THRESHOLD", 0.5)
+    @patch("app.services.context._relevance_filter")
+    def test_relevance_filter_applies_when_configured(self, mock_filter):
+        docs = [Document(page_content="HIPAA text", metadata={"source": "hipaa.txt"}),
+                Document(page_content="FDA text", metadata={"source": "fda.txt"})]
+        mock_filter.return_value.compress_documents.return_value = docs[1:]
+
+        context, _ = build_context(docs, query="clinical trial")
+
+        self.assertEqual(context, "Source 1: FDA text")
+
+if __name__ == "__main__":
+    unittest.main()
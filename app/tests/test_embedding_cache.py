@@ -0,0 +1,132 @@
+import asyncio
+import sqlite3
+import unittest
+import os
+import sys
+import tempfile
+import time
+from contextlib import closing
+from unittest.mock import patch
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.services.embedding_cache import CachedEmbeddings, EmbeddingStore
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    calls: list = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return super().embed_documents(texts)
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "embeddings.sqlite")
+        self.embeddings = CountingEmbedding(size=8, calls=[])
+
+    def test_misses_are_deduplicated_into_one_request(self):
+        cached = CachedEmbeddings(self.embeddings, EmbeddingStore(self.path))
+        vectors = cached.embed_documents(["a", "b", "a"])
+
+        self.assertEqual(self.embeddings.calls, [["a", "b"]])
+        self.assertEqual(vectors[0], vectors[2])
+        np.testing.assert_allclose(vectors[1], self.embeddings.embed_documents(["b"])[0], rtol=1e-6)
+
+        self.embeddings.calls.clear()
+        cached.embed_documents(["b", "c"])
+        self.assertEqual(self.embeddings.calls, [["c"]])
+
+    def test_vectors_persist_across_processes(self):
+        CachedEmbeddings(self.embeddings, EmbeddingStore(self.path)).embed_documents(["a"])
+        self.embeddings.calls.clear()
+
+        # A new store has an empty memory tier, so this hit comes from disk
+        result = asyncio.run(CachedEmbeddings(self.embeddings, EmbeddingStore(self.path)).aembed_documents(["a"]))
+        self.assertEqual(self.embeddings.calls, [])
+        self.assertEqual(len(result[0]), 8)
+
+    def test_disk_tier_evicts_least_recently_used(self):
+        store = EmbeddingStore(self.path, max_entries=2, memory_entries=0)
+        with patch("app.services.embedding_cache.time.time", side_effect=[1.0, 2.0, 3.0, 4.0]):
+            store.put_many({"a": np.ones(4, dtype=np.float32)})
+            store.put_many({"b": np.ones(4, dtype=np.float32)})
+            store.get_many(["a"])
+            store.put_many({"c": np.ones(4, dtype=np.float32)})
+
+        self.assertEqual(sorted(store.get_many(["a", "b", "c"])), ["a", "c"])
+
+    def test_float16_storage_round_trips(self):
+        store = EmbeddingStore(self.path, memory_entries=0, dtype="float16")
+        vector = np.array([0.1, -0.25, 0.5], dtype=np.float32)
+        store.put_many({"a": vector})
+
+        found = store.get_many(["a"])["a"]
+        self.assertEqual(found.dtype, np.float32)
+        np.testing.assert_allclose(found, vector, atol=1e-3)
+
+    def test_switching_dtype_does_not_reuse_vectors_of_the_other_dtype(self):
+        CachedEmbeddings(self.embeddings, EmbeddingStore(self.path)).embed_documents(["a"])
+        self.embeddings.calls.clear()
+
+        store = EmbeddingStore(self.path, memory_entries=0, dtype="float16")
+        vectors = CachedEmbeddings(self.embeddings, store).embed_documents(["a"])
+        self.assertEqual(self.embeddings.calls, [["a"]])
+        self.assertEqual(len(vectors[0]), 8)
+
+        vectors = CachedEmbeddings(self.embeddings, EmbeddingStore(self.path, memory_entries=0)).embed_documents(["a"])
+        self.assertEqual(self.embeddings.calls, [["a"]])
+        self.assertEqual(len(vectors[0]), 8)
+
+    def test_unopenable_cache_file_caches_in_memory(self):
+        # The parent "directory" is a file, so the cache file cannot be created
+        blocker = os.path.join(self.tmp.name, "blocker")
+        open(blocker, "w").close()
+        with self.assertLogs("app.services.embedding_cache", "WARNING"):
+            store = EmbeddingStore(os.path.join(blocker, "embeddings.sqlite"))
+        self.assertFalse(store.disk_enabled)
+
+        cached = CachedEmbeddings(self.embeddings, store)
+        cached.embed_documents(["a", "b"])
+        cached.embed_documents(["a"])
+        self.assertEqual(self.embeddings.calls, [["a", "b"]])
+
+    def test_models_do_not_share_entries(self):
+        store = EmbeddingStore(self.path)
+        self.assertNotEqual(
+            CachedEmbeddings(self.embeddings, store, model="model-a")._keys(["a"], "query"),
+            CachedEmbeddings(self.embeddings, store, model="model-b")._keys(["a"], "query")
+        )
+
+    def test_locked_cache_file_falls_back_to_the_model(self):
+        store = EmbeddingStore(self.path)
+        cached = CachedEmbeddings(self.embeddings, store)
+        locked = sqlite3.OperationalError("database is locked")
+        with patch.object(store, "get_many", side_effect=locked), patch.object(store, "put_many", side_effect=locked):
+            vectors = cached.embed_documents(["a", "b"])
+
+        self.assertEqual(self.embeddings.calls, [["a", "b"]])
+        self.assertEqual(len(vectors), 2)
+
+    def test_disk_hits_update_last_used_in_batches(self):
+        store = EmbeddingStore(self.path, memory_entries=0)
+        with patch("app.services.embedding_cache.time.time", return_value=1.0):
+            store.put_many({"a": np.ones(4, dtype=np.float32)})
+        with patch("app.services.embedding_cache.time.time", return_value=2.0), \
+                patch.object(store, "_connect", wraps=store._connect) as connect:
+            store.get_many(["a"])
+            # The hit is read with one connection and written later
+            self.assertEqual(connect.call_count, 1)
+            with patch("app.services.embedding_cache.TOUCH_BATCH_SIZE", 1):
+                store.get_many(["a"])
+
+        with closing(sqlite3.connect(self.path)) as conn:
+            self.assertEqual(conn.execute("SELECT last_used FROM embeddings").fetchone()[0], 2.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import asyncio
+import unittest
+from unittest.mock import patch, MagicMock, AsyncMock
+import os
+import sys
+import tempfile
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+
+from app.agents.compliance_agent import ComplianceAgent
+from app.main import app, get_job_queue
+from app.services.checkpoints import SQLAlchemyCheckpointSaver
+from app.services.jobs import JobQueue, JobQueueFull, JobStore, create_sqlite_engine
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.engine = create_sqlite_engine(os.path.join(self.tmp.name, "jobs.sqlite"))
+        self.store = JobStore(self.engine)
+
+    def test_jobs_run_in_priority_order_and_store_results(self):
+        order = []
+
+        async def fake_arun(document, compliance_area, thread_id):
+            order.append(document)
+            return {"document_text": document, "compliance_issues": [], "suggestions": [], "references": []}
+
+        agent = MagicMock(checkpointer=None)
+        agent.arun = fake_arun
+
+        # Jobs left by a previous process are picked up on start
+        low = self.store.create([{"document_text": "low", "compliance_area": "HIPAA"}], priority=0)
+        high = self.store.create([{"document_text": "high", "compliance_area": "HIPAA"}], priority=5)
+
+        async def run():
+            queue = JobQueue(agent, self.store, workers=1)
+            await queue.start()
+            await queue._queue.join()
+            await queue.stop()
+
+        asyncio.run(run())
+
+        self.assertEqual(order, ["high", "low"])
+        job = self.store.get(low["id"])
+        self.assertEqual(job["status"], "completed")
+        self.assertEqual(job["completed_documents"], 1)
+        self.assertEqual(job["results"][0]["result"]["document_text"], "low")
+        self.assertEqual(self.store.get(high["id"])["status"], "completed")
+
+    def test_submissions_beyond_capacity_are_refused(self):
+        async def run():
+            queue = JobQueue(MagicMock(), self.store, workers=0, max_queued=1)
+            await queue.start()
+            await queue.submit([{"document_text": "doc", "compliance_area": "general"}])
+            with self.assertRaises(JobQueueFull):
+                await queue.submit([{"document_text": "doc", "compliance_area": "general"}])
+            await queue.stop()
+
+        asyncio.run(run())
+
+    def test_stopping_returns_running_jobs_to_the_queue(self):
+        started = asyncio.Event()
+
+        async def slow_arun(document, compliance_area, thread_id):
+            started.set()
+            await asyncio.sleep(60)
+
+        agent = MagicMock(checkpointer=None)
+        agent.arun = slow_arun
+
+        async def run():
+            queue = JobQueue(agent, self.store, workers=1)
+            await queue.start()
+            job = await queue.submit([{"document_text": "doc", "compliance_area": "HIPAA"}])
+            await asyncio.wait_for(started.wait(), 5)
+            await queue.stop()
+            return job
+
+        job = asyncio.run(run())
+        self.assertEqual(self.store.get(job["id"])["status"], "queued")
+
+        # Another worker process starting now must not take over live jobs
+        self.store.claim(job["id"])
+        self.assertEqual(self.store.requeue_unfinished(recover_running=False), [])
+
+    @patch("app.agents.compliance_agent.asimilarity_search", new_callable=AsyncMock)
+    @patch("app.agents.compliance_agent.get_llm")
+    def test_interrupted_run_resumes_from_last_completed_node(self, mock_get_llm, mock_asimilarity_search):
+        mock_asimilarity_search.return_value = [
+            Document(page_content="HIPAA requires patient authorization.", metadata={"source": "hipaa.txt"})
+        ]
+        mock_llm = MagicMock()
+        mock_llm.ainvoke = AsyncMock(side_effect=[
+            MagicMock(content="Missing patient authorization"),
+            RuntimeError("model unavailable"),
+            MagicMock(content='{"suggestions": ["Obtain authorization"], "references": ["45 CFR 164.508"]}'),
+        ])
+        mock_get_llm.return_value = mock_llm
+
+        agent = ComplianceAgent(checkpointer=SQLAlchemyCheckpointSaver(self.engine))
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(agent.arun("Patient data was shared.", "HIPAA", thread_id="job:0"))
+        result = asyncio.run(agent.arun("Patient data was shared.", "HIPAA", thread_id="job:0"))
+
+        # Retrieval and analysis are not repeated on resume
+        self.assertEqual(mock_asimilarity_search.await_count, 1)
+        self.assertEqual(mock_llm.ainvoke.await_count, 3)
+        self.assertEqual(result["compliance_issues"], ["Missing patient authorization"])
+        self.assertEqual(result["references"], ["45 CFR 164.508"])
+
+class TestJobEndpoints(unittest.TestCase):
+    def setUp(self):
+        self.queue = MagicMock()
+        app.dependency_overrides[get_job_queue] = lambda: self.queue
+        self.addCleanup(app.dependency_overrides.clear)
+        self.job = {
+            "id": "abc", "status": "queued", "priority": 1, "documents": [], "total_documents": 1,
+            "completed_documents": 0, "results": None, "error": None,
+            "created_at": 1.0, "started_at": None, "finished_at": None,
+        }
+
+    def test_submit_returns_job_id(self):
+        self.queue.submit = AsyncMock(return_value=self.job)
+        client = TestClient(app)
+        response = client.post("/jobs", json={"documents": [{"document_text": "doc", "compliance_area": "HIPAA"}], "priority": 1})
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["job_id"], "abc")
+        self.queue.submit.assert_awaited_once_with([{"document_text": "doc", "compliance_area": "HIPAA"}], priority=1)
+
+    def test_full_queue_is_reported_as_unavailable(self):
+        self.queue.submit = AsyncMock(side_effect=JobQueueFull("full"))
+        client = TestClient(app)
+        response = client.post("/jobs", json={"documents": [{"document_text": "doc"}]})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+
+    def test_unknown_job_is_not_found(self):
+        self.queue.get = AsyncMock(return_value=None)
+        client = TestClient(app)
+        self.assertEqual(client.get("/jobs/missing").status_code, 404)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+import os
+import sys
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import numpy as np
+
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+class TestTokenize(unittest.TestCase):
+    def test_citations_are_kept_whole(self):
+        self.assertEqual(tokenize("Premarket notification (510(k)) under 45 CFR 164.508"),
+                         ["premarket", "notification", "510(k)", "510", "under", "45", "cfr", "164.508"])
+
+    def test_citation_parts_also_match_the_base_section(self):
+        self.assertIn("164.508", tokenize("See 164.508(a)(1)."))
+
+class TestLexicalIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = LexicalIndex.build([
+            "HIPAA privacy rule on patient authorization",
+            "Institutional Review Board (IRB) approval for clinical trials",
+            "Premarket notification 510(k) for medical devices",
+            "Patient authorization under 164.508 of the privacy rule",
+        ])
+
+    def test_rare_terms_rank_first(self):
+        self.assertEqual(self.index.search("authorization required by 164.508", k=2), [3, 0])
+        self.assertEqual(self.index.search("is a 510(k) needed", k=1), [2])
+
+    def test_search_is_restricted_to_ids(self):
+        self.assertEqual(self.index.search("patient authorization", k=5, ids=np.array([0, 1])), [0])
+
+    def test_unknown_terms_match_nothing(self):
+        self.assertEqual(self.index.search("stark law", k=3), [])
+
+class TestReciprocalRankFusion(unittest.TestCase):
+    def test_ids_ranked_well_in_both_lists_win(self):
+        self.assertEqual(reciprocal_rank_fusion([[1, 2, 3], [3, 2]], k=2, rrf_k=60), [3, 2])
+
+if __name__ == "__main__":
+    unittest.main()
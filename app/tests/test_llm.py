@@ -0,0 +1,54 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.config.settings import settings
+from app.services import llm
+from app.tests.benchmark.fakes import FakeChatModel
+
+class FailingChatModel(FakeChatModel):
+    def _generate(self, *args, **kwargs):
+        raise TimeoutError("provider timed out")
+
+class TestModelRouting(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            patch.object(settings, "LLM_MODEL", "gpt-4o"),
+            patch.object(settings, "LLM_FALLBACK_MODELS", []),
+            patch.object(settings, "LLM_TRIAGE_MODEL", "gpt-4o-mini"),
+            patch.object(settings, "LLM_ROUTES", {"summarize": ["local:llama3", "gpt-4o"]}),
+            patch.object(settings, "LLM_PROVIDERS", {"local": {"base_url": "http://localhost:8080/v1", "api_key": "x"}}),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(llm._get_routed_llm.cache_clear)
+        self.addCleanup(llm._get_chat_model.cache_clear)
+
+    def test_nodes_use_their_routes(self):
+        self.assertEqual(llm.llm_route("analyze"), ["gpt-4o"])
+        self.assertEqual(llm.llm_route("triage"), ["gpt-4o-mini"])
+        self.assertEqual(llm.llm_route("summarize"), ["local:llama3", "gpt-4o"])
+
+    def test_provider_prefix_selects_an_openai_compatible_endpoint(self):
+        self.assertEqual(llm._split_model("local:llama3"), ("local", "llama3"))
+        self.assertEqual(llm._split_model("ft:gpt-4o-mini:acme"), ("openai", "ft:gpt-4o-mini:acme"))
+
+        model = llm._get_chat_model("local", "llama3")
+        self.assertEqual(model.model_name, "llama3")
+        self.assertEqual(model.openai_api_base, "http://localhost:8080/v1")
+        self.assertEqual(model.max_retries, settings.LLM_MAX_RETRIES)
+
+    def test_failing_model_fails_over_to_the_next_one(self):
+        models = {"llama3": FailingChatModel(), "gpt-4o": FakeChatModel()}
+        with patch.object(llm, "_get_chat_model", side_effect=lambda provider, model: models[model]):
+            response = llm.get_llm("summarize").invoke("Identified Compliance Issues: none")
+
+        self.assertIn("suggestions", response.content)
+
+if __name__ == "__main__":
+    unittest.main()
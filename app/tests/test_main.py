@@ -0,0 +1,178 @@
+import unittest
+from unittest.mock import patch, MagicMock, AsyncMock
+import fcntl
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+from prometheus_client import REGISTRY
+
+from app.agents.compliance_agent import ComplianceAgent
+from app.config.settings import settings
+from app.main import app, get_agent
+from app.services.llm import override_clients
+from app.tests.benchmark.fakes import FakeChatModel, FakeEmbeddings
+
+class TestStreamingEndpoint(unittest.TestCase):
+    def setUp(self):
+        async def fake_astream(document, compliance_area):
+            yield "sources", {"sources": [{"source": "hipaa.txt", "content": "..."}]}
+            yield "issues_token", {"token": "Missing"}
+            raise RuntimeError("model unavailable")
+
+        agent = MagicMock()
+        agent.astream = fake_astream
+        app.dependency_overrides[get_agent] = lambda: agent
+        self.addCleanup(app.dependency_overrides.clear)
+
+    def test_events_are_sent_as_sse(self):
+        client = TestClient(app)
+        response = client.post("/compliance_checks/stream", json={"document_text": "doc", "compliance_area": "HIPAA"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+
+        events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+        self.assertEqual([lines[0] for lines in events], ["event: sources", "event: issues_token", "event: error"])
+        self.assertEqual(json.loads(events[2][1][len("data: "):]), {"detail": "model unavailable"})
+
+    def test_stream_counts_as_in_flight_until_its_body_is_sent(self):
+        in_flight = []
+
+        async def fake_astream(document, compliance_area):
+            for i in range(3):
+                in_flight.append(REGISTRY.get_sample_value(
+                    "compliance_requests_in_flight", {"endpoint": "/compliance_checks/stream"}
+                ))
+                yield "issues_token", {"token": str(i)}
+
+        agent = MagicMock()
+        agent.astream = fake_astream
+        app.dependency_overrides[get_agent] = lambda: agent
+
+        client = TestClient(app)
+        client.post("/compliance_checks/stream", json={"document_text": "doc", "compliance_area": "HIPAA"})
+
+        self.assertEqual(in_flight, [1.0, 1.0, 1.0])
+        self.assertEqual(REGISTRY.get_sample_value(
+            "compliance_requests_in_flight", {"endpoint": "/compliance_checks/stream"}
+        ), 0.0)
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        override_clients(llm=FakeChatModel())
+        self.addCleanup(override_clients)
+
+        agent = ComplianceAgent()
+        app.dependency_overrides[get_agent] = lambda: agent
+        self.addCleanup(app.dependency_overrides.clear)
+
+        patches = [
+            patch.object(settings, "METRICS_TIMING_HEADER", True),
+            patch("app.agents.compliance_agent.asimilarity_search", new_callable=AsyncMock, return_value=[
+                Document(page_content="HIPAA requires patient authorization.", metadata={"source": "hipaa.txt"})
+            ]),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_timing_header_and_metrics_endpoint(self):
+        client = TestClient(app)
+        response = client.post("/compliance_checks", json={"document_text": "Shared PHI.", "compliance_area": "hipaa"})
+
+        self.assertEqual(response.status_code, 200)
+        timing = response.headers["Server-Timing"]
+        for node in ("retrieve", "analyze", "summarize"):
+            self.assertIn(f"{node};dur=", timing)
+
+        metrics = client.get("/metrics").text
+        self.assertIn('compliance_node_duration_seconds_count{compliance_area="HIPAA",node="analyze"}', metrics)
+        self.assertIn('compliance_llm_tokens_count{compliance_area="HIPAA",kind="prompt",node="summarize"}', metrics)
+        self.assertIn("compliance_llm_cost_usd_bucket", metrics)
+        self.assertIn('compliance_requests_in_flight{endpoint="/compliance_checks"} 0.0', metrics)
+
+class TestReadiness(unittest.TestCase):
+    def setUp(self):
+        override_clients(llm=FakeChatModel(), embeddings=FakeEmbeddings())
+        self.addCleanup(override_clients)
+
+        self.loaded = threading.Event()
+        patches = [
+            patch.object(settings, "JOBS_ENABLED", False),
+            patch.object(settings, "RESPONSE_CACHE_ENABLED", False),
+            patch("app.main.get_vector_store", side_effect=lambda: self.loaded.wait(5)),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_ready_once_warm_up_finishes(self):
+        with TestClient(app) as client:
+            # The server answers while the index is still loading
+            self.assertEqual(client.get("/").status_code, 200)
+            response = client.get("/ready")
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.json()["status"], "warming_up")
+
+            self.loaded.set()
+            deadline = time.monotonic() + 5
+            while client.get("/ready").status_code != 200 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(client.get("/ready").json()["status"], "ready")
+
+class TestIndexAdmin(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patches = [
+            patch.object(settings, "JOBS_ENABLED", False),
+            patch.object(settings, "WARMUP_ENABLED", False),
+            patch.object(settings, "ADMIN_API_TOKEN", "secret"),
+            patch.object(settings, "VECTOR_DB_PATH", self.tmp.name),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_admin_endpoints_require_the_token(self):
+        with TestClient(app) as client:
+            self.assertEqual(client.post("/admin/index/rollback").status_code, 403)
+
+    def test_admin_endpoints_are_disabled_without_a_token(self):
+        with patch.object(settings, "ADMIN_API_TOKEN", None), \
+                patch("app.main.build_index_version") as build, TestClient(app) as client:
+            response = client.post("/admin/index/rebuild", json={"full": True}, headers={"X-Admin-Token": ""})
+        self.assertEqual(response.status_code, 403)
+        build.assert_not_called()
+
+    def test_rebuild_conflicts_with_a_build_in_another_process(self):
+        # A build elsewhere holds the lock file shared by every worker
+        with open(os.path.join(self.tmp.name, ".build.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            with patch("app.main.build_index_version") as build, TestClient(app) as client:
+                response = client.post("/admin/index/rebuild", headers={"X-Admin-Token": "secret"})
+        self.assertEqual(response.status_code, 409)
+        build.assert_not_called()
+
+    def test_rollback_without_previous_version_conflicts(self):
+        with patch("app.main.rollback_index", side_effect=ValueError("No previous index version to roll back to")), \
+                TestClient(app) as client:
+            response = client.post("/admin/index/rollback", headers={"X-Admin-Token": "secret"})
+        self.assertEqual(response.status_code, 409)
+
+    def test_responses_report_the_loaded_index_version(self):
+        with patch("app.main.loaded_index_version", return_value="abc123"), TestClient(app) as client:
+            response = client.get("/")
+        self.assertEqual(response.headers["X-Index-Version"], "abc123")
+
+if __name__ == "__main__":
+    unittest.main()
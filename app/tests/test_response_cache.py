@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import patch, MagicMock, AsyncMock
+import os
+import sys
+import tempfile
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.agents.compliance_agent import ComplianceAgent
+from app.services.response_cache import ResponseCache
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        # Agents only cache once an index version is loaded
+        patcher = patch("app.agents.compliance_agent.loaded_index_version", return_value="v1")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_exact_hits_ignore_whitespace_and_case(self):
+        cache = ResponseCache(max_entries=10)
+        namespace = ResponseCache.make_namespace("HIPAA", "gpt-4o", "v1")
+        cache.put(ResponseCache.make_key("Patient  data was shared.", namespace), namespace, {"compliance_issues": ["a"]})
+
+        self.assertEqual(cache.get(ResponseCache.make_key("patient data\nwas shared.", namespace)), {"compliance_issues": ["a"]})
+
+        other = ResponseCache.make_namespace("FDA", "gpt-4o", "v1")
+        self.assertIsNone(cache.get(ResponseCache.make_key("Patient data was shared.", other)))
+        self.assertEqual(cache.stats()["hits_exact"], 1)
+
+    def test_lru_and_ttl_bound_the_memory_tier(self):
+        cache = ResponseCache(max_entries=2, ttl_seconds=60)
+        for key in ("a", "b", "c"):
+            cache.put(key, "ns", {"key": key})
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+        with patch("app.services.response_cache.time.time", return_value=10**12):
+            self.assertIsNone(cache.get("c"))
+
+    def test_near_duplicates_hit_above_threshold(self):
+        cache = ResponseCache(similarity_threshold=0.95)
+        cache.put("a", "ns", {"compliance_issues": ["a"]}, vector=[1.0, 0.0, 0.0])
+
+        self.assertEqual(cache.get_similar("ns", [0.99, 0.05, 0.0]), {"compliance_issues": ["a"]})
+        self.assertIsNone(cache.get_similar("ns", [0.5, 0.5, 0.0]))
+        self.assertIsNone(cache.get_similar("other", [1.0, 0.0, 0.0]))
+
+    def test_disk_tier_survives_a_new_cache_instance(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite")
+            ResponseCache(disk_path=path).put("a", "ns", {"compliance_issues": ["a"]})
+
+            cache = ResponseCache(disk_path=path)
+            self.assertEqual(cache.get("a"), {"compliance_issues": ["a"]})
+            self.assertEqual(cache.stats()["hits_disk"], 1)
+
+    @patch("app.agents.compliance_agent.get_embeddings")
+    def test_agent_skips_graph_on_cache_hit(self, mock_get_embeddings):
+        mock_get_embeddings.return_value.embed_query.side_effect = lambda text: [1.0, 0.0] if "research" in text else [0.0, 1.0]
+
+        agent = ComplianceAgent(cache=ResponseCache(similarity_threshold=0.99))
+        agent.agent = MagicMock()
+        agent.agent.invoke.return_value = {
+            "compliance_issues": ["Missing authorization"],
+            "suggestions": [],
+            "references": []
+        }
+
+        first = agent.run("Patient data was shared with the research team.", "HIPAA")
+        exact = agent.run("patient data was shared with the research team.", "HIPAA")
+        near = agent.run("Patient data was shared with the research team on Monday.", "HIPAA")
+        miss = agent.run("Records were left incomplete.", "HIPAA")
+
+        self.assertEqual(agent.agent.invoke.call_count, 2)
+        self.assertEqual(exact["compliance_issues"], first["compliance_issues"])
+        self.assertEqual(near["document_text"], "Patient data was shared with the research team on Monday.")
+        self.assertEqual(miss["compliance_issues"], ["Missing authorization"])
+        self.assertEqual(agent.cache.stats()["hits_semantic"], 1)
+
+    def test_agent_bypasses_the_cache_until_an_index_is_loaded(self):
+        agent = ComplianceAgent(cache=ResponseCache())
+        agent.agent = MagicMock()
+        agent.agent.invoke.return_value = {"compliance_issues": [], "suggestions": [], "references": []}
+
+        with patch("app.agents.compliance_agent.loaded_index_version", return_value=None):
+            agent.run("Patient data was shared.", "HIPAA")
+        self.assertEqual(agent.cache.stats()["entries"], 0)
+
+        agent.run("Patient data was shared.", "HIPAA")
+        agent.run("Patient data was shared.", "HIPAA")
+        self.assertEqual(agent.agent.invoke.call_count, 2)
+
+    @patch("app.agents.compliance_agent.get_embeddings")
+    def test_long_documents_sharing_a_preamble_do_not_share_results(self, mock_get_embeddings):
+        # Embeddings of documents with the same long preamble are near-identical
+        mock_get_embeddings.return_value.embed_query.return_value = [1.0, 0.0]
+
+        agent = ComplianceAgent(cache=ResponseCache(similarity_threshold=0.9))
+        agent.agent = MagicMock()
+        agent.agent.invoke.side_effect = [
+            {"compliance_issues": ["Missing IRB approval"], "suggestions": [], "references": []},
+            {"compliance_issues": [], "suggestions": [], "references": []},
+        ]
+
+        preamble = "This protocol describes the study design, eligibility criteria and procedures. " * 120
+        first = agent.run(preamble + "Enrollment starts before IRB review.", "FDA")
+        second = agent.run(preamble + "Enrollment starts after IRB approval.", "FDA")
+
+        self.assertEqual(agent.agent.invoke.call_count, 2)
+        self.assertEqual(first["compliance_issues"], ["Missing IRB approval"])
+        self.assertEqual(second["compliance_issues"], [])
+        self.assertEqual(agent.cache.stats()["hits_semantic"], 0)
+        mock_get_embeddings.return_value.embed_query.assert_not_called()
+
+    def test_async_runs_use_the_disk_tier_off_the_event_loop(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            agent = ComplianceAgent(cache=ResponseCache(disk_path=os.path.join(tmp, "cache.sqlite")))
+            agent.agent = MagicMock()
+            agent.agent.ainvoke = AsyncMock(return_value={
+                "compliance_issues": ["Missing authorization"], "suggestions": [], "references": []
+            })
+
+            threads = set()
+            get, put = agent.cache.get, agent.cache.put
+            def record(func):
+                def wrapper(*args):
+                    threads.add(threading.get_ident())
+                    return func(*args)
+                return wrapper
+
+            with patch.object(agent.cache, "get", side_effect=record(get)), \
+                    patch.object(agent.cache, "put", side_effect=record(put)):
+                asyncio.run(agent.arun("Patient data was shared.", "HIPAA"))
+
+            self.assertTrue(threads)
+            self.assertNotIn(threading.get_ident(), threads)
+            # A new process finds the result on disk
+            agent.cache = ResponseCache(disk_path=os.path.join(tmp, "cache.sqlite"))
+            self.assertEqual(asyncio.run(agent.arun("Patient data was shared.", "HIPAA"))["compliance_issues"],
+                             ["Missing authorization"])
+            self.assertEqual(agent.agent.ainvoke.await_count, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,405 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import faiss
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.config.settings import settings
+from app.services import vector_store
+
+class TestVectorStorePersistence(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.docs_path = Path(self.tmp.name) / "docs"
+        self.docs_path.mkdir()
+        (self.docs_path / "hipaa.txt").write_text("HIPAA requires patient authorization for disclosure of PHI.")
+        (self.docs_path / "fda.txt").write_text("Clinical trials require IRB approval and informed consent.")
+
+        patches = [
+            patch.object(settings, "COMPLIANCE_DOCS_PATH", str(self.docs_path)),
+            patch.object(settings, "VECTOR_DB_PATH", str(Path(self.tmp.name) / "vector_db")),
+            patch.object(vector_store, "get_embeddings", return_value=DeterministicFakeEmbedding(size=16)),
+            patch.object(vector_store, "_vector_store", None),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_index_is_reused_across_cold_starts(self):
+        with patch.object(vector_store, "create_vector_store", wraps=vector_store.create_vector_store) as create:
+            first = vector_store.load_or_create_vector_store()
+            second = vector_store.load_or_create_vector_store()
+
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(first.index.ntotal, second.index.ntotal)
+        results = second.similarity_search("IRB approval", k=1)
+        self.assertEqual(len(results), 1)
+
+    def test_async_search_matches_sync_search(self):
+        expected = vector_store.similarity_search("IRB approval", k=2)
+        results = asyncio.run(vector_store.asimilarity_search("IRB approval", k=2))
+        self.assertEqual([doc.page_content for doc in results], [doc.page_content for doc in expected])
+
+    def test_batch_search_matches_per_query_search(self):
+        queries = ["IRB approval", "patient authorization"]
+        results = vector_store.batch_similarity_search(queries, k=1)
+        expected = [vector_store.similarity_search(query, k=1) for query in queries]
+        self.assertEqual(results, expected)
+
+    def test_corpus_key_tracks_content_and_splitter(self):
+        documents = vector_store.load_documents()
+        key = vector_store.compute_corpus_key(documents)
+
+        (self.docs_path / "fda.txt").write_text("Medical devices require 510(k) premarket notification.")
+        self.assertNotEqual(key, vector_store.compute_corpus_key(vector_store.load_documents()))
+
+        with patch.object(settings, "CHUNK_SIZE", 500):
+            self.assertNotEqual(key, vector_store.compute_corpus_key(documents))
+
+class TestAreaPartitioning(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.docs_path = Path(self.tmp.name) / "docs"
+        self.docs_path.mkdir()
+        (self.docs_path / "hipaa.txt").write_text("HIPAA requires patient authorization for disclosure of PHI.")
+        (self.docs_path / "fda_devices.txt").write_text("Medical devices require 510(k) premarket notification.")
+        (self.docs_path / "privacy_policy.txt").write_text("Workforce members must complete privacy training.")
+        (self.docs_path / "documentation.txt").write_text("Medical records must be complete and authenticated.")
+        (self.docs_path / "areas.json").write_text(json.dumps({"privacy_policy.txt": ["HIPAA", "HITECH"]}))
+
+        patches = [
+            patch.object(settings, "COMPLIANCE_DOCS_PATH", str(self.docs_path)),
+            patch.object(settings, "VECTOR_DB_PATH", str(Path(self.tmp.name) / "vector_db")),
+            patch.object(vector_store, "get_embeddings", return_value=DeterministicFakeEmbedding(size=16)),
+            patch.object(vector_store, "_vector_store", None),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_documents_are_tagged_from_manifest_and_filename(self):
+        areas = {doc.metadata["source"]: doc.metadata["areas"] for doc in vector_store.load_documents()}
+        self.assertEqual(areas, {
+            "documentation.txt": ["general"],
+            "fda_devices.txt": ["FDA"],
+            "hipaa.txt": ["HIPAA"],
+            "privacy_policy.txt": ["HIPAA", "HITECH"],
+        })
+
+    def test_search_is_restricted_to_area_and_general_chunks(self):
+        results = vector_store.similarity_search("patient authorization", k=4, compliance_area="hipaa")
+        self.assertEqual(
+            {doc.metadata["source"] for doc in results},
+            {"hipaa.txt", "privacy_policy.txt", "documentation.txt"}
+        )
+
+        results = vector_store.batch_similarity_search(["devices", "devices"], k=4, compliance_areas=["FDA", "HITECH"])
+        self.assertEqual({doc.metadata["source"] for doc in results[0]}, {"fda_devices.txt", "documentation.txt"})
+        self.assertEqual({doc.metadata["source"] for doc in results[1]}, {"privacy_policy.txt", "documentation.txt"})
+
+    def test_general_and_untagged_areas_search_the_whole_index(self):
+        for area in ("general", "Stark", None):
+            results = vector_store.similarity_search("medical", k=4, compliance_area=area)
+            self.assertEqual(len(results), 4)
+
+    def test_retagging_changes_the_corpus_key(self):
+        key = vector_store.compute_corpus_key(vector_store.load_documents())
+        (self.docs_path / "areas.json").write_text(json.dumps({"privacy_policy.txt": ["HIPAA"]}))
+        self.assertNotEqual(key, vector_store.compute_corpus_key(vector_store.load_documents()))
+
+class TestIndexTypes(unittest.TestCase):
+    def test_auto_index_type_follows_corpus_size(self):
+        with patch.object(settings, "VECTOR_INDEX_FLAT_MAX", 1000), patch.object(settings, "VECTOR_INDEX_HNSW_MAX", 100000), \
+                patch.object(settings, "VECTOR_INDEX_NLIST", None), patch.object(settings, "VECTOR_INDEX_PQ_M", 64), \
+                patch.object(settings, "VECTOR_DB_MMAP", False):
+            self.assertEqual(vector_store.index_factory_string(500, 1536), "Flat")
+            self.assertEqual(vector_store.index_factory_string(50000, 1536), "HNSW32,Flat")
+            self.assertEqual(vector_store.index_factory_string(1000000, 1536), "IVF4000,PQ64x8")
+            # PQ sub-vectors must divide the dimension
+            self.assertEqual(vector_store.index_factory_string(1000000, 100), "IVF4000,PQ50x8")
+
+    def test_memory_mapped_indexes_use_inverted_lists(self):
+        with patch.object(settings, "VECTOR_INDEX_FLAT_MAX", 1000), patch.object(settings, "VECTOR_INDEX_HNSW_MAX", 100000), \
+                patch.object(settings, "VECTOR_INDEX_NLIST", None), patch.object(settings, "VECTOR_DB_MMAP", True):
+            self.assertEqual(vector_store.index_factory_string(500, 1536), "IVF1,Flat")
+            self.assertEqual(vector_store.index_factory_string(50000, 1536), "IVF894,Flat")
+            self.assertEqual(vector_store.index_factory_string(50000, 1536, "hnsw"), "HNSW32,Flat")
+
+    def test_small_corpora_fall_back_to_trainable_layouts(self):
+        with patch.object(settings, "VECTOR_DB_MMAP", False):
+            self.assertEqual(vector_store.index_factory_string(100, 16, "ivfpq"), "IVF2,Flat")
+            self.assertEqual(vector_store.index_factory_string(10, 16, "ivf"), "Flat")
+        with patch.object(settings, "VECTOR_DB_MMAP", True):
+            self.assertEqual(vector_store.index_factory_string(10, 16, "ivf"), "IVF1,Flat")
+
+    def test_single_list_index_is_exact(self):
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(500, 16)).astype(np.float32)
+        with patch.object(settings, "VECTOR_DB_MMAP", True):
+            index = vector_store.build_index(vectors, "flat")
+        self.assertIsInstance(index, faiss.IndexIVFFlat)
+        # Not clustered: the single centroid is left at the origin
+        np.testing.assert_array_equal(index.quantizer.reconstruct(0), np.zeros(16, dtype=np.float32))
+
+        distances, found = index.search(vectors[:20], 5)
+        exact_distances, truth = faiss.knn(vectors[:20], vectors, 5)
+        np.testing.assert_array_equal(found, truth)
+        np.testing.assert_allclose(distances, exact_distances, rtol=1e-4, atol=1e-4)
+
+    def test_approximate_indexes_keep_recall_against_exact_search(self):
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(20, 16)).astype(np.float32)
+        vectors = (centers[rng.integers(0, 20, 2000)] + rng.normal(scale=0.3, size=(2000, 16))).astype(np.float32)
+        queries = vectors[:50] + rng.normal(scale=0.05, size=(50, 16)).astype(np.float32)
+
+        exact = vector_store.build_index(vectors, "flat")
+        _, truth = exact.search(queries, 10)
+
+        with patch.object(settings, "VECTOR_INDEX_NPROBE", 8), patch.object(settings, "VECTOR_INDEX_PQ_M", 8):
+            for index_type, expected in (("ivf", faiss.IndexIVFFlat), ("hnsw", faiss.IndexHNSW), ("ivfpq", faiss.IndexIVFPQ)):
+                index = vector_store.build_index(vectors, index_type)
+                self.assertIsInstance(index, expected)
+                _, found = index.search(queries, 10)
+                recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(found, truth)])
+                self.assertGreater(recall, 0.7, index_type)
+
+    def test_area_filter_works_on_approximate_indexes(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        docs_path = Path(tmp.name) / "docs"
+        docs_path.mkdir()
+        for i in range(60):
+            (docs_path / f"hipaa_{i}.txt").write_text(f"HIPAA rule {i} on patient authorization.")
+            (docs_path / f"fda_{i}.txt").write_text(f"FDA rule {i} on device clearance.")
+
+        with patch.object(settings, "COMPLIANCE_DOCS_PATH", str(docs_path)), \
+                patch.object(settings, "VECTOR_DB_PATH", str(Path(tmp.name) / "vector_db")), \
+                patch.object(settings, "VECTOR_INDEX_TYPE", "ivf"), \
+                patch.object(vector_store, "get_embeddings", return_value=DeterministicFakeEmbedding(size=16)), \
+                patch.object(vector_store, "_vector_store", None):
+            index_dir, _ = vector_store.ingest_documents()
+            self.assertEqual(vector_store.read_manifest(index_dir)["index_type"], "IVF3,Flat")
+
+            results = vector_store.similarity_search("device clearance", k=5, compliance_area="FDA")
+            self.assertEqual(len(results), 5)
+            self.assertTrue(all(doc.metadata["areas"] == ["FDA"] for doc in results))
+
+class TestHybridSearch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        docs_path = Path(self.tmp.name) / "docs"
+        docs_path.mkdir()
+        for i in range(20):
+            (docs_path / f"hipaa_{i}.txt").write_text(f"HIPAA privacy guidance {i} on safeguards for health information.")
+        (docs_path / "hipaa_authorization.txt").write_text("45 CFR 164.508(a)(1) requires a valid authorization.")
+
+        patches = [
+            patch.object(settings, "COMPLIANCE_DOCS_PATH", str(docs_path)),
+            patch.object(settings, "VECTOR_DB_PATH", str(Path(self.tmp.name) / "vector_db")),
+            # Enough candidates that every chunk is ranked by dense search too
+            patch.object(settings, "HYBRID_CANDIDATES", 50),
+            patch.object(vector_store, "get_embeddings", return_value=DeterministicFakeEmbedding(size=16)),
+            patch.object(vector_store, "_vector_store", None),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_exact_citation_is_retrieved(self):
+        results = vector_store.similarity_search("Does this disclosure meet 164.508?", k=1, compliance_area="HIPAA")
+        self.assertEqual(results[0].metadata["source"], "hipaa_authorization.txt")
+
+    def test_lexical_index_is_persisted_with_the_vectors(self):
+        index_dir, _ = vector_store.ingest_documents()
+        self.assertTrue((index_dir / vector_store.LEXICAL_FILE).exists())
+        store = vector_store.load_vector_store(index_dir)
+        self.assertEqual(len(store.lexical_index), store.index.ntotal)
+
+    def test_relevance_threshold_drops_irrelevant_chunks(self):
+        with patch.object(settings, "RETRIEVAL_RELEVANCE_THRESHOLD", -100.0):
+            self.assertEqual(len(vector_store.similarity_search("HIPAA safeguards", k=4, compliance_area="HIPAA")), 4)
+        # Nothing clears the cutoff, and keyword matches alone do not count as relevant
+        with patch.object(settings, "RETRIEVAL_RELEVANCE_THRESHOLD", 2.0):
+            self.assertEqual(vector_store.similarity_search("Does this disclosure meet 164.508?", k=4), [])
+
+class RecordingEmbedding(DeterministicFakeEmbedding):
+    embedded: list = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+class TestIncrementalIngestion(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.docs_path = Path(self.tmp.name) / "docs"
+        self.docs_path.mkdir()
+        (self.docs_path / "hipaa.txt").write_text("HIPAA requires patient authorization for disclosure of PHI.")
+        (self.docs_path / "fda.txt").write_text("Clinical trials require IRB approval and informed consent.")
+        self.embeddings = RecordingEmbedding(size=16, embedded=[])
+
+        patches = [
+            patch.object(settings, "COMPLIANCE_DOCS_PATH", str(self.docs_path)),
+            patch.object(settings, "VECTOR_DB_PATH", str(Path(self.tmp.name) / "vector_db")),
+            patch.object(vector_store, "get_embeddings", return_value=self.embeddings),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_only_changed_chunks_are_embedded(self):
+        _, stats = vector_store.ingest_documents()
+        self.assertEqual(stats["status"], "rebuilt")
+        self.assertEqual(len(self.embeddings.embedded), 2)
+
+        # Change one file, remove another and add a new one
+        self.embeddings.embedded.clear()
+        (self.docs_path / "hipaa.txt").write_text("HIPAA Security Rule requires technical safeguards.")
+        (self.docs_path / "fda.txt").unlink()
+        (self.docs_path / "stark.txt").write_text("Stark Law prohibits self-referral.")
+
+        index_dir, stats = vector_store.ingest_documents()
+        self.assertEqual(stats["status"], "updated")
+        self.assertEqual((stats["added"], stats["removed"], stats["unchanged"]), (2, 2, 0))
+        self.assertEqual(sorted(self.embeddings.embedded), [
+            "HIPAA Security Rule requires technical safeguards.",
+            "Stark Law prohibits self-referral.",
+        ])
+
+        store = vector_store.load_vector_store(index_dir)
+        sources = {doc.metadata["source"] for doc in store.docstore._dict.values()}
+        self.assertEqual(sources, {"hipaa.txt", "stark.txt"})
+        self.assertEqual(store.index.ntotal, 2)
+
+        # Re-running without corpus changes embeds nothing
+        self.embeddings.embedded.clear()
+        _, stats = vector_store.ingest_documents()
+        self.assertEqual(stats["status"], "up_to_date")
+        self.assertEqual(self.embeddings.embedded, [])
+
+    def test_retagged_chunks_are_not_re_embedded(self):
+        vector_store.ingest_documents()
+        self.embeddings.embedded.clear()
+        (self.docs_path / "areas.json").write_text(json.dumps({"fda.txt": ["FDA", "general"]}))
+
+        index_dir, stats = vector_store.ingest_documents()
+        self.assertEqual(stats["status"], "updated")
+        self.assertEqual(self.embeddings.embedded, [])
+
+        store = vector_store.load_vector_store(index_dir)
+        areas = {doc.metadata["source"]: doc.metadata["areas"] for doc in store.docstore._dict.values()}
+        self.assertEqual(areas["fda.txt"], ["FDA", "general"])
+
+    @unittest.skipUnless(os.path.exists("/proc/self/maps"), "needs /proc/self/maps")
+    def test_loaded_index_is_memory_mapped(self):
+        with patch.object(settings, "VECTOR_DB_MMAP", True):
+            index_dir, _ = vector_store.ingest_documents()
+            store = vector_store.load_vector_store(index_dir)
+
+        invlists = faiss.downcast_InvertedLists(faiss.extract_index_ivf(store.index).invlists)
+        self.assertIsInstance(invlists, faiss.OnDiskInvertedLists)
+        with open("/proc/self/maps") as f:
+            self.assertIn(str(index_dir / "index.faiss"), f.read())
+        self.assertEqual(len(store.similarity_search("IRB approval", k=1)), 1)
+
+    def test_changing_index_type_reuses_stored_vectors(self):
+        vector_store.ingest_documents()
+        self.embeddings.embedded.clear()
+
+        with patch.object(settings, "VECTOR_INDEX_TYPE", "hnsw"):
+            index_dir, stats = vector_store.ingest_documents()
+
+        self.assertEqual(stats["status"], "updated")
+        self.assertEqual(self.embeddings.embedded, [])
+        self.assertIsInstance(vector_store.load_vector_store(index_dir).index, faiss.IndexHNSW)
+
+class TestIndexVersions(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.docs_path = Path(self.tmp.name) / "docs"
+        self.docs_path.mkdir()
+        (self.docs_path / "hipaa.txt").write_text("HIPAA requires patient authorization for disclosure of PHI.")
+        (self.docs_path / "fda.txt").write_text("Clinical trials require IRB approval and informed consent.")
+
+        patches = [
+            patch.object(settings, "COMPLIANCE_DOCS_PATH", str(self.docs_path)),
+            patch.object(settings, "VECTOR_DB_PATH", str(Path(self.tmp.name) / "vector_db")),
+            patch.object(vector_store, "get_embeddings", return_value=DeterministicFakeEmbedding(size=16)),
+            patch.object(vector_store, "_vector_store", None),
+            patch.object(vector_store, "_active_checked_at", 0.0),
+            patch.object(vector_store, "_rejected_version", None),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_rebuild_swaps_in_new_version_and_keeps_previous_for_rollback(self):
+        first = vector_store.get_vector_store().index_version
+        (self.docs_path / "stark.txt").write_text("Stark Law prohibits self-referral.")
+
+        result = vector_store.build_index_version()
+        self.assertEqual(result["status"], "updated")
+        self.assertNotEqual(result["version"], first)
+        self.assertEqual(vector_store.get_vector_store().index_version, result["version"])
+        self.assertEqual(vector_store.read_active_index()["previous"], first)
+
+        vector_store.rollback_index()
+        self.assertEqual(vector_store.get_vector_store().index_version, first)
+        self.assertEqual(vector_store.read_active_index()["previous"], result["version"])
+
+    def test_version_activated_by_another_process_is_reloaded(self):
+        old = vector_store.get_vector_store()
+        (self.docs_path / "stark.txt").write_text("Stark Law prohibits self-referral.")
+        index_dir, _ = vector_store.ingest_documents()
+        vector_store.activate_index(index_dir)
+
+        with patch.object(settings, "INDEX_RELOAD_INTERVAL", 0.0):
+            vector_store.get_vector_store()
+            vector_store._reload_thread.join(5)
+
+        self.assertEqual(vector_store.get_vector_store().index_version, index_dir.name)
+        # A request still holding the old version can finish its search
+        self.assertEqual(len(old.similarity_search("IRB approval", k=1)), 1)
+
+    def test_active_version_is_reloaded_on_demand(self):
+        vector_store.get_vector_store()
+        self.assertFalse(vector_store.reload_active_index())
+
+        (self.docs_path / "stark.txt").write_text("Stark Law prohibits self-referral.")
+        index_dir, _ = vector_store.ingest_documents()
+        vector_store.activate_index(index_dir)
+
+        with patch.object(settings, "INDEX_RELOAD_INTERVAL", None):
+            self.assertTrue(vector_store.reload_active_index())
+            self.assertEqual(vector_store.get_vector_store().index_version, index_dir.name)
+
+    def test_version_failing_validation_is_not_activated(self):
+        active = vector_store.get_vector_store().index_version
+        (self.docs_path / "stark.txt").write_text("Stark Law prohibits self-referral.")
+
+        with patch.object(vector_store, "search_by_vectors", return_value=[[]]):
+            with self.assertRaises(ValueError):
+                vector_store.build_index_version()
+
+        self.assertEqual(vector_store.read_active_index()["version"], active)
+        self.assertEqual(vector_store.get_vector_store().index_version, active)
+        with self.assertRaises(FileNotFoundError):
+            vector_store.activate_index_version("../docs")
+
+if __name__ == "__main__":
+    unittest.main()